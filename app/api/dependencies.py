@@ -1,13 +1,17 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from app.core.config import settings
 from app.core.security import decode_access_token
-from app.services.auth_service import get_user_by_username
+from app.services.auth_service import get_cached_user, user_from_claims
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=True)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
-    """Decode JWT and return current user from DB (id, username, employee_id, ...)."""
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Decode JWT and return current user (id, username, employee_id, ...).
+    Stateless tokens are trusted as-is; otherwise the user comes from the user cache.
+    """
     payload = decode_access_token(token)
     if not payload or "sub" not in payload:
         raise HTTPException(
@@ -15,7 +19,10 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = get_user_by_username(payload.get("username", ""))
+    user = user_from_claims(payload)
+    if user is not None:
+        return user
+    user = await get_cached_user(payload.get("username", ""))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -25,12 +32,23 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
     return user
 
 
-def get_current_user_with_employee(token: str = Depends(oauth2_scheme)) -> dict:
+async def get_current_user_with_employee(token: str = Depends(oauth2_scheme)) -> dict:
     """Same as get_current_user but requires employee_id (for performance generate/summary)."""
-    user = get_current_user(token)
+    user = await get_current_user(token)
     if user.get("employee_id") is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="User is not linked to an employee. Contact admin.",
         )
     return user
+
+
+async def require_admin(token: str = Depends(oauth2_scheme)) -> dict:
+    """Same as get_current_user but requires an admin role (settings.ADMIN_ROLE_IDS)."""
+    user = await get_current_user(token)
+    if user.get("role_id") not in settings.ADMIN_ROLE_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return user
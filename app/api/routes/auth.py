@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
-from app.services.auth_service import login, refresh_tokens
+from app.api.dependencies import require_admin
+from app.services.auth_service import login, refresh_tokens, deactivate_user
 from app.utils.response import success_response, error_response
 
 router = APIRouter()
@@ -17,36 +18,47 @@ class RefreshRequest(BaseModel):
 
 
 @router.post("/login")
-def auth_login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def auth_login(form_data: OAuth2PasswordRequestForm = Depends()):
     """
     Login (form, untuk Swagger). Mengembalikan access_token, refresh_token, dan user.
     Header: Authorization: Bearer <access_token>
     """
-    result = login(form_data.username, form_data.password)
+    result = await login(form_data.username, form_data.password)
     if not result:
         return error_response("Invalid username or password", code=401)
     return success_response(data=result, message="Login successful")
 
 
 @router.post("/login/json")
-def auth_login_json(body: LoginRequest):
+async def auth_login_json(body: LoginRequest):
     """
     Login dengan JSON body: { "username": "...", "password": "..." }.
     Mengembalikan access_token, refresh_token, dan user. Header: Authorization: Bearer <access_token>
     """
-    result = login(body.username, body.password)
+    result = await login(body.username, body.password)
     if not result:
         return error_response("Invalid username or password", code=401)
     return success_response(data=result, message="Login successful")
 
 
 @router.post("/refresh")
-def auth_refresh(body: RefreshRequest):
+async def auth_refresh(body: RefreshRequest):
     """
     Tukar refresh_token dengan access_token dan refresh_token baru (rotation).
     Body: { "refresh_token": "..." }. Tidak perlu Authorization header.
     """
-    result = refresh_tokens(body.refresh_token)
+    result = await refresh_tokens(body.refresh_token)
     if not result:
         return error_response("Invalid or expired refresh token", code=401)
     return success_response(data=result, message="Token renewed successfully")
+
+
+@router.post("/users/{user_id}/deactivate")
+async def auth_deactivate_user(user_id: int, current_user: dict = Depends(require_admin)):
+    """
+    (Admin) Nonaktifkan user. Cache user langsung di-invalidate di worker ini;
+    worker lain paling lambat setelah USER_CACHE_TTL_SECONDS.
+    """
+    if not await deactivate_user(user_id):
+        return error_response("User not found", code=404)
+    return success_response(data={"id": user_id, "is_active": False}, message="User deactivated")
@@ -1,8 +1,26 @@
-from fastapi import APIRouter, Depends
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from app.api.dependencies import get_current_user
-from app.services.chat_service import send_message, get_chat_history
-from app.utils.response import success_response, error_response
+from app.services.chat_service import (
+    send_message,
+    stream_message,
+    get_chat_history_page,
+    get_history_marker,
+    ensure_chat_capacity,
+    parse_history_cursor,
+    InvalidCursor,
+)
+from app.utils.response import (
+    success_response,
+    error_response,
+    sse_event,
+    make_etag,
+    is_not_modified,
+    json_response,
+    not_modified_response,
+)
 
 router = APIRouter()
 
@@ -12,7 +30,7 @@ class ChatRequest(BaseModel):
 
 
 @router.post("/chat")
-def chat(body: ChatRequest, current_user: dict = Depends(get_current_user)):
+async def chat(body: ChatRequest, current_user: dict = Depends(get_current_user)):
     """
     Kirim pesan ke chatbot EP. Konteks chatbot terbatas pada aplikasi
     Performance Management (KPI, performa, motivasi, rekomendasi).
@@ -21,7 +39,7 @@ def chat(body: ChatRequest, current_user: dict = Depends(get_current_user)):
     if not body.message or not str(body.message).strip():
         return error_response("Pesan tidak boleh kosong", code=400)
 
-    result = send_message(current_user["id"], body.message.strip())
+    result = await send_message(current_user["id"], body.message.strip())
     if not result:
         return error_response("Gagal memproses chat", code=500)
 
@@ -36,10 +54,46 @@ def chat(body: ChatRequest, current_user: dict = Depends(get_current_user)):
     )
 
 
+@router.post("/chat/stream")
+async def chat_stream(
+    body: ChatRequest,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Sama dengan POST /chat, tapi jawaban dikirim bertahap via Server-Sent Events
+    (event: start, token, error, done). Jawaban lengkap tersimpan di history saat selesai.
+    Memerlukan token (Authorization: Bearer <token>).
+    """
+    if not body.message or not str(body.message).strip():
+        return error_response("Pesan tidak boleh kosong", code=400)
+    ensure_chat_capacity()
+
+    async def events():
+        stream = stream_message(current_user["id"], body.message.strip(), request.is_disconnected)
+        async with aclosing(stream) as items:
+            async for item in items:
+                yield sse_event(item["event"], item["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/chat/history")
-def chat_history(limit: int = 50, current_user: dict = Depends(get_current_user)):
+async def chat_history(
+    request: Request,
+    limit: int = 50,
+    before: str | None = None,
+    after: str | None = None,
+    current_user: dict = Depends(get_current_user),
+):
     """
-    Ambil riwayat chat user yang login. Opsional: limit (default 50).
+    Ambil riwayat chat user yang login, urut kronologis. Opsional: limit (default 50).
+    Tanpa cursor: pesan terbaru. Halaman lebih lama: before=<prev>, lebih baru: after=<next>.
+    ETag dari pesan terbaru user + parameter halaman: 304 jika belum ada pesan baru.
     Memerlukan token (Authorization: Bearer <token>).
     """
     if limit < 1:
@@ -47,8 +101,25 @@ def chat_history(limit: int = 50, current_user: dict = Depends(get_current_user)
     if limit > 200:
         limit = 200
 
-    history = get_chat_history(current_user["id"], limit=limit)
-    return success_response(
-        data={"history": history, "count": len(history)},
+    # Cursor divalidasi sebelum cek ETag: cursor rusak selalu 400, bukan 304
+    try:
+        parse_history_cursor(before, after)
+    except InvalidCursor:
+        return error_response("Cursor tidak valid", code=400)
+
+    marker = await get_history_marker(current_user["id"])
+    etag = make_etag("chat", current_user["id"], limit, before, after, marker)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+
+    page = await get_chat_history_page(current_user["id"], limit=limit, before=before, after=after)
+    body = success_response(
+        data={
+            "history": page["history"],
+            "count": len(page["history"]),
+            "prev": page["prev"],
+            "next": page["next"],
+        },
         message="Riwayat chat berhasil diambil",
     )
+    return json_response(body, etag=etag)
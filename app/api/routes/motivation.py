@@ -7,12 +7,12 @@ router = APIRouter()
 
 
 @router.post("/generate")
-def generate_motivation(current_user: dict = Depends(get_current_user)):
+async def generate_motivation(current_user: dict = Depends(get_current_user)):
     """
     Generate motivasi harian via AI dan simpan ke tabel motivation.
     Memerlukan token (Authorization: Bearer <token>).
     """
-    result = generate_daily_motivation()
+    result = await generate_daily_motivation()
     if not result:
         return error_response("Gagal generate motivasi", code=500)
     return success_response(
@@ -1,15 +1,39 @@
 import json
 import re
-from fastapi import APIRouter, Depends
+from contextlib import aclosing
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from app.services.performance_service import generate_performance, get_employee_code_by_id
-from app.services.analytics_service import get_performance_analytics
-from app.core.database import get_connection
-from app.utils.response import success_response, error_response
-from app.api.dependencies import get_current_user, get_current_user_with_employee
+from app.services.analytics_service import cache_window, get_performance_analytics, get_analytics_version
+from app.services.batch_service import start_batch, resume_batch, get_batch_run
+from app.services.job_service import enqueue_job, get_job, watch_job, JobLimitExceeded
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.response import (
+    success_response,
+    error_response,
+    sse_event,
+    make_etag,
+    is_not_modified,
+    json_response,
+    not_modified_response,
+)
+from app.api.dependencies import get_current_user, get_current_user_with_employee, require_admin
 
 router = APIRouter()
 
 
+class BatchRequest(BaseModel):
+    department_id: int | None = None
+    concurrency: int | None = None
+    force: bool = False
+
+
+class ResumeBatchRequest(BaseModel):
+    concurrency: int | None = None
+
+
 def _parse_ai_summary_for_response(ai_summary):
     """Return ai_summary as object if valid JSON, else as string."""
     if not ai_summary or not isinstance(ai_summary, str):
@@ -35,14 +59,56 @@ def _parse_ai_summary_for_response(ai_summary):
     return ai_summary
 
 
-@router.post("/generate/{period}")
-def generate(period: str, current_user: dict = Depends(get_current_user_with_employee)):
+def _summary_for_response(ai_summary_json, ai_summary):
+    """Objek JSON tersimpan apa adanya; parse ulang hanya untuk summary lama tanpa ai_summary_json."""
+    if ai_summary_json is not None:
+        return ai_summary_json
+    return _parse_ai_summary_for_response(ai_summary)
+
 
-    employee_code = get_employee_code_by_id(current_user["employee_id"])
+def _job_for_response(job: dict) -> dict:
+    data = dict(job)
+    data["ai_summary"] = _summary_for_response(data.pop("ai_summary_json"), job["ai_summary"])
+    return data
+
+
+@router.post("/generate/{period}")
+async def generate(
+    period: str,
+    response: Response,
+    force: bool = False,
+    job: bool = False,
+    current_user: dict = Depends(get_current_user_with_employee),
+):
+    """
+    Generate summary performa user untuk periode ini. Jika data KPI tidak berubah sejak
+    summary terakhir, summary tersimpan dikembalikan tanpa memanggil AI (cached=true).
+    Query ?force=true untuk tetap generate ulang.
+    Query ?job=true: langsung return 202 + job id; pantau via GET /jobs/{job_id}
+    atau SSE GET /jobs/{job_id}/events.
+    """
+    employee_code = current_user.get("employee_code") or await get_employee_code_by_id(
+        current_user["employee_id"]
+    )
     if not employee_code:
         return error_response("Employee not found for this user", code=404)
 
-    result = generate_performance(employee_code, period)
+    if job:
+        try:
+            queued = await enqueue_job(
+                current_user["id"], current_user["employee_id"], employee_code, period, force=force
+            )
+        except JobLimitExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        response.status_code = 202
+        response.headers["Location"] = f"/api/performance/jobs/{queued['id']}"
+        return success_response(
+            data=_job_for_response(queued),
+            message="Performance summary job queued",
+            code=202,
+        )
+
+    result = await generate_performance(employee_code, period, force=force)
 
     if not result:
         return error_response("KPI data not found", code=404)
@@ -51,57 +117,173 @@ def generate(period: str, current_user: dict = Depends(get_current_user_with_emp
         data={
             "employee_code": employee_code,
             "period": period,
-            "ai_summary": _parse_ai_summary_for_response(result),
+            "ai_summary": _summary_for_response(result["ai_summary_json"], result["ai_summary"]),
+            "cached": result["cached"],
         },
         message="Performance summary generated successfully",
     )
 
 
-@router.get("/summary/me/{period}")
-def get_summary(period: str, current_user: dict = Depends(get_current_user_with_employee)):
+async def _get_own_job(job_id: int, current_user: dict) -> dict | None:
+    """Job milik user (admin boleh melihat semua job)."""
+    job = await get_job(job_id)
+    if not job:
+        return None
+    if job["user_id"] != current_user["id"] and current_user.get("role_id") not in settings.ADMIN_ROLE_IDS:
+        return None
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: int, current_user: dict = Depends(get_current_user)):
+    """Status job generate summary: queued | running | succeeded (ai_summary terisi) | failed."""
+    job = await _get_own_job(job_id, current_user)
+    if not job:
+        return error_response("Job not found", code=404)
+    return success_response(data=_job_for_response(job), message="Job retrieved successfully")
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: int, request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Server-Sent Events status job: satu event per perubahan (nama event = status),
+    stream ditutup setelah succeeded/failed.
+    """
+    job = await _get_own_job(job_id, current_user)
+    if not job:
+        return error_response("Job not found", code=404)
 
+    async def events():
+        async with aclosing(watch_job(job_id, request.is_disconnected)) as states:
+            async for state in states:
+                yield sse_event(state["status"], _job_for_response(state))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/summary/me/{period}")
+async def get_summary(
+    period: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user_with_employee),
+):
+    """
+    Summary tersimpan user untuk periode ini. ETag dari generated_at: If-None-Match yang
+    cocok dijawab 304 hanya dengan query generated_at (tanpa baca/serialisasi summary).
+    """
     employee_id = current_user["employee_id"]
-    employee_code = get_employee_code_by_id(employee_id)
+    employee_code = current_user.get("employee_code") or await get_employee_code_by_id(employee_id)
     if not employee_code:
         return error_response("Employee not found for this user", code=404)
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT ai_summary, generated_at
-        FROM performance_summary
-        WHERE employee_id = %s AND period = %s
-    """, (employee_id, period))
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            if request.headers.get("if-none-match"):
+                await cur.execute(
+                    "SELECT generated_at FROM performance_summary WHERE employee_id = %s AND period = %s",
+                    (employee_id, period),
+                )
+                row = await cur.fetchone()
+                if row:
+                    etag = make_etag("summary", employee_code, period, row[0])
+                    if is_not_modified(request, etag):
+                        return not_modified_response(etag)
+
+            await cur.execute("""
+                SELECT ai_summary, generated_at, ai_summary_json
+                FROM performance_summary
+                WHERE employee_id = %s AND period = %s
+            """, (employee_id, period))
 
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
+            result = await cur.fetchone()
 
     if not result:
         return error_response("Summary not found", code=404)
 
-    return success_response(
+    body = success_response(
         data={
             "employee_code": employee_code,
             "period": period,
-            "ai_summary": _parse_ai_summary_for_response(result[0]),
+            "ai_summary": _summary_for_response(result[2], result[0]),
             "generated_at": result[1],
         },
         message="Summary retrieved successfully",
     )
+    return json_response(body, etag=make_etag("summary", employee_code, period, result[1]))
 
 
 @router.get("/analytics/{period}")
-def get_analytics(period: str, current_user: dict = Depends(get_current_user)):
+async def get_analytics(period: str, request: Request, current_user: dict = Depends(get_current_user)):
     """
     Decision Support System: Analytics untuk periode tertentu.
     - Rata-rata skor per departemen
     - Top performer
     - Underperformer
     - Distribusi kategori performa
+    ETag dari analytics_version periode + jendela TTL cache: 304 tanpa menghitung/
+    serialisasi ulang selama tidak ada perubahan performance_summary; perubahan nama
+    karyawan/departemen terlihat paling lambat setelah TTL seperti cache.
     """
-    result = get_performance_analytics(period)
-    return success_response(
+    window = cache_window()
+    if request.headers.get("if-none-match"):
+        etag = make_etag("analytics", period, await get_analytics_version(period), window)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+
+    result = await get_performance_analytics(period)
+    body = success_response(
         data=result,
         message="Analytics retrieved successfully",
     )
+    return json_response(body, etag=make_etag("analytics", period, result["version"], window))
+
+
+@router.post("/batch/{period}")
+async def batch_generate(
+    period: str,
+    response: Response,
+    body: BatchRequest | None = None,
+    current_user: dict = Depends(require_admin),
+):
+    """
+    (Admin) Generate summary untuk semua karyawan di periode ini, opsional per department_id.
+    Berjalan di background; pantau progress via GET /batch/runs/{run_id}.
+    """
+    body = body or BatchRequest()
+    run = await start_batch(
+        period,
+        department_id=body.department_id,
+        concurrency=body.concurrency,
+        created_by=current_user["id"],
+        force=body.force,
+    )
+    response.status_code = 202
+    return success_response(data=run, message="Batch generation started", code=202)
+
+
+@router.get("/batch/runs/{run_id}")
+async def batch_status(run_id: int, current_user: dict = Depends(require_admin)):
+    """(Admin) Progress batch run: total, succeeded, failed, pending, throughput."""
+    run = await get_batch_run(run_id)
+    if not run:
+        return error_response("Batch run not found", code=404)
+    return success_response(data=run, message="Batch run retrieved successfully")
+
+
+@router.post("/batch/runs/{run_id}/resume")
+async def batch_resume(
+    run_id: int,
+    response: Response,
+    body: ResumeBatchRequest | None = None,
+    current_user: dict = Depends(require_admin),
+):
+    """(Admin) Lanjutkan batch run yang terhenti tanpa mengulang karyawan yang sudah selesai."""
+    run = await resume_batch(run_id, concurrency=(body.concurrency if body else None))
+    if not run:
+        return error_response("Batch run not found, already completed, or still running", code=409)
+    response.status_code = 202
+    return success_response(data=run, message="Batch generation resumed", code=202)
@@ -9,14 +9,119 @@ class Settings:
     DB_USER = os.getenv("DB_USER")
     DB_PASSWORD = os.getenv("DB_PASSWORD")
     DB_PORT = os.getenv("DB_PORT")
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
 
     OLLAMA_URL = os.getenv("OLLAMA_URL")
     MODEL_NAME = os.getenv("MODEL_NAME")
+    # Batas koneksi HTTP (keep-alive) ke Ollama per worker
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+    # Lama model (dan KV-cache) dipertahankan Ollama setelah request terakhir; kosong = default server
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "10m")
+    # Scheduler LLM: request paralel per backend (samakan dengan OLLAMA_NUM_PARALLEL server)
+    # dan maksimum antrean di depan request chat/summary sebelum ditolak 429 (0 = tanpa batas)
+    OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", "2"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    # Beberapa node Ollama: "url[=model|model],url,..." (kosong = hanya OLLAMA_URL). Model
+    # per node opsional, default dari /api/tags. Health check tiap interval (0 = nonaktif);
+    # node dikeluarkan dari routing setelah N kegagalan berturut-turut
+    OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+    OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "3"))
+    OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "2"))
+    # Circuit breaker per node: setelah dikeluarkan, node tidak dipakai selama cooldown (detik),
+    # lalu half-open: satu request percobaan menentukan node masuk lagi atau tetap terbuka
+    OLLAMA_BREAKER_COOLDOWN = float(os.getenv("OLLAMA_BREAKER_COOLDOWN", "15"))
+    # Timeout HTTP: connect terpisah dari read (jeda maksimum antar data dari Ollama).
+    # Timeout connect/read dihitung circuit breaker; budget operasi di bawah tidak
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))
+    OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+    # Batas waktu total per operasi LLM (detik), termasuk antre slot dan retry. Streaming chat:
+    # sampai token pertama; summary JSON: seluruh stream. Background (ringkasan chat, batch):
+    # dihitung sejak dapat slot
+    LLM_BUDGET_CHAT = float(os.getenv("LLM_BUDGET_CHAT", "45"))
+    LLM_BUDGET_SUMMARY = float(os.getenv("LLM_BUDGET_SUMMARY", "120"))
+    LLM_BUDGET_MOTIVATION = float(os.getenv("LLM_BUDGET_MOTIVATION", "60"))
+    LLM_BUDGET_BACKGROUND = float(os.getenv("LLM_BUDGET_BACKGROUND", "180"))
+    # Retry (dengan jitter) hanya untuk kegagalan sebelum Ollama memproses prompt
+    # (gagal connect, 502/503/504), idealnya ke node lain
+    LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+    LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.25"))
 
     # JWT
     JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
     JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
     REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    # Stateless mode: employee_id/employee_code ditandatangani ke access token (tanpa query DB
+    # per request). Access token dibuat singkat karena user nonaktif baru ditolak saat refresh.
+    STATELESS_AUTH = os.getenv("STATELESS_AUTH", "False").lower() in ("1", "true", "yes")
+    STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES", "5"))
+
+    # Login: executor bcrypt ("thread" | "process"), 0 worker = jumlah core
+    PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+    # last_login ditulis write-behind: di-flush per interval atau saat buffer penuh
+    LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "5"))
+    LAST_LOGIN_FLUSH_SIZE = int(os.getenv("LAST_LOGIN_FLUSH_SIZE", "500"))
+
+    # Cache user untuk get_current_user. TTL = staleness maksimum (0 = nonaktif)
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+    # Role yang boleh memakai endpoint admin (comma-separated role_id)
+    ADMIN_ROLE_IDS = {
+        int(x) for x in os.getenv("ADMIN_ROLE_IDS", "1").split(",") if x.strip()
+    }
+
+    # Cache hasil analytics per periode (divalidasi dengan analytics_version di DB)
+    ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "300"))
+    ANALYTICS_CACHE_MAX_SIZE = int(os.getenv("ANALYTICS_CACHE_MAX_SIZE", "256"))
+
+    # Konteks chatbot: budget token prompt (estimasi ~4 karakter/token). N pesan terakhir
+    # dikirim verbatim; pesan yang lebih lama dilipat ke ringkasan per user di background
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2048"))
+    CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "6"))
+    CHAT_SUMMARY_MAX_FOLD = int(os.getenv("CHAT_SUMMARY_MAX_FOLD", "40"))
+    CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "256"))
+    # Sesi chat per user: context KV-cache Ollama dari turn terakhir dipakai ulang selama
+    # TTL (sebaiknya <= OLLAMA_KEEP_ALIVE). 0 = nonaktif, selalu kirim prompt penuh
+    CHAT_SESSION_TTL_SECONDS = float(os.getenv("CHAT_SESSION_TTL_SECONDS", "600"))
+    CHAT_SESSION_MAX_SIZE = int(os.getenv("CHAT_SESSION_MAX_SIZE", "1000"))
+
+    # Single-flight generate summary lintas worker: umur lease (> timeout LLM + antrean)
+    # dan interval polling request duplikat yang menunggu hasil
+    GENERATION_LEASE_SECONDS = float(os.getenv("GENERATION_LEASE_SECONDS", "300"))
+    GENERATION_POLL_INTERVAL = float(os.getenv("GENERATION_POLL_INTERVAL", "0.5"))
+
+    # Motivasi harian digenerate di background saat startup dan setelah tengah malam
+    # (jitter detik antar worker); nonaktif = digenerate saat request pertama hari itu
+    MOTIVATION_PRECOMPUTE = os.getenv("MOTIVATION_PRECOMPUTE", "True").lower() in ("1", "true", "yes")
+    MOTIVATION_PRECOMPUTE_JITTER = float(os.getenv("MOTIVATION_PRECOMPUTE_JITTER", "30"))
+
+    # Job async generate summary: worker per proses (0 = proses ini hanya menerima job),
+    # batas job aktif per user, lease job berjalan, interval polling, maksimum percobaan
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_PER_USER = int(os.getenv("JOB_MAX_PER_USER", "2"))
+    JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    # Endpoint GET /metrics (Prometheus) + middleware latency per route
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ("1", "true", "yes")
+    # Timing per request: fraksi request yang diinstrumentasi (0-1), header Server-Timing,
+    # dan ambang slow request log dalam ms (0 = nonaktif)
+    TIMING_SAMPLE_RATE = float(os.getenv("TIMING_SAMPLE_RATE", "1.0"))
+    SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "True").lower() in ("1", "true", "yes")
+    SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "2000"))
+
+    # Batch generate performance summary
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+    BATCH_UPSERT_SIZE = int(os.getenv("BATCH_UPSERT_SIZE", "20"))
+    # Run 'running' yang updated_at-nya tidak diperbarui selama ini (heartbeat tiap
+    # seperempatnya) dianggap mati dan boleh di-resume dari proses lain
+    BATCH_STALE_SECONDS = float(os.getenv("BATCH_STALE_SECONDS", "120"))
 
 settings = Settings()
\ No newline at end of file
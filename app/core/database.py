@@ -1,11 +1,124 @@
-import psycopg2
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
 from app.core.config import settings
+from app.core.metrics import observe_query
+from app.core.timing import record_span
+
+logger = logging.getLogger(__name__)
+
+_pool: AsyncConnectionPool | None = None
 
-def get_connection():
-    return psycopg2.connect(
+
+def _conninfo() -> str:
+    return make_conninfo(
         host=settings.DB_HOST,
-        database=settings.DB_NAME,
+        dbname=settings.DB_NAME,
         user=settings.DB_USER,
         password=settings.DB_PASSWORD,
-        port=settings.DB_PORT
+        port=settings.DB_PORT,
     )
+
+
+class TimedCursor(psycopg.AsyncCursor):
+    """Cursor default pool: setiap execute/executemany dicatat ke db_query_duration_seconds."""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            observe_query(query, time.perf_counter() - started)
+
+
+async def init_pool() -> AsyncConnectionPool:
+    """Create and open the process-wide async connection pool (idempotent)."""
+    global _pool
+    if _pool is None:
+        pool = AsyncConnectionPool(
+            _conninfo(),
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            timeout=settings.DB_POOL_TIMEOUT,
+            kwargs={"cursor_factory": TimedCursor},
+            # Health check on checkout: connection rusak diganti sebelum dipakai.
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+        await pool.open()
+        _pool = pool
+        logger.info(
+            "DB pool ready (min=%s, max=%s)",
+            settings.DB_POOL_MIN_SIZE,
+            settings.DB_POOL_MAX_SIZE,
+        )
+    return _pool
+
+
+async def close_pool():
+    """Close every pooled connection. Dipanggil saat shutdown aplikasi."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+        logger.info("DB pool closed")
+
+
+@asynccontextmanager
+async def get_db():
+    """
+    Pinjam connection dari pool. Commit saat blok selesai normal, rollback saat exception,
+    lalu kembalikan ke pool.
+
+        async with get_db() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(...)
+    """
+    pool = _pool or await init_pool()
+    started = time.perf_counter()
+    async with pool.connection() as conn:
+        record_span("db.pool_wait", time.perf_counter() - started)
+        yield conn
+
+
+def pool_stats() -> dict:
+    """Pool metrics: ukuran, connection terpakai/idle, antrean, dan waktu tunggu checkout."""
+    if _pool is None:
+        return {
+            "min_size": settings.DB_POOL_MIN_SIZE,
+            "max_size": settings.DB_POOL_MAX_SIZE,
+            "open": 0,
+            "in_use": 0,
+            "idle": 0,
+        }
+    stats = _pool.get_stats()
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    return {
+        "min_size": stats.get("pool_min", settings.DB_POOL_MIN_SIZE),
+        "max_size": stats.get("pool_max", settings.DB_POOL_MAX_SIZE),
+        "open": size,
+        "in_use": size - available,
+        "idle": available,
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": stats.get("requests_num", 0),
+        "checkout_timeouts": stats.get("requests_errors", 0),
+        "broken_replaced": stats.get("connections_lost", 0),
+        "wait_seconds_total": stats.get("requests_wait_ms", 0) / 1000,
+    }
+
+
+def get_connection() -> psycopg.Connection:
+    """Koneksi sync baru tanpa pool (untuk script/one-off). Kode aplikasi pakai get_db()."""
+    return psycopg.connect(_conninfo())
@@ -0,0 +1,228 @@
+"""
+Metrics Prometheus (GET /metrics).
+
+- http_request_duration_seconds : latency per route template (bukan path mentah)
+- db_query_duration_seconds      : latency cur.execute per query, nama diturunkan dari SQL
+                                   (mis. "select:chat_history", "insert:performance_summary")
+- llm_request_duration_seconds   : latency panggilan Ollama (tanpa waktu antre scheduler)
+- llm_phase_duration_seconds     : load / prompt_eval / eval dari payload akhir Ollama
+- llm_tokens_total, llm_tokens_per_second
+- llm_queue_wait_seconds         : waktu antre di scheduler LLM per prioritas
+- gauge pool DB dan antrean LLM dibaca saat scrape (RuntimeCollector)
+
+Metrics per proses; dengan beberapa worker uvicorn, scrape tiap worker terpisah.
+"""
+
+import re
+import time
+from typing import Callable
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.core.timing import record_span, route_template
+
+_HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+_LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+_TPS_BUCKETS = (1, 2.5, 5, 10, 15, 20, 30, 50, 75, 100, 200)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency sampai byte terakhir response",
+    ["method", "route", "status"],
+    buckets=_HTTP_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Latency eksekusi query DB",
+    ["query"],
+    buckets=_DB_BUCKETS,
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds",
+    "Latency panggilan Ollama (setelah dapat slot scheduler; outcome ok/error/timeout/closed/incomplete)",
+    ["model", "backend", "operation", "outcome"],
+    buckets=_LLM_BUCKETS,
+)
+LLM_PHASE_SECONDS = Histogram(
+    "llm_phase_duration_seconds",
+    "Durasi fase Ollama: load model, evaluasi prompt, generation; first_token = sampai chunk stream pertama (client)",
+    ["model", "phase"],
+    buckets=_LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Token yang dievaluasi (prompt) dan dihasilkan (generated)",
+    ["model", "kind"],
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_tokens_per_second",
+    "Kecepatan generation (eval_count / eval_duration)",
+    ["model"],
+    buckets=_TPS_BUCKETS,
+)
+LLM_QUEUE_WAIT_SECONDS = Histogram(
+    "llm_queue_wait_seconds",
+    "Waktu tunggu slot scheduler LLM",
+    ["priority"],
+    buckets=_LLM_BUCKETS,
+)
+
+# Nama query per string SQL (string query di kode konstan, jadi dict ini kecil)
+_query_names: dict[str, str] = {}
+_QUERY_NAMES_MAX = 512
+_WRITE_RE = re.compile(r"\b(insert\s+into|update|delete\s+from)\s+([a-z_][a-z0-9_.]*)", re.IGNORECASE)
+_FROM_RE = re.compile(r"\bfrom\s+([a-z_][a-z0-9_.]*)", re.IGNORECASE)
+_CALL_RE = re.compile(r"^\s*select\s+([a-z_][a-z0-9_]*)\s*\(", re.IGNORECASE)
+# Phase Ollama (field durasi dalam nanodetik)
+_PHASES = (("load", "load_duration"), ("prompt_eval", "prompt_eval_duration"), ("eval", "eval_duration"))
+
+
+def query_name(query) -> str:
+    """
+    "<verb>:<tabel>" dari SQL: tabel target untuk write, tabel FROM pertama (atau fungsi,
+    mis. pg_advisory_xact_lock) untuk select.
+    """
+    if not isinstance(query, str):
+        return "composed"
+    name = _query_names.get(query)
+    if name is None:
+        write = _WRITE_RE.search(query)
+        if write:
+            name = f"{write.group(1).split()[0].lower()}:{write.group(2).lower()}"
+        else:
+            table = _FROM_RE.search(query) or _CALL_RE.search(query)
+            name = f"select:{table.group(1).lower()}" if table else "other"
+        if len(_query_names) < _QUERY_NAMES_MAX:
+            _query_names[query] = name
+    return name
+
+
+def observe_query(query, seconds: float):
+    if not query:
+        return  # health check pool (execute "")
+    name = query_name(query)
+    DB_QUERY_SECONDS.labels(name).observe(seconds)
+    record_span("db." + name.replace(":", "."), seconds)
+
+
+def observe_llm(
+    model: str,
+    backend: str,
+    operation: str,
+    seconds: float,
+    data: dict | None = None,
+    outcome: str = "ok",
+    first_chunk: float | None = None,
+    chunks: int = 0,
+):
+    """
+    Catat satu panggilan Ollama ke backend; data = payload akhir (done=True) jika ada.
+    Stream: first_chunk = detik sampai chunk pertama, chunks = jumlah chunk berisi teks.
+    Stream yang ditutup sebelum payload akhir (mis. generate_json berhenti di kurung
+    penutup) tidak punya durasi dari Ollama: token/detik diestimasi dari sisi client
+    (satu chunk ~ satu token).
+    """
+    model = model or "unknown"
+    LLM_REQUEST_SECONDS.labels(model, backend, operation, outcome).observe(seconds)
+    record_span("llm." + operation, seconds)
+    if first_chunk is not None:
+        LLM_PHASE_SECONDS.labels(model, "first_token").observe(first_chunk)
+        record_span("llm.first_token", first_chunk)
+    if not data:
+        if first_chunk is not None and chunks:
+            LLM_TOKENS.labels(model, "generated").inc(chunks)
+            if seconds > first_chunk and chunks > 1:
+                LLM_TOKENS_PER_SECOND.labels(model).observe((chunks - 1) / (seconds - first_chunk))
+        return
+    for phase, field in _PHASES:
+        ns = data.get(field)
+        if ns:
+            LLM_PHASE_SECONDS.labels(model, phase).observe(ns / 1e9)
+            record_span("llm." + phase, ns / 1e9)
+    prompt_tokens = data.get("prompt_eval_count") or 0
+    eval_tokens = data.get("eval_count") or 0
+    if prompt_tokens:
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    if eval_tokens:
+        LLM_TOKENS.labels(model, "generated").inc(eval_tokens)
+        eval_ns = data.get("eval_duration")
+        if eval_ns:
+            LLM_TOKENS_PER_SECOND.labels(model).observe(eval_tokens / (eval_ns / 1e9))
+
+
+class RuntimeCollector(Collector):
+    """Gauge yang dibaca saat scrape: pool DB, antrean scheduler LLM, status backend Ollama."""
+
+    def __init__(
+        self,
+        pool_stats: Callable[[], dict],
+        scheduler_stats: Callable[[], list[dict]],
+        backend_stats: Callable[[], list[dict]],
+    ):
+        self._pool_stats = pool_stats
+        self._scheduler_stats = scheduler_stats
+        self._backend_stats = backend_stats
+
+    def collect(self):
+        pool = self._pool_stats()
+        connections = GaugeMetricFamily("db_pool_connections", "Connection pool DB per state", labels=["state"])
+        connections.add_metric(["in_use"], pool.get("in_use", 0))
+        connections.add_metric(["idle"], pool.get("idle", 0))
+        yield connections
+        yield GaugeMetricFamily("db_pool_max_size", "Ukuran maksimum pool DB", value=pool.get("max_size", 0))
+        yield GaugeMetricFamily("db_pool_waiting", "Request yang menunggu connection", value=pool.get("waiting", 0))
+
+        in_flight = GaugeMetricFamily("llm_in_flight", "Request Ollama berjalan per backend", labels=["backend"])
+        queued = GaugeMetricFamily("llm_queued", "Request antre per backend/prioritas", labels=["backend", "priority"])
+        for s in self._scheduler_stats():
+            in_flight.add_metric([s["backend"]], s["in_flight"])
+            for priority, count in s["queued"].items():
+                queued.add_metric([s["backend"], priority], count)
+        yield in_flight
+        yield queued
+
+        healthy = GaugeMetricFamily("llm_backend_healthy", "1 jika backend Ollama ikut routing", labels=["backend"])
+        for b in self._backend_stats():
+            healthy.add_metric([b["url"]], 1 if b["healthy"] else 0)
+        yield healthy
+
+        circuit = GaugeMetricFamily(
+            "llm_backend_circuit", "State circuit breaker backend (1 = state aktif)", labels=["backend", "state"]
+        )
+        for b in self._backend_stats():
+            for state in ("closed", "open", "half_open"):
+                circuit.add_metric([b["url"], state], 1 if b["state"] == state else 0)
+        yield circuit
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: latency request per route template sampai response selesai
+    (termasuk seluruh stream SSE). Path tanpa route (404) dicatat sebagai "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_template(scope), str(status)).observe(
+                time.perf_counter() - started
+            )
@@ -1,3 +1,6 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
@@ -28,13 +31,47 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         return False
 
 
+# Executor khusus bcrypt (CPU-bound, sengaja lambat), ukurannya mengikuti jumlah core.
+# Terpisah dari threadpool Starlette supaya login storm tidak menahan request lain.
+_hash_executor: Executor | None = None
+
+
+def _get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        workers = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+        if settings.PASSWORD_HASH_EXECUTOR == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            # bcrypt melepas GIL saat hashing, jadi thread sudah paralel di semua core
+            _hash_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    return _hash_executor
+
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        executor, _hash_executor = _hash_executor, None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password di executor bcrypt, tanpa memblokir event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_hash_executor(), verify_password, plain_password, hashed_password
+    )
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(_truncate_for_bcrypt(password or ""))
 
 
-def create_access_token(data: dict) -> str:
+def create_access_token(data: dict, expires_minutes: int | None = None) -> str:
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(
+        minutes=expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
 
@@ -0,0 +1,143 @@
+"""
+Timing per request: span per fase (query DB, antrean/panggilan LLM, fase service)
+dikumpulkan di contextvar selama request, lalu
+
+- dikirim sebagai header Server-Timing (span yang selesai sebelum header dikirim;
+  untuk SSE hanya fase sebelum stream dimulai),
+- ditulis ke log "app.slow_request" (JSON satu baris, semua span) jika total request
+  >= SLOW_REQUEST_MS.
+
+Hanya TIMING_SAMPLE_RATE dari request yang diinstrumentasi; di luar request
+tersampel span() dan record_span() no-op. asyncio.create_task menyalin contextvar,
+jadi task yang bisa hidup lebih lama dari request-nya dibuat lewat detached_task()
+supaya span-nya tidak masuk ke RequestTiming request tersebut.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+from app.core.config import settings
+
+slow_logger = logging.getLogger("app.slow_request")
+
+# Maksimum entry di header Server-Timing (sisanya hanya di slow log)
+_MAX_HEADER_ENTRIES = 20
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        # nama -> [total detik, jumlah]; urutan = urutan span pertama kali muncul
+        self.spans: dict[str, list] = {}
+
+    def add(self, name: str, seconds: float):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        items = list(self.spans.items())[:_MAX_HEADER_ENTRIES]
+        parts = [f'{name};dur={total * 1000:.1f};desc="x{count}"' for name, (total, count) in items]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[RequestTiming | None] = ContextVar("request_timing", default=None)
+
+
+def record_span(name: str, seconds: float):
+    """Tambah durasi ke span `name` request saat ini (no-op di luar request tersampel)."""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def detached_task(coro) -> asyncio.Task:
+    """asyncio.create_task tanpa RequestTiming request saat ini (span di task no-op)."""
+    context = copy_context()
+    context.run(_current.set, None)
+    return asyncio.create_task(coro, context=context)
+
+
+@contextmanager
+def span(name: str):
+    """Ukur blok (boleh berisi await) sebagai span `name` request saat ini."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+def route_template(scope) -> str:
+    """
+    Template route request ini (mis. "/api/performance/generate/{period}") untuk label
+    metrics; kardinalitas terbatas jumlah route. Route dari include_router bisa hanya
+    membawa path relatif, jadi prefix diambil dari segmen awal path request.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    depth = template.count("/")
+    segments = scope["path"].rstrip("/").split("/")
+    prefix = "/".join(segments[: len(segments) - depth]) if len(segments) > depth else ""
+    return prefix + template
+
+
+class TimingMiddleware:
+    """ASGI middleware: aktifkan RequestTiming, tulis Server-Timing dan slow request log."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= settings.TIMING_SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming()
+        token = _current.set(timing)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.SERVER_TIMING_HEADER:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", timing.header().encode("latin-1"))
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            total = timing.elapsed()
+            if settings.SLOW_REQUEST_MS > 0 and total * 1000 >= settings.SLOW_REQUEST_MS:
+                slow_logger.warning(json.dumps({
+                    "method": scope["method"],
+                    "route": route_template(scope),
+                    "path": scope["path"],
+                    "status": status,
+                    "total_ms": round(total * 1000, 1),
+                    "spans": {
+                        name: {"ms": round(seconds * 1000, 1), "count": count}
+                        for name, (seconds, count) in timing.spans.items()
+                    },
+                }))
@@ -1,23 +1,76 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 from fastapi.exceptions import RequestValidationError
 from app.api.routes import performance, auth, motivation, chat
-from app.utils.response import error_response
+from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, RuntimeCollector
+from app.core.timing import TimingMiddleware
+from app.core.database import init_pool, close_pool, pool_stats
+from app.services.ai_service import close_client
+from app.services.llm_scheduler import LLMOverloaded, scheduler_stats
+from app.services.ollama_pool import LLMUnavailable, backend_stats, start_health_prober, stop_health_prober
+from app.services.batch_service import shutdown_batches
+from app.services.chat_service import shutdown_summaries, chat_session_stats
+from app.services.motivation_service import start_motivation_precompute, stop_motivation_precompute
+from app.services.job_service import start_job_workers, stop_job_workers
+from app.core.security import shutdown_hash_executor
+from app.services.auth_service import user_cache_stats, start_last_login_writer, stop_last_login_writer
+from app.services.analytics_service import analytics_cache_stats
+from app.utils.response import error_response, FastJSONResponse
 
-app = FastAPI(title="Performance Management AI")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Buka DB pool saat startup, tutup semua koneksi (DB + Ollama) saat shutdown."""
+    await init_pool()
+    start_health_prober()
+    start_last_login_writer()
+    start_motivation_precompute()
+    start_job_workers()
+    try:
+        yield
+    finally:
+        await stop_job_workers()
+        await stop_motivation_precompute()
+        await stop_last_login_writer()
+        shutdown_hash_executor()
+        await shutdown_batches()
+        await shutdown_summaries()
+        await stop_health_prober()
+        await close_client()
+        await close_pool()
+
+
+app = FastAPI(title="Performance Management AI", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
 @app.exception_handler(HTTPException)
-def http_exception_handler(request: Request, exc: HTTPException):
+async def http_exception_handler(request: Request, exc: HTTPException):
     """Error dari HTTPException (401, 403, 404, dll) → format standar."""
     detail = exc.detail if isinstance(exc.detail, str) else str(exc.detail)
     body = error_response(message=detail, code=exc.status_code, data=None)
     return JSONResponse(status_code=exc.status_code, content=body)
 
 
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    """Antrean LLM penuh → 429 + Retry-After (estimasi detik sampai ada slot)."""
+    body = error_response(message="Layanan AI sedang sibuk, silakan coba lagi", code=429, data=None)
+    return JSONResponse(status_code=429, content=body, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailable):
+    """Circuit breaker semua backend Ollama open → 503 + Retry-After (sisa cooldown)."""
+    body = error_response(message="Layanan AI sedang tidak tersedia, silakan coba lagi", code=503, data=None)
+    return JSONResponse(status_code=503, content=body, headers={"Retry-After": str(exc.retry_after)})
+
+
 @app.exception_handler(RequestValidationError)
-def validation_exception_handler(request: Request, exc: RequestValidationError):
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Error validasi (422) → format standar."""
     body = error_response(message="Validasi gagal", code=422, data=exc.errors())
     return JSONResponse(status_code=422, content=body)
@@ -31,10 +84,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.TIMING_SAMPLE_RATE > 0:
+    app.add_middleware(TimingMiddleware)
+
+if settings.METRICS_ENABLED:
+    # Paling luar: latency termasuk CORS dan exception handler
+    app.add_middleware(MetricsMiddleware)
+    REGISTRY.register(RuntimeCollector(pool_stats, scheduler_stats, backend_stats))
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """Metrics Prometheus proses ini (route, query DB, LLM per fase/token, pool, antrean)."""
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/")
-def root():
+async def root():
     return {"message": "API is running"}
 
+
+@app.get("/health")
+async def health():
+    """Status API + metrics DB connection pool, cache (user, analytics, sesi chat), antrean dan backend LLM."""
+    return {
+        "status": "ok",
+        "db_pool": pool_stats(),
+        "user_cache": user_cache_stats(),
+        "analytics_cache": analytics_cache_stats(),
+        "chat_sessions": chat_session_stats(),
+        "llm": scheduler_stats(),
+        "llm_backends": backend_stats(),
+    }
+
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(performance.router, prefix="/api/performance", tags=["Performance"])
 app.include_router(motivation.router, prefix="/api/motivation", tags=["Motivation"])
@@ -1,70 +1,376 @@
-import requests
+import asyncio
+import json
+import random
+import time
+from contextlib import aclosing
+from typing import AsyncIterator
+
+import httpx
 from app.core.config import settings
+from app.core.metrics import observe_llm
+from app.services.llm_scheduler import (
+    PRIORITY_INTERACTIVE,
+    PRIORITY_SUMMARY,
+    PRIORITY_BACKGROUND,
+)
+from app.services.ollama_pool import Backend, LLMUnavailable, backends, close_backends, pick_backend
+from app.utils.cache import TTLCache
 
-def _ollama_chat_url():
-    """Base URL untuk Ollama API chat (POST /api/chat)."""
-    base = (settings.OLLAMA_URL or "").rstrip("/")
-    if base.endswith("/generate"):
-        return base[:-9] + "/chat"
-    if "/api/generate" in base:
-        return base.replace("/api/generate", "/api/chat")
-    return (base or "http://localhost:11434") + "/api/chat"
+# Backend yang memegang KV-cache untuk suatu context (hash token context -> URL backend):
+# turn chat berikutnya diarahkan ke node yang sama selama bebannya wajar.
+_context_backends = TTLCache(maxsize=settings.CHAT_SESSION_MAX_SIZE, ttl=settings.CHAT_SESSION_TTL_SECONDS)
 
 
-def _generate(prompt: str, num_predict: int = 400) -> str:
-    """Panggil Ollama /api/generate. Dipakai oleh summary, motivasi, dan chatbot."""
-    response = requests.post(
-        settings.OLLAMA_URL,
-        json={
-            "model": settings.MODEL_NAME,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.5,
-                "top_p": 0.9,
-                "num_predict": num_predict,
-            }
-        },
-        timeout=120,
-    )
-    response.raise_for_status()
-    data = response.json()
+async def close_client():
+    """Tutup koneksi HTTP ke semua backend Ollama. Dipanggil saat shutdown aplikasi."""
+    await close_backends()
+
+
+def _pick(context: list[int] | None = None, exclude: str | None = None) -> Backend:
+    prefer = None
+    if context and len(backends()) > 1:
+        prefer = _context_backends.get(hash(tuple(context)))
+    return pick_backend(settings.MODEL_NAME, prefer, exclude)
+
+
+def _remember_context(backend: Backend, context: list[int] | None):
+    if context and len(backends()) > 1:
+        _context_backends.set(hash(tuple(context)), backend.url)
+
+
+def _generate_payload(
+    prompt: str,
+    num_predict: int,
+    stream: bool,
+    context: list[int] | None = None,
+    format: dict | None = None,
+) -> dict:
+    payload = {
+        "model": settings.MODEL_NAME,
+        "prompt": prompt,
+        "stream": stream,
+        "options": {
+            "temperature": 0.5,
+            "top_p": 0.9,
+            "num_predict": num_predict,
+        }
+    }
+    if context:
+        # Lanjut dari state KV-cache turn sebelumnya: hanya prompt baru yang dievaluasi
+        payload["context"] = context
+    if format:
+        # JSON schema: output dibatasi grammar, valid by construction
+        payload["format"] = format
+    if settings.OLLAMA_KEEP_ALIVE:
+        payload["keep_alive"] = settings.OLLAMA_KEEP_ALIVE
+    return payload
+
+
+def check_capacity(priority: int):
+    """Raise LLMOverloaded jika request dengan priority ini akan ditolak scheduler saat ini."""
+    try:
+        backend = _pick()
+    except LLMUnavailable:
+        # Circuit open: request tetap jalan dan gagal cepat (chat memakai jawaban fallback)
+        return
+    backend.scheduler.check(priority)
+
+
+def _deadline(budget: float, priority: int) -> float | None:
+    """
+    Deadline (waktu loop) operasi LLM. Budget interactive/summary termasuk antre slot;
+    background memang boleh antre lama, jadi deadline baru dihitung saat dapat slot (None).
+    """
+    if priority >= PRIORITY_BACKGROUND:
+        return None
+    return asyncio.get_running_loop().time() + budget
+
+
+def _retryable(e: Exception) -> bool:
+    """Aman diulang: request belum diproses model (gagal connect, node menolak/tidak tersedia)."""
+    if isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (502, 503, 504)
+
+
+def _on_error(backend: Backend, operation: str, started: float, e: Exception, data: dict | None = None, **stream):
+    """
+    Catat kegagalan request yang sudah dikirim: metrics + circuit breaker. Hanya kegagalan
+    dari node (error transport/timeout connect-read httpx, HTTP 5xx) yang dihitung breaker;
+    budget pemanggil yang habis (TimeoutError) bisa terjadi di node sehat yang sibuk,
+    begitu juga PoolTimeout (batas koneksi di sisi aplikasi).
+    """
+    timed_out = isinstance(e, (TimeoutError, httpx.TimeoutException))
+    node_failed = isinstance(e, httpx.TransportError) and not isinstance(e, httpx.PoolTimeout)
+    if node_failed or (isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500):
+        backend.mark_failure(f"{type(e).__name__}: {e}")
+    outcome = "timeout" if timed_out else "error"
+    observe_llm(settings.MODEL_NAME, backend.url, operation, time.perf_counter() - started, data, outcome, **stream)
+
+
+async def _backoff(attempt: int, deadline: float | None) -> bool:
+    """Tunggu sebelum retry berikutnya (full jitter). False jika jatah retry/deadline habis."""
+    if attempt >= settings.LLM_RETRIES:
+        return False
+    delay = random.uniform(0, settings.LLM_RETRY_BACKOFF * 2 ** attempt)
+    if deadline is not None and asyncio.get_running_loop().time() + delay >= deadline:
+        return False
+    await asyncio.sleep(delay)
+    return True
+
+
+async def _post(
+    operation: str,
+    payload: dict,
+    priority: int,
+    budget: float,
+    context: list[int] | None = None,
+) -> dict:
+    """
+    POST non-stream ke Ollama (/api/generate atau /api/chat) dan return response JSON.
+    Seluruh operasi (antre slot + request + retry) dibatasi budget detik -> TimeoutError.
+    Kegagalan sebelum prompt diproses di-retry dengan jitter ke node lain jika ada.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = _deadline(budget, priority)
+    attempt = 0
+    failed = None
+    while True:
+        backend = _pick(context, failed)
+        trial = backend.acquire()
+        started = None
+        try:
+            async with asyncio.timeout_at(deadline) as timeout:
+                async with backend.scheduler.slot(priority):
+                    if deadline is None:
+                        deadline = loop.time() + budget
+                        timeout.reschedule(deadline)
+                    started = time.perf_counter()
+                    url = backend.chat_url if operation == "chat" else backend.generate_url
+                    response = await backend.client.post(url, json=payload)
+                    response.raise_for_status()
+                    data = response.json()
+        except Exception as e:
+            if started is not None:
+                _on_error(backend, operation, started, e)
+            if _retryable(e) and await _backoff(attempt, deadline):
+                attempt += 1
+                failed = backend.url
+                continue
+            raise
+        finally:
+            backend.release(trial)
+        break
+
+    backend.mark_success()
     if data.get("error"):
+        observe_llm(settings.MODEL_NAME, backend.url, operation, time.perf_counter() - started, outcome="error")
         raise ValueError(f"Ollama error: {data.get('error')}")
+    observe_llm(settings.MODEL_NAME, backend.url, operation, time.perf_counter() - started, data)
+    _remember_context(backend, data.get("context"))
+    return data
+
+
+async def _generate_raw(
+    prompt: str,
+    num_predict: int = 400,
+    context: list[int] | None = None,
+    priority: int = PRIORITY_BACKGROUND,
+    budget: float | None = None,
+) -> dict:
+    """Panggil Ollama /api/generate, return response JSON lengkap (response, context, durasi)."""
+    payload = _generate_payload(prompt, num_predict, stream=False, context=context)
+    return await _post("generate", payload, priority, budget or settings.LLM_BUDGET_BACKGROUND, context)
+
+
+async def _generate(
+    prompt: str,
+    num_predict: int = 400,
+    priority: int = PRIORITY_BACKGROUND,
+    budget: float | None = None,
+) -> str:
+    """Panggil Ollama /api/generate. Dipakai oleh summary, motivasi, dan chatbot."""
+    data = await _generate_raw(prompt, num_predict, priority=priority, budget=budget)
     return (data.get("response") or "").strip()
 
 
-def generate_ai_summary(prompt: str) -> str:
-    return _generate(prompt, num_predict=400)
+async def _stream_generate(
+    prompt: str,
+    num_predict: int = 400,
+    context: list[int] | None = None,
+    final: dict | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    format: dict | None = None,
+    budget: float | None = None,
+    total_budget: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Panggil Ollama /api/generate dengan stream=True dan yield potongan teks saat tiba.
+    Keluar dari iterator lebih awal (break/cancel) menutup koneksi HTTP, sehingga
+    Ollama ikut menghentikan generation. final (opsional) diisi payload terakhir
+    (done=True: context, durasi) jika stream selesai normal. Slot scheduler ditahan
+    sampai stream selesai. budget membatasi waktu sampai token pertama (TimeoutError);
+    sesudahnya jeda antar chunk dibatasi OLLAMA_READ_TIMEOUT. total_budget=True: budget
+    berlaku untuk seluruh stream (consumer non-interaktif seperti generate_json). Retry
+    (ke node lain jika ada) hanya sebelum ada potongan yang di-yield.
+    """
+    loop = asyncio.get_running_loop()
+    budget = budget or settings.LLM_BUDGET_CHAT
+    deadline = _deadline(budget, priority)
+    payload = _generate_payload(prompt, num_predict, stream=True, context=context, format=format)
+    attempt = 0
+    failed = None
+    while True:
+        backend = _pick(context, failed)
+        trial = backend.acquire()
+        started = None
+        first_chunk = None
+        chunks = 0
+        last = None
+        outcome = "error"
+        try:
+            async with asyncio.timeout_at(deadline) as timeout:
+                async with backend.scheduler.slot(priority):
+                    if deadline is None:
+                        deadline = loop.time() + budget
+                        timeout.reschedule(deadline)
+                    started = time.perf_counter()
+                    async with backend.client.stream("POST", backend.generate_url, json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.strip():
+                                continue
+                            data = json.loads(line)
+                            if data.get("error"):
+                                raise ValueError(f"Ollama error: {data.get('error')}")
+                            if first_chunk is None:
+                                # Token pertama tiba: node dianggap sehat; budget selesai
+                                # kecuali berlaku untuk seluruh stream
+                                first_chunk = time.perf_counter() - started
+                                if not total_budget:
+                                    timeout.reschedule(None)
+                                backend.mark_success()
+                            chunk = data.get("response") or ""
+                            if chunk:
+                                chunks += 1
+                                yield chunk
+                            if data.get("done"):
+                                last = data
+                                _remember_context(backend, data.get("context"))
+                                if final is not None:
+                                    final.update(data)
+                                break
+            outcome = "ok" if last else "incomplete"
+            return
+        except (GeneratorExit, asyncio.CancelledError):
+            # Consumer berhenti lebih awal (client disconnect, objek JSON sudah lengkap)
+            outcome = "closed"
+            raise
+        except Exception as e:
+            if started is not None:
+                _on_error(backend, "generate_stream", started, e, last, first_chunk=first_chunk, chunks=chunks)
+                started = None
+            if first_chunk is None and _retryable(e) and await _backoff(attempt, deadline):
+                attempt += 1
+                failed = backend.url
+                continue
+            raise
+        finally:
+            backend.release(trial)
+            if started is not None:
+                observe_llm(
+                    settings.MODEL_NAME,
+                    backend.url,
+                    "generate_stream",
+                    time.perf_counter() - started,
+                    last,
+                    outcome,
+                    first_chunk=first_chunk,
+                    chunks=chunks,
+                )
+
+
+async def generate_ai_summary(prompt: str, priority: int = PRIORITY_SUMMARY, budget: float | None = None) -> str:
+    return await _generate(prompt, num_predict=400, priority=priority, budget=budget or settings.LLM_BUDGET_SUMMARY)
+
 
+def _json_object_end(text: str, state: list) -> int:
+    """
+    Scan potongan teks; return index karakter penutup objek JSON teratas, atau -1.
+    state = [depth, in_string, escape] dibawa antar potongan stream.
+    """
+    depth, in_string, escape = state
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                state[:] = [depth, in_string, escape]
+                return i
+    state[:] = [depth, in_string, escape]
+    return -1
 
-def chat_completion(messages: list[dict]) -> str:
+
+async def generate_json(prompt: str, schema: dict, num_predict: int = 800, priority: int = PRIORITY_SUMMARY) -> str:
+    """
+    Generate output JSON terstruktur (option `format` = JSON schema). Stream berhenti
+    begitu objek teratas tertutup: koneksi ditutup sehingga Ollama tidak lanjut
+    menghasilkan whitespace sampai num_predict. LLM_BUDGET_SUMMARY membatasi seluruh
+    generate (bukan hanya sampai token pertama). Return teks JSON (belum di-parse).
+    """
+    parts: list[str] = []
+    state = [0, False, False]
+    stream = _stream_generate(
+        prompt, num_predict, priority=priority, format=schema, budget=settings.LLM_BUDGET_SUMMARY, total_budget=True
+    )
+    async with aclosing(stream) as chunks:
+        async for chunk in chunks:
+            end = _json_object_end(chunk, state)
+            if end >= 0:
+                parts.append(chunk[: end + 1])
+                break
+            parts.append(chunk)
+    return "".join(parts).strip()
+
+
+async def generate_chat_summary(prompt: str) -> str:
+    """Ringkas percakapan lama chatbot (dipanggil di background, bukan di jalur request)."""
+    return await _generate(
+        prompt,
+        num_predict=settings.CHAT_SUMMARY_MAX_TOKENS,
+        priority=PRIORITY_BACKGROUND,
+        budget=settings.LLM_BUDGET_BACKGROUND,
+    )
+
+
+async def chat_completion(messages: list[dict]) -> str:
     """
     Kirim percakapan ke Ollama /api/chat.
     messages: list of {"role": "user"|"assistant"|"system", "content": "..."}
     Returns content dari message terakhir (assistant).
     Raises ValueError jika Ollama mengembalikan error atau content kosong.
     """
-    url = _ollama_chat_url()
-    response = requests.post(
-        url,
-        json={
-            "model": settings.MODEL_NAME,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "temperature": 0.6,
-                "top_p": 0.9,
-                "num_predict": 512,
-            },
+    payload = {
+        "model": settings.MODEL_NAME,
+        "messages": messages,
+        "stream": False,
+        "options": {
+            "temperature": 0.6,
+            "top_p": 0.9,
+            "num_predict": 512,
         },
-        timeout=120,
-    )
-    response.raise_for_status()
-    data = response.json()
-
-    if data.get("error"):
-        raise ValueError(f"Ollama error: {data.get('error')}")
+    }
+    data = await _post("chat", payload, PRIORITY_INTERACTIVE, settings.LLM_BUDGET_CHAT)
 
     msg = data.get("message") or {}
     content = msg.get("content") or data.get("response") or ""
@@ -94,12 +400,35 @@ def _messages_to_prompt(messages: list[dict]) -> str:
     return "\n".join(parts)
 
 
-def chat_via_generate(messages: list[dict]) -> str:
+async def chat_via_generate(messages: list[dict], context: list[int] | None = None) -> tuple[str, list[int] | None]:
     """
     Chatbot pakai /api/generate saja (sama dengan AI summary & motivasi).
     Tidak pakai /api/chat supaya konsisten dan pasti jalan kalau summary jalan.
+    context: state KV-cache dari turn sebelumnya (messages cukup berisi pesan baru).
+    Return (jawaban, context baru untuk turn berikutnya).
+    """
+    prompt = _messages_to_prompt(messages)
+    if not prompt.strip():
+        raise ValueError("Prompt chat kosong")
+    data = await _generate_raw(
+        prompt, num_predict=512, context=context, priority=PRIORITY_INTERACTIVE, budget=settings.LLM_BUDGET_CHAT
+    )
+    return (data.get("response") or "").strip(), data.get("context")
+
+
+async def chat_stream_via_generate(
+    messages: list[dict],
+    context: list[int] | None = None,
+    final: dict | None = None,
+) -> AsyncIterator[str]:
+    """
+    Versi streaming dari chat_via_generate: yield token/potongan teks jawaban asisten.
+    final diisi payload terakhir Ollama (termasuk context baru) saat stream selesai.
     """
     prompt = _messages_to_prompt(messages)
     if not prompt.strip():
         raise ValueError("Prompt chat kosong")
-    return _generate(prompt, num_predict=512)
+    stream = _stream_generate(prompt, num_predict=512, context=context, final=final, budget=settings.LLM_BUDGET_CHAT)
+    async with aclosing(stream) as chunks:
+        async for chunk in chunks:
+            yield chunk
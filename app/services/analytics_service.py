@@ -1,112 +1,140 @@
 """Analytics service for Decision Support System."""
 
-from app.core.database import get_connection
+import time
 
+from app.core.config import settings
+from app.core.database import get_db
+from app.utils.cache import TTLCache
 
-def get_performance_analytics(period: str) -> dict | None:
+# Hasil analytics per (period, version). Entry hanya dipakai jika versinya sama
+# dengan analytics_version di DB (naik via trigger setiap upsert
+# performance_summary), jadi invalidasi berlaku di semua worker. TTL membatasi
+# staleness dari perubahan tabel lain (nama karyawan/departemen).
+_cache = TTLCache(maxsize=settings.ANALYTICS_CACHE_MAX_SIZE, ttl=settings.ANALYTICS_CACHE_TTL_SECONDS)
+
+# Satu query per request: baris periode (LEFT JOIN employees) di-materialize sekali
+# dan semua agregat dihitung dari CTE yang sama (satu scan performance_summary).
+# Rata-rata departemen, top 5 dan bottom 5 hanya dari summary yang punya row employees;
+# distribusi kategori dari semua summary periode (seperti semula). Semua dikembalikan
+# sebagai JSON dalam satu row.
+# Assumes: employees.department_id, departments(id, name)
+_ANALYTICS_QUERY = """
+    WITH s AS MATERIALIZED (
+        SELECT ps.employee_id, e.id AS matched_employee_id, e.employee_code, e.full_name,
+               ps.total_score, ps.performance_category, e.department_id,
+               COALESCE(d.name, 'Unassigned') AS department_name
+        FROM performance_summary ps
+        LEFT JOIN employees e ON e.id = ps.employee_id
+        LEFT JOIN departments d ON d.id = e.department_id
+        WHERE ps.period = %(period)s
+    ),
+    scored AS (
+        SELECT * FROM s WHERE matched_employee_id IS NOT NULL AND total_score IS NOT NULL
+    )
+    SELECT
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                       'department', department_name,
+                       'avg_score', avg_score,
+                       'employee_count', employee_count
+                   ) ORDER BY avg_score DESC), '[]'::json)
+            FROM (
+                SELECT department_name,
+                       ROUND(AVG(total_score)::numeric, 2) AS avg_score,
+                       COUNT(employee_id) AS employee_count
+                FROM scored
+                GROUP BY department_id, department_name
+            ) dept
+        ) AS avg_per_department,
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                       'employee_id', employee_id,
+                       'employee_code', COALESCE(employee_code, ''),
+                       'full_name', full_name,
+                       'total_score', total_score,
+                       'performance_category', COALESCE(performance_category, 'N/A')
+                   ) ORDER BY total_score DESC), '[]'::json)
+            FROM (SELECT * FROM scored ORDER BY total_score DESC LIMIT 5) top
+        ) AS top_performers,
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                       'employee_id', employee_id,
+                       'employee_code', COALESCE(employee_code, ''),
+                       'full_name', full_name,
+                       'total_score', total_score,
+                       'performance_category', COALESCE(performance_category, 'N/A')
+                   ) ORDER BY total_score ASC), '[]'::json)
+            FROM (SELECT * FROM scored ORDER BY total_score ASC LIMIT 5) bottom
+        ) AS underperformers,
+        (
+            SELECT COALESCE(json_agg(json_build_object(
+                       'category', performance_category,
+                       'count', count
+                   ) ORDER BY count DESC), '[]'::json)
+            FROM (
+                SELECT performance_category, COUNT(*) AS count
+                FROM s
+                WHERE performance_category IS NOT NULL
+                GROUP BY performance_category
+            ) cat
+        ) AS category_distribution
+"""
+
+
+async def _get_version(cur, period: str) -> int:
+    await cur.execute("SELECT version FROM analytics_version WHERE period = %s", (period,))
+    row = await cur.fetchone()
+    return row[0] if row else 0
+
+
+def cache_window() -> int:
+    """
+    Nomor jendela TTL cache saat ini, ikut di ETag analytics: perubahan nama karyawan/
+    departemen tidak menaikkan analytics_version, jadi ETag berganti tiap TTL seperti cache.
+    """
+    return int(time.time() // max(settings.ANALYTICS_CACHE_TTL_SECONDS, 1))
+
+
+async def get_analytics_version(period: str) -> int:
+    """Versi data analytics periode (untuk ETag) tanpa membangun hasil analytics."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            return await _get_version(cur, period)
+
+
+async def get_performance_analytics(period: str) -> dict | None:
     """
     Get analytics for Decision Support System:
     - Average score per department
     - Top performers
     - Underperformers
     - Category distribution
+    Served from the per-period cache while its version matches analytics_version.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # 1. Rata-rata skor per departemen
-    # Assumes: employees.department_id, departments(id, name)
-    try:
-        cur.execute("""
-            SELECT COALESCE(d.name, 'Unassigned') AS department_name,
-                   ROUND(AVG(ps.total_score)::numeric, 2) AS avg_score,
-                   COUNT(ps.employee_id) AS employee_count
-            FROM performance_summary ps
-            JOIN employees e ON e.id = ps.employee_id
-            LEFT JOIN departments d ON d.id = e.department_id
-            WHERE ps.period = %s AND ps.total_score IS NOT NULL
-            GROUP BY d.id, d.name
-            ORDER BY avg_score DESC
-        """, (period,))
-        avg_per_department = [
-            {"department": row[0], "avg_score": float(row[1]), "employee_count": row[2]}
-            for row in cur.fetchall()
-        ]
-    except Exception:
-        conn.rollback()
-        # Fallback: overall average if departments table/column doesn't exist
-        cur.execute("""
-            SELECT 'All Employees' AS department_name,
-                   ROUND(AVG(total_score)::numeric, 2) AS avg_score,
-                   COUNT(employee_id) AS employee_count
-            FROM performance_summary
-            WHERE period = %s AND total_score IS NOT NULL
-        """, (period,))
-        row = cur.fetchone()
-        avg_per_department = [
-            {"department": row[0], "avg_score": float(row[1]), "employee_count": row[2]}
-        ] if row and row[1] else []
-
-    # 2. Top performer (top 5 by total_score)
-    cur.execute("""
-        SELECT e.id, e.employee_code, e.full_name, ps.total_score, ps.performance_category
-        FROM performance_summary ps
-        JOIN employees e ON e.id = ps.employee_id
-        WHERE ps.period = %s AND ps.total_score IS NOT NULL
-        ORDER BY ps.total_score DESC
-        LIMIT 5
-    """, (period,))
-    top_performers = [
-        {
-            "employee_id": row[0],
-            "employee_code": row[1] or "",
-            "full_name": row[2],
-            "total_score": float(row[3]) if row[3] else 0,
-            "performance_category": row[4] or "N/A",
-        }
-        for row in cur.fetchall()
-    ]
-
-    # 3. Underperformer (bottom 5 by total_score)
-    cur.execute("""
-        SELECT e.id, e.employee_code, e.full_name, ps.total_score, ps.performance_category
-        FROM performance_summary ps
-        JOIN employees e ON e.id = ps.employee_id
-        WHERE ps.period = %s AND ps.total_score IS NOT NULL
-        ORDER BY ps.total_score ASC
-        LIMIT 5
-    """, (period,))
-    underperformers = [
-        {
-            "employee_id": row[0],
-            "employee_code": row[1] or "",
-            "full_name": row[2],
-            "total_score": float(row[3]) if row[3] else 0,
-            "performance_category": row[4] or "N/A",
-        }
-        for row in cur.fetchall()
-    ]
-
-    # 4. Distribusi kategori
-    cur.execute("""
-        SELECT performance_category, COUNT(*) AS count
-        FROM performance_summary
-        WHERE period = %s AND performance_category IS NOT NULL
-        GROUP BY performance_category
-        ORDER BY count DESC
-    """, (period,))
-    category_distribution = [
-        {"category": row[0], "count": row[1]}
-        for row in cur.fetchall()
-    ]
-
-    cur.close()
-    conn.close()
-
-    return {
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            # Versi dibaca sebelum data: paling buruk hasil yang lebih baru tersimpan
+            # dengan versi lama dan dihitung ulang di request berikutnya.
+            version = await _get_version(cur, period)
+            cached = _cache.get((period, version))
+            if cached is not None:
+                return cached
+
+            await cur.execute(_ANALYTICS_QUERY, {"period": period})
+            row = await cur.fetchone()
+
+    avg_per_department, top_performers, underperformers, category_distribution = row
+    result = {
         "period": period,
+        "version": version,
         "avg_score_per_department": avg_per_department,
         "top_performers": top_performers,
         "underperformers": underperformers,
         "category_distribution": category_distribution,
     }
+    _cache.set((period, version), result)
+    return result
+
+
+def analytics_cache_stats() -> dict:
+    return _cache.stats()
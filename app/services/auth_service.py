@@ -1,40 +1,52 @@
+import asyncio
+import logging
 from datetime import datetime
-import psycopg2
-from app.core.database import get_connection
-from app.core.security import verify_password, create_access_token, create_refresh_token, decode_refresh_token
-
-
-def get_user_by_username(username: str) -> dict | None:
-    """Get user by username. Returns dict with id, username, password_hash, full_name, email, role_id, employee_id.
-    employee_id is None jika kolom belum ada di tabel users."""
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            SELECT id, username, password_hash, full_name, email, role_id, employee_id
-            FROM users
-            WHERE username = %s AND is_active = TRUE
-            """,
-            (username,),
-        )
-    except psycopg2.ProgrammingError:
-        conn.rollback()
-        cur.execute(
-            """
-            SELECT id, username, password_hash, full_name, email, role_id
-            FROM users
-            WHERE username = %s AND is_active = TRUE
-            """,
-            (username,),
-        )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+import psycopg
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.timing import span
+from app.core.security import verify_password_async, create_access_token, create_refresh_token, decode_refresh_token
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# User aktif per username untuk get_current_user. Hanya user yang ditemukan yang di-cache
+# (tanpa password_hash); USER_CACHE_TTL_SECONDS = batas staleness antar worker.
+_user_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+async def get_user_by_username(username: str) -> dict | None:
+    """Get user by username. Returns dict with id, username, password_hash, full_name, email, role_id,
+    employee_id, employee_code. employee_id/employee_code None jika kolom belum ada di tabel users."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            try:
+                await cur.execute(
+                    """
+                    SELECT u.id, u.username, u.password_hash, u.full_name, u.email, u.role_id,
+                           u.employee_id, e.employee_code
+                    FROM users u
+                    LEFT JOIN employees e ON e.id = u.employee_id
+                    WHERE u.username = %s AND u.is_active = TRUE
+                    """,
+                    (username,),
+                )
+            except psycopg.ProgrammingError:
+                await conn.rollback()
+                await cur.execute(
+                    """
+                    SELECT id, username, password_hash, full_name, email, role_id
+                    FROM users
+                    WHERE username = %s AND is_active = TRUE
+                    """,
+                    (username,),
+                )
+            row = await cur.fetchone()
     if not row:
         return None
-    # row bisa 7 kolom (dengan employee_id) atau 6 kolom (tanpa employee_id)
+    # row bisa 8 kolom (dengan employee_id/employee_code) atau 6 kolom (tanpa employee_id)
     employee_id = row[6] if len(row) > 6 else None
+    employee_code = row[7] if len(row) > 7 else None
     return {
         "id": row[0],
         "username": row[1],
@@ -43,25 +55,171 @@ def get_user_by_username(username: str) -> dict | None:
         "email": row[4],
         "role_id": row[5],
         "employee_id": employee_id,
+        "employee_code": employee_code,
     }
 
 
-def update_last_login(user_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET last_login = %s, updated_at = %s WHERE id = %s",
-        (datetime.now(), datetime.now(), user_id),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+async def update_last_login(user_id: int):
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE users SET last_login = %s, updated_at = %s WHERE id = %s",
+                (datetime.now(), datetime.now(), user_id),
+            )
+
+
+# Write-behind last_login: user_id -> waktu login terakhir yang belum ditulis ke DB
+_pending_last_login: dict[int, datetime] = {}
+_last_login_task: asyncio.Task | None = None
+_last_login_flush_lock = asyncio.Lock()
+_last_login_full = asyncio.Event()
+
+
+def record_last_login(user_id: int):
+    """Catat login di buffer; ditulis ke DB oleh flush_last_login (per interval atau saat buffer penuh)."""
+    _pending_last_login[user_id] = datetime.now()
+    if len(_pending_last_login) >= settings.LAST_LOGIN_FLUSH_SIZE:
+        _last_login_full.set()
+
+
+async def flush_last_login() -> int:
+    """Tulis semua last_login yang tertunda dengan satu UPDATE multi-row. Return jumlah user."""
+    global _pending_last_login
+    async with _last_login_flush_lock:
+        if not _pending_last_login:
+            return 0
+        batch, _pending_last_login = _pending_last_login, {}
+        written = False
+        try:
+            async with get_db() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """
+                        UPDATE users AS u
+                        SET last_login = v.ts, updated_at = v.ts
+                        FROM unnest(%s::int[], %s::timestamp[]) AS v(id, ts)
+                        WHERE u.id = v.id
+                        """,
+                        (list(batch.keys()), list(batch.values())),
+                    )
+            written = True
+        except Exception:
+            logger.exception("Flush last_login failed (%s users)", len(batch))
+            return 0
+        finally:
+            if not written:
+                # Gagal atau di-cancel (shutdown) sebelum commit: kembalikan ke buffer
+                # (login yang lebih baru menang) untuk flush berikutnya
+                for user_id, ts in batch.items():
+                    if _pending_last_login.get(user_id, ts) <= ts:
+                        _pending_last_login[user_id] = ts
+        return len(batch)
+
+
+async def _last_login_writer():
+    while True:
+        try:
+            await asyncio.wait_for(_last_login_full.wait(), timeout=settings.LAST_LOGIN_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _last_login_full.clear()
+        await flush_last_login()
+
+
+def start_last_login_writer():
+    """Jalankan flusher last_login di background. Dipanggil saat startup aplikasi."""
+    global _last_login_task
+    if _last_login_task is None:
+        _last_login_task = asyncio.get_running_loop().create_task(_last_login_writer())
+
+
+async def stop_last_login_writer():
+    """Hentikan flusher dan tulis sisa buffer. Dipanggil saat shutdown aplikasi."""
+    global _last_login_task
+    if _last_login_task is not None:
+        task, _last_login_task = _last_login_task, None
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    await flush_last_login()
+
+
+async def get_cached_user(username: str) -> dict | None:
+    """get_user_by_username lewat cache LRU+TTL (tanpa password_hash). Dipakai per request terautentikasi."""
+    user = _user_cache.get(username)
+    if user is not None:
+        return user
+    user = await get_user_by_username(username)
+    if not user:
+        return None
+    user = {k: v for k, v in user.items() if k != "password_hash"}
+    _user_cache.set(username, user)
+    return user
+
+
+def invalidate_user(user_id: int | None = None, username: str | None = None):
+    """Hapus user dari cache (mis. setelah dinonaktifkan atau datanya berubah)."""
+    if username is not None:
+        _user_cache.pop(username)
+    if user_id is not None:
+        _user_cache.pop_where(lambda _k, u: u["id"] == user_id)
+
+
+def user_cache_stats() -> dict:
+    return _user_cache.stats()
+
+
+async def deactivate_user(user_id: int) -> bool:
+    """Set is_active = FALSE dan invalidate cache. Return False jika user tidak ada."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE users SET is_active = FALSE, updated_at = %s
+                WHERE id = %s
+                RETURNING username
+                """,
+                (datetime.now(), user_id),
+            )
+            row = await cur.fetchone()
+    if not row:
+        return False
+    invalidate_user(user_id=user_id, username=row[0])
+    return True
 
 
 def _token_payload(user: dict) -> dict:
     return {"sub": str(user["id"]), "username": user["username"], "role_id": user["role_id"]}
 
 
+def _access_token(user: dict) -> str:
+    """
+    Access token. Dengan STATELESS_AUTH, employee_id/employee_code ikut ditandatangani
+    dan masa berlakunya dipersingkat: route terproteksi tidak perlu query users sama sekali,
+    status aktif user dicek ulang saat refresh.
+    """
+    data = _token_payload(user)
+    if not settings.STATELESS_AUTH:
+        return create_access_token(data=data)
+    data["employee_id"] = user["employee_id"]
+    data["employee_code"] = user["employee_code"]
+    return create_access_token(
+        data=data, expires_minutes=settings.STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+
+
+def user_from_claims(payload: dict) -> dict | None:
+    """Current user dari claims access token stateless; None jika token bukan token stateless."""
+    if not settings.STATELESS_AUTH or "employee_id" not in payload:
+        return None
+    return {
+        "id": int(payload["sub"]),
+        "username": payload.get("username"),
+        "role_id": payload.get("role_id"),
+        "employee_id": payload.get("employee_id"),
+        "employee_code": payload.get("employee_code"),
+    }
+
+
 def _user_info(user: dict) -> dict:
     return {
         "id": user["id"],
@@ -73,43 +231,44 @@ def _user_info(user: dict) -> dict:
     }
 
 
-def login(username: str, password: str) -> dict | None:
+async def login(username: str, password: str) -> dict | None:
     """
     Validate credentials and return token payload: { access_token, refresh_token, token_type, user }.
     Returns None if invalid.
     """
-    user = get_user_by_username(username)
+    with span("auth.user_lookup"):
+        user = await get_user_by_username(username)
     if not user:
         return None
-    if not verify_password(password, user["password_hash"]):
+    with span("auth.verify_password"):
+        verified = await verify_password_async(password, user["password_hash"])
+    if not verified:
         return None
-    update_last_login(user["id"])
-    data = _token_payload(user)
-    access_token = create_access_token(data=data)
-    refresh_token = create_refresh_token(data=data)
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-        "user": _user_info(user),
-    }
+    record_last_login(user["id"])
+    with span("auth.tokens"):
+        return {
+            "access_token": _access_token(user),
+            "refresh_token": create_refresh_token(data=_token_payload(user)),
+            "token_type": "bearer",
+            "user": _user_info(user),
+        }
 
 
-def refresh_tokens(refresh_token: str) -> dict | None:
+async def refresh_tokens(refresh_token: str) -> dict | None:
     """
     Validasi refresh_token dan kembalikan access_token + refresh_token baru (rotation).
+    User dibaca ulang dari DB (bukan cache), jadi user nonaktif tidak mendapat token baru.
     Return { access_token, refresh_token, token_type, user } atau None jika invalid.
     """
     payload = decode_refresh_token(refresh_token)
     if not payload or "username" not in payload:
         return None
-    user = get_user_by_username(payload["username"])
+    user = await get_user_by_username(payload["username"])
     if not user:
         return None
-    data = _token_payload(user)
     return {
-        "access_token": create_access_token(data=data),
-        "refresh_token": create_refresh_token(data=data),
+        "access_token": _access_token(user),
+        "refresh_token": create_refresh_token(data=_token_payload(user)),
         "token_type": "bearer",
         "user": _user_info(user),
     }
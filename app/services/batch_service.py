@@ -0,0 +1,360 @@
+"""
+Batch generate performance summary untuk satu periode (opsional per departemen).
+
+KPI semua karyawan target diambil dengan satu query, panggilan LLM dijalankan paralel
+dengan batas concurrency, hasilnya di-upsert per batch. Progress disimpan di tabel
+performance_batch_run sehingga run yang terhenti bisa di-resume tanpa mengulang
+karyawan yang summary-nya sudah tergenerate sejak run dimulai; run yang berjalan
+memperbarui updated_at (heartbeat) sehingga run 'running' di proses lain tidak ikut
+di-resume selama masih hidup. Karyawan yang data
+KPI-nya tidak berubah (fingerprint sama) dilewati kecuali run dibuat dengan force.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from itertools import groupby
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.timing import detached_task
+from app.services.llm_scheduler import PRIORITY_BACKGROUND
+from app.services.ollama_pool import LLMUnavailable
+from app.services.performance_service import summarize_kpi, save_summaries, input_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Run yang sedang berjalan di proses ini: run_id -> Task
+_active: dict[int, asyncio.Task] = {}
+# Progress live (in-memory) untuk throughput: run_id -> dict
+_progress: dict[int, dict] = {}
+# Berapa kali satu karyawan menunggu cooldown saat semua node Ollama open; setelah itu
+# run dihentikan (status failed) dan bisa di-resume
+_UNAVAILABLE_RETRIES = 5
+
+_RUN_COLUMNS = """
+    id, period, department_id, concurrency, force, status, total, succeeded,
+    skipped, failed, error, created_by, started_at, updated_at, finished_at
+"""
+
+# KPI semua karyawan target dalam satu query, beserta fingerprint summary tersimpan.
+# Karyawan yang summary-nya sudah digenerate sejak run dimulai dilewati (resume).
+_BATCH_KPI_QUERY = """
+    SELECT a.employee_id, ps.input_fingerprint, e.full_name, k.kpi_name, a.target_value,
+           r.actual_value, r.achievement_percentage
+    FROM kpi_assignment a
+    JOIN employees e ON e.id = a.employee_id
+    JOIN kpi_master k ON k.id = a.kpi_id
+    JOIN kpi_realization r ON r.assignment_id = a.id
+    LEFT JOIN performance_summary ps
+           ON ps.employee_id = a.employee_id AND ps.period = a.period
+    WHERE a.period = %(period)s
+      AND (%(department_id)s::int IS NULL OR e.department_id = %(department_id)s::int)
+      AND (ps.generated_at IS NULL OR ps.generated_at < %(started_at)s)
+    ORDER BY a.employee_id, k.kpi_name, a.id
+"""
+
+
+def _run_to_dict(row) -> dict:
+    run = {
+        "id": row[0],
+        "period": row[1],
+        "department_id": row[2],
+        "concurrency": row[3],
+        "force": row[4],
+        "status": row[5],
+        "total": row[6],
+        "succeeded": row[7],
+        "skipped": row[8],
+        "failed": row[9],
+        "error": row[10],
+        "created_by": row[11],
+        "started_at": row[12],
+        "updated_at": row[13],
+        "finished_at": row[14],
+    }
+    live = _progress.get(run["id"])
+    if live:
+        elapsed = max(time.monotonic() - live["started"], 1e-9)
+        done = live["succeeded"] + live["failed"]
+        run["pending"] = max(live["total"] - done, 0)
+        run["throughput_per_min"] = round(done / elapsed * 60, 2)
+    return run
+
+
+async def get_batch_run(run_id: int) -> dict | None:
+    """Status run: counters dari DB + throughput live jika run berjalan di proses ini."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"SELECT {_RUN_COLUMNS} FROM performance_batch_run WHERE id = %s",
+                (run_id,),
+            )
+            row = await cur.fetchone()
+    return _run_to_dict(row) if row else None
+
+
+async def start_batch(
+    period: str,
+    department_id: int | None = None,
+    concurrency: int | None = None,
+    created_by: int | None = None,
+    force: bool = False,
+) -> dict:
+    """
+    Buat run baru dan jalankan di background. Return status run.
+    force=True: generate ulang juga karyawan yang data KPI-nya tidak berubah.
+    """
+    concurrency = max(1, min(concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY))
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                INSERT INTO performance_batch_run
+                (period, department_id, concurrency, force, created_by, started_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING {_RUN_COLUMNS}
+                """,
+                (period, department_id, concurrency, force, created_by, datetime.now()),
+            )
+            row = await cur.fetchone()
+    run = _run_to_dict(row)
+    _spawn(run)
+    return run
+
+
+async def resume_batch(run_id: int, concurrency: int | None = None) -> dict | None:
+    """
+    Lanjutkan run yang terhenti (crash/restart). Karyawan yang sudah selesai sejak
+    started_at run tidak diulang. Return None jika run tidak ada, sudah selesai,
+    atau masih berjalan (di proses ini, atau di proses lain dengan heartbeat yang
+    lebih baru dari BATCH_STALE_SECONDS).
+    """
+    if run_id in _active:
+        return None
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                UPDATE performance_batch_run
+                SET status = 'running', error = NULL, finished_at = NULL,
+                    concurrency = COALESCE(%s, concurrency), updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                  AND (status IN ('failed', 'interrupted')
+                       OR (status = 'running'
+                           AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)))
+                RETURNING {_RUN_COLUMNS}
+                """,
+                (concurrency, run_id, settings.BATCH_STALE_SECONDS),
+            )
+            row = await cur.fetchone()
+    if not row:
+        return None
+    run = _run_to_dict(row)
+    _spawn(run)
+    return run
+
+
+def _spawn(run: dict):
+    task = detached_task(run_batch(run))
+    _active[run["id"]] = task
+    task.add_done_callback(lambda _t, run_id=run["id"]: _active.pop(run_id, None))
+
+
+async def _load_kpi(run: dict) -> tuple[list[tuple[int, list]], int]:
+    """
+    ([(employee_id, kpi_rows)], skipped) untuk karyawan yang belum selesai di run ini.
+    skipped = karyawan yang summary-nya masih sesuai data KPI (tidak dihitung jika force).
+    """
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                _BATCH_KPI_QUERY,
+                {
+                    "period": run["period"],
+                    "department_id": run["department_id"],
+                    "started_at": run["started_at"],
+                },
+            )
+            rows = await cur.fetchall()
+    targets, skipped = [], 0
+    for employee_id, group in groupby(rows, key=lambda r: r[0]):
+        group = list(group)
+        # Bentuk row sama dengan performance_service._KPI_QUERY
+        data = [tuple(r[2:]) for r in group]
+        if not run["force"] and group[0][1] == input_fingerprint(data):
+            skipped += 1
+            continue
+        targets.append((employee_id, data))
+    return targets, skipped
+
+
+async def _flush(run_id: int, rows: list[tuple], failed: int):
+    """Upsert satu batch summary + update counter run dalam satu transaksi."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await save_summaries(cur, rows)
+            await cur.execute(
+                """
+                UPDATE performance_batch_run
+                SET succeeded = succeeded + %s, failed = failed + %s,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                (len(rows), failed, run_id),
+            )
+
+
+async def _heartbeat(run_id: int):
+    """Perbarui updated_at selama run hidup (penanda untuk resume dari proses lain)."""
+    while True:
+        await asyncio.sleep(settings.BATCH_STALE_SECONDS / 4)
+        try:
+            async with get_db() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        "UPDATE performance_batch_run SET updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                        (run_id,),
+                    )
+        except Exception as e:
+            logger.warning("Batch run %s: heartbeat failed: %s", run_id, e)
+
+
+async def _finish(run_id: int, status: str, error: str | None = None):
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE performance_batch_run
+                SET status = %s, error = %s, finished_at = CURRENT_TIMESTAMP,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                (status, error, run_id),
+            )
+
+
+async def run_batch(run: dict):
+    """
+    Jalankan satu run sampai selesai. run["concurrency"] worker mengambil karyawan
+    dari antrean bersama; satu writer meng-upsert hasil per BATCH_UPSERT_SIZE row.
+    """
+    run_id = run["id"]
+    heartbeat = asyncio.create_task(_heartbeat(run_id))
+    try:
+        await _run(run)
+    finally:
+        heartbeat.cancel()
+
+
+async def _run(run: dict):
+    run_id = run["id"]
+    try:
+        targets, skipped = await _load_kpi(run)
+    except Exception as e:
+        logger.exception("Batch run %s: failed to load KPI data", run_id)
+        await _finish(run_id, "failed", str(e))
+        return
+
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            # total = yang sudah selesai + yang tersisa (resume tidak menghitung ulang)
+            await cur.execute(
+                """
+                UPDATE performance_batch_run
+                SET total = succeeded + %s, skipped = %s, failed = 0
+                WHERE id = %s
+                """,
+                (len(targets), skipped, run_id),
+            )
+
+    progress = {"total": len(targets), "succeeded": 0, "failed": 0, "started": time.monotonic()}
+    _progress[run_id] = progress
+    logger.info(
+        "Batch run %s: period=%s department=%s employees=%s unchanged=%s concurrency=%s",
+        run_id, run["period"], run["department_id"], len(targets), skipped, run["concurrency"],
+    )
+
+    pending_targets = iter(targets)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def summarize(employee_id: int, data: list) -> tuple | None:
+        for attempt in range(_UNAVAILABLE_RETRIES + 1):
+            try:
+                return await summarize_kpi(employee_id, run["period"], data, priority=PRIORITY_BACKGROUND)
+            except LLMUnavailable as e:
+                # Semua node Ollama open: tunggu cooldown, jangan gagalkan sisa batch sekaligus
+                if attempt == _UNAVAILABLE_RETRIES:
+                    raise
+                await asyncio.sleep(e.retry_after)
+            except Exception as e:
+                logger.warning("Batch run %s: employee_id=%s failed: %s", run_id, employee_id, e)
+                return None
+
+    async def worker():
+        for employee_id, data in pending_targets:
+            await results.put(await summarize(employee_id, data))
+
+    async def writer():
+        pending, failed = [], 0
+        for _ in range(len(targets)):
+            row = await results.get()
+            if row is None:
+                failed += 1
+            else:
+                pending.append(row)
+            if len(pending) + failed >= settings.BATCH_UPSERT_SIZE:
+                await _flush(run_id, pending, failed)
+                progress["succeeded"] += len(pending)
+                progress["failed"] += failed
+                pending, failed = [], 0
+                _log_progress(run_id, progress)
+        if pending or failed:
+            await _flush(run_id, pending, failed)
+            progress["succeeded"] += len(pending)
+            progress["failed"] += failed
+
+    tasks = [asyncio.create_task(worker()) for _ in range(min(run["concurrency"], len(targets)))]
+    tasks.append(asyncio.create_task(writer()))
+    try:
+        await asyncio.gather(*tasks)
+        await _finish(run_id, "completed")
+        _log_progress(run_id, progress)
+    except asyncio.CancelledError:
+        for t in tasks:
+            t.cancel()
+        await asyncio.shield(_finish(run_id, "interrupted"))
+        raise
+    except Exception as e:
+        logger.exception("Batch run %s failed", run_id)
+        for t in tasks:
+            t.cancel()
+        await _finish(run_id, "failed", str(e))
+    finally:
+        _progress.pop(run_id, None)
+
+
+def _log_progress(run_id: int, progress: dict):
+    done = progress["succeeded"] + progress["failed"]
+    elapsed = max(time.monotonic() - progress["started"], 1e-9)
+    logger.info(
+        "Batch run %s: %s/%s done (%s failed), %.1f employees/min",
+        run_id, done, progress["total"], progress["failed"], done / elapsed * 60,
+    )
+
+
+async def wait_batch(run_id: int):
+    """Tunggu run yang berjalan di proses ini sampai selesai (dipakai script CLI)."""
+    task = _active.get(run_id)
+    if task:
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def shutdown_batches():
+    """Cancel run yang sedang berjalan (status jadi 'interrupted', bisa di-resume)."""
+    tasks = list(_active.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,14 +1,32 @@
 """
 Chatbot EP: konteks terbatas pada aplikasi Performance Management AI.
-History disimpan per user di tabel chat_history.
+History disimpan per user di tabel chat_history; pesan lama dilipat ke ringkasan
+berjalan di tabel chat_summary supaya ukuran prompt per turn tetap datar.
 """
 
+import asyncio
+import base64
+import json
 import logging
+from contextlib import aclosing
 from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable
+
+import httpx
 
 logger = logging.getLogger(__name__)
-from app.core.database import get_connection
-from app.services.ai_service import chat_via_generate
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.timing import detached_task, span
+from app.services.ai_service import (
+    chat_via_generate,
+    chat_stream_via_generate,
+    generate_chat_summary,
+    check_capacity,
+)
+from app.services.llm_scheduler import PRIORITY_INTERACTIVE, LLMOverloaded
+from app.services.ollama_pool import LLMUnavailable
+from app.utils.cache import TTLCache
 
 # System prompt: batasi konteks hanya ke domain aplikasi
 CHAT_SYSTEM_PROMPT = """Anda adalah asisten chatbot dari aplikasi **Performance Management AI** (EP).
@@ -36,62 +54,424 @@ Aturan:
 9. Gunakan kata: "Anda", "performa Anda", "KPI Anda"
 """
 
-# Jumlah pesan history terakhir (user+assistant) yang dikirim ke model (untuk konteks)
+# Jumlah maksimum pesan history (user+assistant) yang belum diringkas untuk konteks model;
+# yang benar-benar dikirim dibatasi lagi oleh CHAT_CONTEXT_TOKEN_BUDGET
 MAX_HISTORY_MESSAGES = 20
 
+CHAT_SUMMARY_CONTEXT = "Ringkasan percakapan sebelumnya dengan user ini:\n"
+
+CHAT_SUMMARY_PROMPT = """Ringkas percakapan antara user (karyawan) dan asisten aplikasi Performance Management berikut.
+Gabungkan dengan ringkasan sebelumnya jika ada. Pertahankan fakta penting: pertanyaan user,
+KPI/periode yang dibahas, rekomendasi yang sudah diberikan, dan hal yang belum terjawab.
+Tulis dalam bahasa Indonesia, maksimal 8 kalimat, tanpa pembuka atau penutup.
+"""
+
+# Sesi chat per user: context KV-cache Ollama setelah jawaban terakhir + id pesan jawaban
+# itu. Turn berikutnya cukup mengirim pesan baru; sesi basi (pesan lain masuk lewat
+# worker lain, TTL habis, context melewati budget) jatuh ke prompt penuh.
+_sessions = TTLCache(maxsize=settings.CHAT_SESSION_MAX_SIZE, ttl=settings.CHAT_SESSION_TTL_SECONDS)
+
+# Refresh ringkasan yang sedang berjalan di proses ini: user_id -> Task
+_summary_tasks: dict[int, asyncio.Task] = {}
+
+CHAT_ERROR_REPLY = "Maaf, terjadi gangguan saat memproses. Silakan coba lagi."
+CHAT_EMPTY_REPLY = "Maaf, saya tidak dapat menghasilkan jawaban."
+
 
-def _save_message(user_id: int, role: str, content: str) -> int:
+async def _save_message(user_id: int, role: str, content: str) -> int:
     """Simpan satu pesan ke chat_history. Return id."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO chat_history (user_id, role, content, created_at)
-        VALUES (%s, %s, %s, %s)
-        RETURNING id
-        """,
-        (user_id, role, content, datetime.now()),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    msg_id = row[0] if row else None
-    cur.close()
-    conn.close()
-    return msg_id
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                INSERT INTO chat_history (user_id, role, content, created_at)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+                """,
+                (user_id, role, content, datetime.now()),
+            )
+            row = await cur.fetchone()
+    return row[0] if row else None
+
+
+async def _delete_message(user_id: int, message_id: int):
+    """Hapus pesan user yang turn-nya ditolak scheduler (tidak ada jawaban yang disimpan)."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "DELETE FROM chat_history WHERE id = %s AND user_id = %s",
+                (message_id, user_id),
+            )
+
+
+_HISTORY_COLUMNS = "id, role, content, created_at"
+
+
+class InvalidCursor(ValueError):
+    """Cursor pagination history tidak valid."""
+
+
+def _row_to_message(r) -> dict:
+    return {
+        "id": r[0],
+        "role": r[1],
+        "content": r[2],
+        "created_at": r[3],
+    }
+
+
+def encode_cursor(message: dict) -> str:
+    """Cursor opaque untuk posisi (created_at, id) satu pesan."""
+    raw = json.dumps([message["created_at"].isoformat(), message["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, message_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e)) from e
+
+
+def parse_history_cursor(before: str | None, after: str | None) -> tuple[datetime, int] | None:
+    """Validasi cursor before/after; return posisi cursor (None tanpa cursor). Raise InvalidCursor."""
+    if before and after:
+        raise InvalidCursor("before dan after tidak bisa dipakai bersamaan")
+    return decode_cursor(after or before) if (after or before) else None
 
 
-def get_chat_history(user_id: int, limit: int = 50) -> list[dict]:
+async def get_chat_history(user_id: int, limit: int = 50) -> list[dict]:
     """
-    Ambil riwayat chat user (terbaru di akhir).
+    Ambil `limit` pesan terbaru user (urut kronologis, terbaru di akhir).
     Return list of { "id", "role", "content", "created_at" }.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, role, content, created_at
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                SELECT {_HISTORY_COLUMNS}
+                FROM chat_history
+                WHERE user_id = %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+                """,
+                (user_id, limit),
+            )
+            rows = await cur.fetchall()
+    return [_row_to_message(r) for r in reversed(rows)]
+
+
+async def get_history_marker(user_id: int) -> tuple | None:
+    """(created_at, id) pesan terbaru user; berubah setiap ada pesan baru (untuk ETag)."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT created_at, id FROM chat_history
+                WHERE user_id = %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT 1
+                """,
+                (user_id,),
+            )
+            return await cur.fetchone()
+
+
+async def get_chat_history_page(
+    user_id: int,
+    limit: int = 50,
+    before: str | None = None,
+    after: str | None = None,
+) -> dict:
+    """
+    Satu halaman history (keyset pagination pada (created_at, id), urut kronologis).
+    Tanpa cursor: `limit` pesan terbaru. before: pesan yang lebih lama dari cursor,
+    after: pesan yang lebih baru dari cursor.
+    Return { "history", "prev", "next" }; prev/next = cursor halaman lebih lama/baru,
+    None jika tidak ada pesan lagi ke arah itu. Raise InvalidCursor jika cursor rusak.
+    """
+    cursor = parse_history_cursor(before, after)
+
+    # Ambil limit + 1 baris untuk tahu apakah masih ada pesan setelah halaman ini
+    if after:
+        condition, order = "AND (created_at, id) > (%s, %s)", "ASC"
+    elif before:
+        condition, order = "AND (created_at, id) < (%s, %s)", "DESC"
+    else:
+        condition, order = "", "DESC"
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                SELECT {_HISTORY_COLUMNS}
+                FROM chat_history
+                WHERE user_id = %s {condition}
+                ORDER BY created_at {order}, id {order}
+                LIMIT %s
+                """,
+                (user_id, *(cursor or ()), limit + 1),
+            )
+            rows = await cur.fetchall()
+    return _history_page(rows, limit, before, after)
+
+
+def _history_page(rows: list, limit: int, before: str | None, after: str | None) -> dict:
+    """
+    Halaman dari hasil query keyset (maksimal limit + 1 baris, urut menjauhi cursor:
+    ASC untuk after, DESC selain itu). Return { "history", "prev", "next" }.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not after:
+        rows = rows[::-1]
+    history = [_row_to_message(r) for r in rows]
+    if not history:
+        return {"history": [], "prev": None, "next": None}
+
+    # Arah yang dibaca: ada lagi jika has_more. Arah sebaliknya: ada jika datang dari cursor.
+    has_older = has_more if not after else True
+    has_newer = has_more if after else bool(before)
+    return {
+        "history": history,
+        "prev": encode_cursor(history[0]) if has_older else None,
+        "next": encode_cursor(history[-1]) if has_newer else None,
+    }
+
+
+def _estimate_tokens(text: str) -> int:
+    """Estimasi kasar token (~4 karakter/token + overhead label role), tanpa tokenizer model."""
+    return len(text or "") // 4 + 4
+
+
+async def _get_summary(cur, user_id: int) -> tuple[str, datetime, int] | None:
+    """(summary, last_created_at, last_message_id) atau None jika belum ada ringkasan."""
+    await cur.execute(
+        "SELECT summary, last_created_at, last_message_id FROM chat_summary WHERE user_id = %s",
+        (user_id,),
+    )
+    return await cur.fetchone()
+
+
+async def _unsummarized(cur, user_id: int, summary, limit: int) -> list[dict]:
+    """`limit` pesan terbaru yang belum dilipat ke ringkasan, urut kronologis."""
+    boundary = summary[1:] if summary else ()
+    await cur.execute(
+        f"""
+        SELECT {_HISTORY_COLUMNS}
         FROM chat_history
-        WHERE user_id = %s
-        ORDER BY created_at ASC
+        WHERE user_id = %s {"AND (created_at, id) > (%s, %s)" if summary else ""}
+        ORDER BY created_at DESC, id DESC
         LIMIT %s
         """,
-        (user_id, limit),
+        (user_id, *boundary, limit),
     )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return [
-        {
-            "id": r[0],
-            "role": r[1],
-            "content": r[2],
-            "created_at": r[3],
-        }
-        for r in rows
-    ]
-
-
-def send_message(user_id: int, user_message: str) -> dict | None:
+    rows = await cur.fetchall()
+    return [_row_to_message(r) for r in reversed(rows)]
+
+
+async def _build_messages(user_id: int) -> tuple[list[dict], bool]:
+    """
+    System prompt + ringkasan percakapan lama + pesan terbaru dalam CHAT_CONTEXT_TOKEN_BUDGET.
+    Pesan yang belum diringkas diambil dari yang terbaru ke belakang sampai budget habis
+    (pesan user terakhir selalu ikut). Return (messages, perlu_refresh_ringkasan).
+    """
+    recent_limit = max(MAX_HISTORY_MESSAGES, 2 * settings.CHAT_RECENT_MESSAGES)
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            summary = await _get_summary(cur, user_id)
+            history = await _unsummarized(cur, user_id, summary, recent_limit)
+
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    if summary:
+        messages.append({"role": "system", "content": CHAT_SUMMARY_CONTEXT + summary[0]})
+    budget = settings.CHAT_CONTEXT_TOKEN_BUDGET - sum(_estimate_tokens(m["content"]) for m in messages)
+
+    recent = []
+    for h in reversed(history):
+        cost = _estimate_tokens(h["content"])
+        if recent and cost > budget:
+            break
+        recent.append({"role": h["role"], "content": h["content"]})
+        budget -= cost
+    messages.extend(reversed(recent))
+
+    # Ringkasan di-refresh per beberapa turn (bukan tiap pesan): setelah jawaban
+    # asisten disimpan, pesan yang belum diringkas sudah 2x CHAT_RECENT_MESSAGES.
+    needs_summary = len(history) + 1 >= 2 * settings.CHAT_RECENT_MESSAGES
+    return messages, needs_summary
+
+
+def _summary_prompt(previous: str | None, history: list[dict]) -> str:
+    lines = [CHAT_SUMMARY_PROMPT]
+    if previous:
+        lines.append(f"Ringkasan sebelumnya:\n{previous}\n")
+    lines.append("Percakapan lanjutan:")
+    for h in history:
+        label = "User" if h["role"] == "user" else "Asisten"
+        lines.append(f"{label}: {h['content']}")
+    lines.append("\nRingkasan terbaru:")
+    return "\n".join(lines)
+
+
+async def refresh_summary(user_id: int):
+    """
+    Lipat pesan yang lebih lama dari CHAT_RECENT_MESSAGES terakhir ke ringkasan user.
+    Maksimal CHAT_SUMMARY_MAX_FOLD pesan per refresh; pesan yang lebih lama dari itu
+    (history panjang sebelum fitur ini) dilewati supaya biaya refresh tetap terbatas.
+    """
+    keep = settings.CHAT_RECENT_MESSAGES
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            summary = await _get_summary(cur, user_id)
+            history = await _unsummarized(cur, user_id, summary, settings.CHAT_SUMMARY_MAX_FOLD + keep)
+    fold = history[:-keep] if keep else history
+    if not fold:
+        return
+
+    text = (await generate_chat_summary(_summary_prompt(summary[0] if summary else None, fold))).strip()
+    if not text:
+        return
+    last = fold[-1]
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            # Refresh paralel (worker lain) tidak boleh memundurkan batas ringkasan
+            await cur.execute(
+                """
+                INSERT INTO chat_summary (user_id, summary, last_created_at, last_message_id)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE
+                SET summary = EXCLUDED.summary,
+                    last_created_at = EXCLUDED.last_created_at,
+                    last_message_id = EXCLUDED.last_message_id,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE (chat_summary.last_created_at, chat_summary.last_message_id)
+                      < (EXCLUDED.last_created_at, EXCLUDED.last_message_id)
+                """,
+                (user_id, text, last["created_at"], last["id"]),
+            )
+    logger.info("Chat summary user_id=%s: folded %s messages", user_id, len(fold))
+
+
+async def _refresh_summary_task(user_id: int):
+    try:
+        await refresh_summary(user_id)
+    except Exception as e:
+        logger.warning("Chat summary user_id=%s failed: %s", user_id, e)
+
+
+def schedule_summary_refresh(user_id: int):
+    """Refresh ringkasan di background; maksimal satu refresh berjalan per user di proses ini."""
+    if user_id in _summary_tasks:
+        return
+    task = detached_task(_refresh_summary_task(user_id))
+    _summary_tasks[user_id] = task
+    task.add_done_callback(lambda _t: _summary_tasks.pop(user_id, None))
+
+
+async def shutdown_summaries():
+    """Cancel refresh ringkasan yang sedang berjalan (dipanggil saat shutdown)."""
+    tasks = list(_summary_tasks.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _prepare_turn(user_id: int, user_msg_id: int, user_message: str) -> tuple[list[dict], list[int] | None, bool]:
+    """
+    (messages, context, perlu_refresh_ringkasan) untuk turn ini. Jika sesi user masih
+    valid (turn sebelumnya dijawab di proses ini, tidak ada pesan lain sesudahnya, dan
+    context masih dalam budget token), hanya pesan baru yang dikirim bersama context
+    KV-cache Ollama. Selain itu prompt penuh dari _build_messages.
+    """
+    session = _sessions.get(user_id)
+    if session:
+        # Sesi dipakai sekali: turn paralel user yang sama jatuh ke prompt penuh
+        _sessions.pop(user_id)
+        if len(session["context"]) + _estimate_tokens(user_message) <= settings.CHAT_CONTEXT_TOKEN_BUDGET:
+            async with get_db() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """
+                        SELECT id FROM chat_history
+                        WHERE user_id = %s AND id <> %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT 1
+                        """,
+                        (user_id, user_msg_id),
+                    )
+                    row = await cur.fetchone()
+            if row and row[0] == session["last_message_id"]:
+                return [{"role": "user", "content": user_message}], session["context"], False
+    messages, needs_summary = await _build_messages(user_id)
+    return messages, None, needs_summary
+
+
+async def _reply(user_id: int, messages: list[dict], context: list[int] | None) -> tuple[str, list[int] | None]:
+    """Panggil model; jika context sesi ditolak Ollama, ulangi sekali dengan prompt penuh."""
+    if context:
+        try:
+            return await chat_via_generate(messages, context)
+        except (ValueError, httpx.HTTPStatusError) as e:
+            logger.info("Chat user_id=%s: session context rejected (%s), using full prompt", user_id, e)
+            messages, _ = await _build_messages(user_id)
+    return await chat_via_generate(messages)
+
+
+async def _stream_reply(
+    user_id: int,
+    messages: list[dict],
+    context: list[int] | None,
+    final: dict,
+) -> AsyncIterator[str]:
+    """Versi streaming dari _reply: fallback ke prompt penuh hanya jika belum ada token terkirim."""
+    if context:
+        started = False
+        try:
+            async with aclosing(chat_stream_via_generate(messages, context, final)) as chunks:
+                async for chunk in chunks:
+                    started = True
+                    yield chunk
+            return
+        except (ValueError, httpx.HTTPStatusError) as e:
+            if started:
+                raise
+            logger.info("Chat user_id=%s: session context rejected (%s), using full prompt", user_id, e)
+            messages, _ = await _build_messages(user_id)
+    async with aclosing(chat_stream_via_generate(messages, None, final)) as chunks:
+        async for chunk in chunks:
+            yield chunk
+
+
+async def _save_partial_reply(user_id: int, content: str):
+    """Simpan potongan jawaban yang sudah terkirim sebelum client disconnect."""
+    logger.info("Chat stream user_id=%s: client disconnected, generation cancelled", user_id)
+    if content:
+        # shield: task request sedang di-cancel, penyimpanan tetap harus selesai
+        await asyncio.shield(_save_message(user_id, "assistant", content))
+
+
+def _remember_session(user_id: int, context: list[int] | None, assistant_msg_id: int | None):
+    if context and assistant_msg_id:
+        _sessions.set(user_id, {"context": context, "last_message_id": assistant_msg_id})
+
+
+def chat_session_stats() -> dict:
+    return _sessions.stats()
+
+
+def ensure_chat_capacity():
+    """
+    Tolak turn chat lebih awal (LLMOverloaded -> 429) jika antrean LLM penuh, sebelum
+    pesan user disimpan atau response streaming dimulai. Request yang lolos cek ini tetap
+    bisa ditolak saat masuk antrean (burst); send_message lalu menghapus pesan user-nya.
+    """
+    check_capacity(PRIORITY_INTERACTIVE)
+
+
+async def send_message(user_id: int, user_message: str) -> dict | None:
     """
     Simpan pesan user, panggil AI dengan konteks (system + history terbatas), simpan jawaban asisten.
     Return { "user_message_id", "assistant_message_id", "assistant_content", "created_at" } atau None jika gagal.
@@ -100,23 +480,39 @@ def send_message(user_id: int, user_message: str) -> dict | None:
         return None
 
     user_message = str(user_message).strip()
-    user_msg_id = _save_message(user_id, "user", user_message)
+    ensure_chat_capacity()
+    with span("chat.save_user"):
+        user_msg_id = await _save_message(user_id, "user", user_message)
     if not user_msg_id:
         return None
 
-    history = get_chat_history(user_id, limit=MAX_HISTORY_MESSAGES)
-    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
-    for h in history:
-        messages.append({"role": h["role"], "content": h["content"]})
+    with span("chat.prepare"):
+        messages, context, needs_summary = await _prepare_turn(user_id, user_msg_id, user_message)
 
+    new_context = None
     try:
-        assistant_content = chat_via_generate(messages)
+        with span("chat.reply"):
+            assistant_content, new_context = await _reply(user_id, messages, context)
+    except LLMOverloaded:
+        # Antrean penuh saat menunggu slot: handler membalas 429, turn ini tidak disimpan
+        await _delete_message(user_id, user_msg_id)
+        raise
+    except (LLMUnavailable, TimeoutError) as e:
+        # Budget habis / circuit open: sudah tercatat di ai_service, cukup satu baris log
+        logger.warning("Chat (generate) failed: %s %s", type(e).__name__, e)
+        assistant_content = CHAT_ERROR_REPLY
     except Exception as e:
         logger.warning("Chat (generate) failed: %s", e, exc_info=True)
-        assistant_content = "Maaf, terjadi gangguan saat memproses. Silakan coba lagi."
+        assistant_content = CHAT_ERROR_REPLY
 
-    assistant_content = (assistant_content or "").strip() or "Maaf, saya tidak dapat menghasilkan jawaban."
-    assistant_msg_id = _save_message(user_id, "assistant", assistant_content)
+    assistant_content = (assistant_content or "").strip()
+    if not assistant_content:
+        assistant_content, new_context = CHAT_EMPTY_REPLY, None
+    with span("chat.save_reply"):
+        assistant_msg_id = await _save_message(user_id, "assistant", assistant_content)
+    _remember_session(user_id, new_context, assistant_msg_id)
+    if needs_summary:
+        schedule_summary_refresh(user_id)
 
     return {
         "user_message_id": user_msg_id,
@@ -124,3 +520,83 @@ def send_message(user_id: int, user_message: str) -> dict | None:
         "assistant_content": assistant_content,
         "created_at": datetime.now().isoformat(),
     }
+
+
+async def stream_message(
+    user_id: int,
+    user_message: str,
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[dict]:
+    """
+    Versi streaming dari send_message. Yield event dict:
+    - {"event": "start", "data": {"user_message_id"}}
+    - {"event": "token", "data": {"content"}} untuk tiap potongan jawaban
+    - {"event": "done", "data": {"user_message_id", "assistant_message_id", "assistant_content", "created_at"}}
+    Jawaban lengkap disimpan ke chat_history saat stream selesai. Jika client disconnect
+    (Starlette menutup/cancel generator ini), stream ke Ollama ditutup (generation berhenti)
+    dan potongan yang sudah terkirim disimpan.
+    """
+    user_message = str(user_message or "").strip()
+    if not user_message:
+        return
+    with span("chat.save_user"):
+        user_msg_id = await _save_message(user_id, "user", user_message)
+    if not user_msg_id:
+        return
+    yield {"event": "start", "data": {"user_message_id": user_msg_id}}
+
+    with span("chat.prepare"):
+        messages, context, needs_summary = await _prepare_turn(user_id, user_msg_id, user_message)
+    final: dict = {}
+    parts: list[str] = []
+    disconnected = False
+    try:
+        async with aclosing(_stream_reply(user_id, messages, context, final)) as chunks:
+            async for chunk in chunks:
+                if await is_disconnected():
+                    disconnected = True
+                    break
+                parts.append(chunk)
+                yield {"event": "token", "data": {"content": chunk}}
+    except LLMOverloaded as e:
+        # Header 200 sudah terkirim: laporkan lewat event error, turn ini tidak disimpan
+        await _delete_message(user_id, user_msg_id)
+        yield {"event": "error", "data": {"content": CHAT_ERROR_REPLY, "retry_after": e.retry_after}}
+        return
+    except (LLMUnavailable, TimeoutError) as e:
+        # Budget habis / circuit open: sudah tercatat di ai_service, cukup satu baris log
+        logger.warning("Chat (stream) failed: %s %s", type(e).__name__, e)
+        parts = [CHAT_ERROR_REPLY]
+        final.clear()
+        yield {"event": "error", "data": {"content": CHAT_ERROR_REPLY}}
+    except Exception as e:
+        logger.warning("Chat (stream) failed: %s", e, exc_info=True)
+        parts = [CHAT_ERROR_REPLY]
+        final.clear()
+        yield {"event": "error", "data": {"content": CHAT_ERROR_REPLY}}
+    except (GeneratorExit, asyncio.CancelledError):
+        # Disconnect biasanya terdeteksi Starlette lebih dulu: generator di-cancel/ditutup
+        disconnected = True
+        raise
+    finally:
+        if disconnected:
+            await _save_partial_reply(user_id, "".join(parts).strip())
+    if disconnected:
+        return
+
+    assistant_content = "".join(parts).strip()
+    new_context = final.get("context") if assistant_content else None
+    assistant_content = assistant_content or CHAT_EMPTY_REPLY
+    assistant_msg_id = await _save_message(user_id, "assistant", assistant_content)
+    _remember_session(user_id, new_context, assistant_msg_id)
+    if needs_summary:
+        schedule_summary_refresh(user_id)
+    yield {
+        "event": "done",
+        "data": {
+            "user_message_id": user_msg_id,
+            "assistant_message_id": assistant_msg_id,
+            "assistant_content": assistant_content,
+            "created_at": datetime.now().isoformat(),
+        },
+    }
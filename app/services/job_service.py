@@ -0,0 +1,329 @@
+"""
+Job async generate performance summary.
+
+POST generate dengan job=true hanya mencatat job (status queued) di tabel
+performance_job lalu langsung return 202. Worker pool di tiap proses mengambil job
+tertua (FOR UPDATE SKIP LOCKED) dan menjalankan generate_performance. Job yang
+berjalan memegang lease (locked_until, diperpanjang heartbeat selama job berjalan);
+jika worker mati, job diambil ulang worker lain setelah lease habis. Shutdown normal
+mengembalikan job ke antrean.
+"""
+
+import asyncio
+import logging
+import itertools
+import os
+import socket
+from typing import AsyncIterator, Awaitable, Callable
+
+from psycopg.types.json import Jsonb
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.ollama_pool import LLMUnavailable
+from app.services.performance_service import generate_performance
+
+logger = logging.getLogger(__name__)
+
+# Prefix id worker; tiap task worker menambahkan nomor sendiri (locked_by unik per task)
+_WORKER_PREFIX = f"{socket.gethostname()}:{os.getpid()}"
+
+# Namespace advisory lock (key pertama) untuk serialisasi enqueue per user
+_JOB_LOCK_NAMESPACE = 0x6A6F62  # "job" in hex
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+_JOB_COLUMNS = """
+    id, user_id, employee_id, employee_code, period, force, status, attempts,
+    ai_summary, cached, error, created_at, started_at, updated_at, finished_at,
+    ai_summary_json
+"""
+
+# Worker pool di proses ini
+_workers: list[asyncio.Task] = []
+_worker_seq = itertools.count(1)
+_wakeup = asyncio.Event()
+# job_id -> Event, di-set setiap status job berubah di proses ini (untuk SSE)
+_changed: dict[int, asyncio.Event] = {}
+
+
+class JobLimitExceeded(Exception):
+    """User sudah punya JOB_MAX_PER_USER job aktif (queued/running)."""
+
+
+def _job_to_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "user_id": row[1],
+        "employee_id": row[2],
+        "employee_code": row[3],
+        "period": row[4],
+        "force": row[5],
+        "status": row[6],
+        "attempts": row[7],
+        "ai_summary": row[8],
+        "cached": row[9],
+        "error": row[10],
+        "created_at": row[11],
+        "started_at": row[12],
+        "updated_at": row[13],
+        "finished_at": row[14],
+        "ai_summary_json": row[15],
+    }
+
+
+def _mark_changed(job_id: int):
+    event = _changed.pop(job_id, None)
+    if event:
+        event.set()
+
+
+async def get_job(job_id: int) -> dict | None:
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"SELECT {_JOB_COLUMNS} FROM performance_job WHERE id = %s", (job_id,))
+            row = await cur.fetchone()
+    return _job_to_dict(row) if row else None
+
+
+async def enqueue_job(
+    user_id: int,
+    employee_id: int,
+    employee_code: str,
+    period: str,
+    force: bool = False,
+) -> dict:
+    """
+    Catat job baru (status queued) dan bangunkan worker. Jika user sudah punya job aktif
+    untuk karyawan + periode yang sama, job itu yang dikembalikan (double-submit).
+    Raise JobLimitExceeded jika job aktif user sudah JOB_MAX_PER_USER.
+    """
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            # Serialisasi enqueue per user supaya batas job aktif tidak terlewati
+            await cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (_JOB_LOCK_NAMESPACE, user_id))
+            await cur.execute(
+                f"""
+                SELECT {_JOB_COLUMNS} FROM performance_job
+                WHERE user_id = %s AND status IN ('queued', 'running')
+                ORDER BY id
+                """,
+                (user_id,),
+            )
+            active = [_job_to_dict(r) for r in await cur.fetchall()]
+            for job in active:
+                if job["employee_id"] == employee_id and job["period"] == period:
+                    return job
+            if len(active) >= settings.JOB_MAX_PER_USER:
+                raise JobLimitExceeded(f"Maksimal {settings.JOB_MAX_PER_USER} job aktif per user")
+
+            await cur.execute(
+                f"""
+                INSERT INTO performance_job (user_id, employee_id, employee_code, period, force)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING {_JOB_COLUMNS}
+                """,
+                (user_id, employee_id, employee_code, period, force),
+            )
+            row = await cur.fetchone()
+    _wakeup.set()
+    return _job_to_dict(row)
+
+
+async def _claim(worker_id: str) -> dict | None:
+    """Ambil satu job queued (atau running yang lease-nya habis) untuk worker ini."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                UPDATE performance_job
+                SET status = 'running', attempts = attempts + 1, locked_by = %s,
+                    locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM performance_job
+                    WHERE (status = 'queued' OR (status = 'running' AND locked_until < CURRENT_TIMESTAMP))
+                      AND run_after <= CURRENT_TIMESTAMP
+                    ORDER BY run_after, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING {_JOB_COLUMNS}
+                """,
+                (worker_id, settings.JOB_LEASE_SECONDS),
+            )
+            row = await cur.fetchone()
+    return _job_to_dict(row) if row else None
+
+
+async def _finish(job_id: int, worker_id: str, status: str, ai_summary: str | None = None,
+                  cached: bool | None = None, error: str | None = None, ai_summary_json: dict | None = None):
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE performance_job
+                SET status = %s, ai_summary = %s, ai_summary_json = %s, cached = %s, error = %s,
+                    locked_by = NULL, locked_until = NULL,
+                    finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s
+                """,
+                (status, ai_summary, Jsonb(ai_summary_json) if ai_summary_json is not None else None,
+                 cached, error, job_id, worker_id),
+            )
+    _mark_changed(job_id)
+
+
+async def _requeue(
+    job_id: int, worker_id: str, delay: float, refund_attempt: bool = False, error: str | None = None
+):
+    """Kembalikan job ke antrean; dijalankan lagi paling cepat setelah `delay` detik."""
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                UPDATE performance_job
+                SET status = 'queued', locked_by = NULL, locked_until = NULL, error = %s,
+                    attempts = attempts - %s,
+                    run_after = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND locked_by = %s
+                """,
+                (error, 1 if refund_attempt else 0, delay, job_id, worker_id),
+            )
+    _mark_changed(job_id)
+
+
+async def _heartbeat(job_id: int, worker_id: str):
+    """Perpanjang lease job selama masih berjalan (generate bisa lebih lama dari JOB_LEASE_SECONDS)."""
+    while True:
+        await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+        try:
+            async with get_db() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute(
+                        """
+                        UPDATE performance_job
+                        SET locked_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                        WHERE id = %s AND locked_by = %s AND status = 'running'
+                        """,
+                        (settings.JOB_LEASE_SECONDS, job_id, worker_id),
+                    )
+                    if cur.rowcount == 0:
+                        logger.warning("Job %s: lease lost by %s", job_id, worker_id)
+                        return
+        except Exception as e:
+            logger.warning("Job %s: lease heartbeat failed: %s", job_id, e)
+
+
+async def _run_job(job: dict, worker_id: str):
+    job_id = job["id"]
+    if job["attempts"] > settings.JOB_MAX_ATTEMPTS:
+        # Diambil ulang berkali-kali setelah worker mati di tengah jalan
+        await _finish(job_id, worker_id, "failed", error="Job gagal setelah beberapa percobaan")
+        return
+    _mark_changed(job_id)
+    heartbeat = asyncio.create_task(_heartbeat(job_id, worker_id))
+    try:
+        result = await generate_performance(job["employee_code"], job["period"], force=job["force"])
+    except (LLMOverloaded, LLMUnavailable) as e:
+        # Antrean LLM penuh / circuit open bukan kegagalan job: tunggu lalu coba lagi
+        await _requeue(job_id, worker_id, e.retry_after, refund_attempt=True)
+        return
+    except asyncio.CancelledError:
+        await asyncio.shield(_requeue(job_id, worker_id, 0, refund_attempt=True))
+        raise
+    except Exception as e:
+        logger.warning("Job %s: attempt %s failed: %s", job_id, job["attempts"], e)
+        if job["attempts"] < settings.JOB_MAX_ATTEMPTS:
+            await _requeue(job_id, worker_id, 2 ** job["attempts"], error=str(e))
+        else:
+            await _finish(job_id, worker_id, "failed", error=str(e))
+        return
+    finally:
+        heartbeat.cancel()
+
+    if not result:
+        await _finish(job_id, worker_id, "failed", error="KPI data not found")
+    else:
+        await _finish(
+            job_id,
+            worker_id,
+            "succeeded",
+            ai_summary=result["ai_summary"],
+            ai_summary_json=result["ai_summary_json"],
+            cached=result["cached"],
+        )
+
+
+async def _worker(worker_id: str):
+    while True:
+        try:
+            job = await _claim(worker_id)
+        except Exception as e:
+            logger.warning("Job worker: claim failed: %s", e)
+            job = None
+        if job is None:
+            # Job dari proses lain tidak membangunkan event ini: polling sebagai fallback
+            try:
+                await asyncio.wait_for(_wakeup.wait(), settings.JOB_POLL_INTERVAL)
+                _wakeup.clear()
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await _run_job(job, worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Job %s: worker error", job["id"])
+
+
+def start_job_workers():
+    """Jalankan JOB_WORKERS worker di proses ini (dipanggil saat startup)."""
+    for _ in range(settings.JOB_WORKERS - len(_workers)):
+        worker_id = f"{_WORKER_PREFIX}:{next(_worker_seq)}"[-64:]
+        _workers.append(asyncio.create_task(_worker(worker_id)))
+
+
+async def stop_job_workers():
+    """Cancel worker; job yang sedang berjalan dikembalikan ke antrean."""
+    tasks = list(_workers)
+    _workers.clear()
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def watch_job(job_id: int, is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[dict]:
+    """
+    Yield state job setiap status/attempts berubah sampai job selesai atau client disconnect.
+    Perubahan di proses ini langsung terlihat; job di worker lain terlihat per JOB_POLL_INTERVAL.
+    """
+    last = None
+    event = None
+    try:
+        while True:
+            job = await get_job(job_id)
+            if job is None:
+                return
+            state = (job["status"], job["attempts"])
+            if state != last:
+                last = state
+                yield job
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            event = _changed.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), settings.JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            if await is_disconnected():
+                return
+    finally:
+        # Job yang selesai di proses lain tidak pernah memanggil _mark_changed di sini
+        if event is not None and _changed.get(job_id) is event:
+            del _changed[job_id]
@@ -0,0 +1,176 @@
+"""
+Scheduler request LLM per backend Ollama: batas concurrency + antrean berprioritas.
+
+Semua panggilan ke Ollama (ai_service) lewat slot() di sini. Jika semua slot terpakai,
+request menunggu di antrean; slot yang lepas diberikan ke prioritas tertinggi dulu
+(interactive > summary > background), FIFO dalam prioritas yang sama. Request
+interactive/summary ditolak (LLMOverloaded -> HTTP 429 + Retry-After) jika antrean
+di depannya sudah LLM_MAX_QUEUE; background (batch, motivasi, ringkasan chat) selalu
+menunggu karena concurrency-nya sudah dibatasi pemanggil.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.core.metrics import LLM_QUEUE_WAIT_SECONDS
+from app.core.timing import record_span
+
+PRIORITY_INTERACTIVE = 0  # chat
+PRIORITY_SUMMARY = 1  # satu summary performa atas request user
+PRIORITY_BACKGROUND = 2  # batch summary, motivasi harian, ringkasan chat
+
+_PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_SUMMARY: "summary",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Estimasi lama satu slot sebelum ada data (untuk Retry-After)
+_DEFAULT_SERVICE_SECONDS = 5.0
+
+
+class LLMOverloaded(Exception):
+    """Antrean LLM penuh; retry_after = estimasi detik sampai ada kapasitas."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    def __init__(self, backend: str, concurrency: int, max_queue: int):
+        self.backend = backend
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max_queue
+        self.in_flight = 0
+        # heap of (priority, seq, future); future di-resolve saat slot diberikan
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._service_seconds: float | None = None
+        self._stats = {
+            p: {"admitted": 0, "rejected": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+            for p in _PRIORITY_NAMES
+        }
+
+    def _ahead(self, priority: int) -> int:
+        """Jumlah request yang antre di depan request baru dengan priority ini."""
+        return sum(1 for p, _, _ in self._waiters if p <= priority)
+
+    def load(self) -> float:
+        """Request berjalan + antre per slot concurrency (untuk routing antar backend)."""
+        return (self.in_flight + len(self._waiters)) / self.concurrency
+
+    def retry_after(self, priority: int) -> int:
+        service = self._service_seconds or _DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil((self._ahead(priority) + 1) / self.concurrency * service))
+
+    def check(self, priority: int):
+        """Raise LLMOverloaded jika request dengan priority ini akan ditolak saat ini."""
+        if priority >= PRIORITY_BACKGROUND or self.max_queue <= 0:
+            return
+        if self.in_flight >= self.concurrency and self._ahead(priority) >= self.max_queue:
+            self._stats[priority]["rejected"] += 1
+            raise LLMOverloaded(self.retry_after(priority))
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        """Tahan satu slot backend selama blok berjalan (termasuk selama streaming)."""
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            # EWMA durasi slot untuk estimasi Retry-After
+            if self._service_seconds is None:
+                self._service_seconds = elapsed
+            else:
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+            self._release()
+
+    async def _acquire(self, priority: int):
+        queued = time.monotonic()
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+        else:
+            self.check(priority)
+            future = asyncio.get_running_loop().create_future()
+            entry = (priority, next(self._seq), future)
+            heapq.heappush(self._waiters, entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Slot sudah diberikan tepat sebelum cancel: teruskan ke waiter berikutnya
+                    self._release()
+                elif entry in self._waiters:
+                    # _release() mungkin sudah membuang future yang di-cancel dari heap
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                raise
+        waited = time.monotonic() - queued
+        stats = self._stats[priority]
+        stats["admitted"] += 1
+        stats["wait_seconds_total"] += waited
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+        LLM_QUEUE_WAIT_SECONDS.labels(_PRIORITY_NAMES[priority]).observe(waited)
+        record_span("llm.queue", waited)
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Slot pindah langsung ke waiter (in_flight tidak berubah)
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in _PRIORITY_NAMES.values()}
+        for p, _, _ in self._waiters:
+            queued[_PRIORITY_NAMES[p]] += 1
+        priorities = {}
+        for p, s in self._stats.items():
+            priorities[_PRIORITY_NAMES[p]] = {
+                **s,
+                "wait_seconds_total": round(s["wait_seconds_total"], 4),
+                "wait_seconds_max": round(s["wait_seconds_max"], 4),
+                "wait_seconds_avg": round(s["wait_seconds_total"] / s["admitted"], 4) if s["admitted"] else 0.0,
+            }
+        return {
+            "backend": self.backend,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": queued,
+            "avg_service_seconds": round(self._service_seconds or 0.0, 4),
+            "priorities": priorities,
+        }
+
+
+# Satu scheduler per backend (scheme://host:port) di proses ini
+_schedulers: dict[str, LLMScheduler] = {}
+
+
+def backend_of(url: str) -> str:
+    parts = urlsplit(url or "http://localhost:11434")
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_scheduler(url: str) -> LLMScheduler:
+    backend = backend_of(url)
+    scheduler = _schedulers.get(backend)
+    if scheduler is None:
+        scheduler = LLMScheduler(backend, settings.OLLAMA_CONCURRENCY, settings.LLM_MAX_QUEUE)
+        _schedulers[backend] = scheduler
+    return scheduler
+
+
+def scheduler_stats() -> list[dict]:
+    return [s.stats() for s in _schedulers.values()]
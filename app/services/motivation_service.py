@@ -1,67 +1,158 @@
-from datetime import datetime
-from app.core.database import get_connection
+import asyncio
+import logging
+import random
+from datetime import date, datetime, time, timedelta
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.timing import detached_task, span
 from app.services.ai_service import generate_ai_summary
+from app.services.llm_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
 
 # Advisory lock ID: satu motivasi per hari, cegah insert 2x saat request bersamaan
 _MOTIVATION_DAILY_LOCK_ID = 0x6D6F7469  # "moti" in hex
 
+# Jeda sebelum precompute mencoba lagi jika generate gagal (detik)
+_PRECOMPUTE_RETRY_SECONDS = 60
+
 
 MOTIVATION_PROMPT = """Anda adalah motivator profesional. Tulis satu kalimat motivasi singkat untuk hari ini (max 2 kalimat). Bahasa Indonesia. Tanpa tanda kutip atau prefix. Langsung kalimat motivasinya saja."""
 
+# Motivasi hari ini di proses ini: tanggal -> row. Hanya entry hari ini yang disimpan.
+_cache: dict[date, dict] = {}
+# Generate yang sedang berjalan di proses ini: tanggal -> (priority LLM, Task)
+_pending: dict[date, tuple[int, asyncio.Task]] = {}
+_precompute_task: asyncio.Task | None = None
 
-def generate_daily_motivation() -> dict | None:
-    """
-    Generate motivasi harian via AI dan simpan ke tabel motivation.
-    Jika hari ini (tanggal created_at) sudah ada row, kembalikan yang ada tanpa insert baru.
-    Pakai advisory lock supaya dua request bersamaan tidak insert 2x di tanggal sama.
-    Returns dict dengan id, motivation, created_at atau None jika gagal.
-    """
-    conn = get_connection()
-    cur = conn.cursor()
 
-    # Lock: hanya satu proses yang boleh cek + insert untuk hari ini
-    cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MOTIVATION_DAILY_LOCK_ID,))
+def _row_to_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "motivation": row[1],
+        "created_at": row[2],
+    }
+
+
+def _remember(day: date, motivation: dict) -> dict:
+    _cache.clear()
+    _cache[day] = motivation
+    return motivation
+
 
-    cur.execute(
+async def _find_for_day(cur, day: date):
+    await cur.execute(
         """
         SELECT id, motivation, created_at
         FROM motivation
-        WHERE DATE(created_at) = CURRENT_DATE
+        WHERE created_at >= %s AND created_at < %s
         ORDER BY created_at DESC
         LIMIT 1
-        """
+        """,
+        (day, day + timedelta(days=1)),
     )
-    existing = cur.fetchone()
+    return await cur.fetchone()
+
+
+async def _load_or_generate(day: date, priority: int) -> dict | None:
+    """
+    Ambil motivasi tanggal ini dari DB; jika belum ada, generate via AI lalu simpan.
+    LLM dipanggil tanpa lock/koneksi DB; advisory lock hanya dipegang sebentar untuk
+    cek ulang + insert, jadi worker lain yang kebetulan generate bersamaan memakai
+    row yang tersimpan lebih dulu.
+    """
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            existing = await _find_for_day(cur, day)
     if existing:
-        conn.rollback()
-        cur.close()
-        conn.close()
-        return {
-            "id": existing[0],
-            "motivation": existing[1],
-            "created_at": existing[2],
-        }
-
-    text = generate_ai_summary(MOTIVATION_PROMPT)
+        return _row_to_dict(existing)
+
+    text = await generate_ai_summary(
+        MOTIVATION_PROMPT, priority=priority, budget=settings.LLM_BUDGET_MOTIVATION
+    )
     if not text or not text.strip():
-        conn.rollback()
-        cur.close()
-        conn.close()
         return None
     motivation = text.strip().strip('"').strip("'")
 
-    cur.execute(
-        "INSERT INTO motivation (motivation, created_at) VALUES (%s, %s) RETURNING id, motivation, created_at",
-        (motivation, datetime.now()),
-    )
-    row = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
-    if not row:
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT pg_advisory_xact_lock(%s)", (_MOTIVATION_DAILY_LOCK_ID,))
+            existing = await _find_for_day(cur, day)
+            if existing:
+                return _row_to_dict(existing)
+            await cur.execute(
+                "INSERT INTO motivation (motivation, created_at) VALUES (%s, %s) RETURNING id, motivation, created_at",
+                (motivation, datetime.now()),
+            )
+            row = await cur.fetchone()
+    return _row_to_dict(row) if row else None
+
+
+def _forget_pending(day: date, task: asyncio.Task):
+    if _pending.get(day, (None, None))[1] is task:
+        del _pending[day]
+
+
+async def generate_daily_motivation(priority: int = PRIORITY_INTERACTIVE) -> dict | None:
+    """
+    Motivasi harian. Dilayani dari cache in-process per tanggal (tanpa query DB);
+    saat cache kosong diambil dari tabel motivation atau digenerate via AI (satu
+    generate per proses, request lain menunggu hasil yang sama).
+    priority: interactive untuk request user (budget LLM_BUDGET_MOTIVATION termasuk antre),
+    background hanya untuk precompute. Request user tidak menumpang generate background
+    yang sedang berjalan (bisa antre di belakang batch), melainkan generate sendiri.
+    Returns dict dengan id, motivation, created_at atau None jika gagal.
+    """
+    today = date.today()
+    cached = _cache.get(today)
+    if cached is not None:
+        return dict(cached)
+
+    pending = _pending.get(today)
+    if pending is None or pending[0] > priority:
+        task = detached_task(_load_or_generate(today, priority))
+        _pending[today] = (priority, task)
+        task.add_done_callback(lambda t: _forget_pending(today, t))
+    else:
+        task = pending[1]
+    with span("motivation.load"):
+        motivation = await asyncio.shield(task)
+    if motivation is None:
         return None
-    return {
-        "id": row[0],
-        "motivation": row[1],
-        "created_at": row[2],
-    }
+    return dict(_remember(today, motivation))
+
+
+async def _precompute_loop():
+    """Siapkan motivasi hari ini saat startup dan setiap lewat tengah malam."""
+    # Jitter juga saat startup: semua worker uvicorn start bersamaan; worker pertama
+    # menyimpan row, sisanya cukup membacanya dari DB tanpa ikut memanggil LLM
+    await asyncio.sleep(random.uniform(0, settings.MOTIVATION_PRECOMPUTE_JITTER))
+    while True:
+        try:
+            ready = await generate_daily_motivation(PRIORITY_BACKGROUND) is not None
+        except Exception as e:
+            logger.warning("Daily motivation precompute failed: %s", e)
+            ready = False
+        now = datetime.now()
+        until_midnight = (datetime.combine(now.date() + timedelta(days=1), time.min) - now).total_seconds()
+        if ready:
+            # Jitter: worker lain biasanya sudah menyimpan row, jadi tidak ikut generate
+            delay = until_midnight + random.uniform(0, settings.MOTIVATION_PRECOMPUTE_JITTER)
+        else:
+            delay = min(_PRECOMPUTE_RETRY_SECONDS, until_midnight + 1)
+        await asyncio.sleep(delay)
+
+
+def start_motivation_precompute():
+    """Jalankan precompute motivasi harian di background (dipanggil saat startup)."""
+    global _precompute_task
+    if settings.MOTIVATION_PRECOMPUTE and _precompute_task is None:
+        _precompute_task = asyncio.create_task(_precompute_loop())
+
+
+async def stop_motivation_precompute():
+    global _precompute_task
+    task, _precompute_task = _precompute_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,286 @@
+"""
+Pool backend Ollama (OLLAMA_BACKENDS) dengan health check dan routing least-loaded.
+
+Setiap backend punya AsyncClient sendiri (koneksi keep-alive per node) dan scheduler
+sendiri (llm_scheduler, concurrency OLLAMA_CONCURRENCY per node). Request diarahkan
+ke backend sehat yang punya model, dengan beban (in_flight + antrean) / concurrency
+terkecil. Daftar model per node diambil dari /api/tags kecuali ditentukan di konfigurasi.
+
+Circuit breaker per node:
+- closed: ikut routing. OLLAMA_EJECT_AFTER_FAILURES kegagalan berturut-turut (error
+  koneksi, timeout connect/read HTTP, HTTP 5xx, probe gagal) -> open. Budget operasi
+  yang habis (node sibuk, antrean panjang) tidak dihitung.
+- open: tidak dipakai. Jika semua node open, pick_backend langsung raise LLMUnavailable
+  (gagal cepat, tanpa menunggu timeout). Setelah OLLAMA_BREAKER_COOLDOWN detik, atau
+  lebih awal jika prober (GET /api/tags tiap OLLAMA_HEALTH_INTERVAL) berhasil -> half_open.
+- half_open: hanya satu request percobaan; sukses -> closed, gagal -> open lagi.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.services.llm_scheduler import LLMScheduler, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMUnavailable(Exception):
+    """Semua backend Ollama sedang open (circuit breaker); retry_after = sisa cooldown (detik)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM unavailable, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _normalize_model(name: str) -> str:
+    name = name.strip()
+    return name if ":" in name else f"{name}:latest"
+
+
+def base_url(url: str) -> str:
+    """Base URL Ollama dari URL apa pun (http://host:port/api/generate -> http://host:port)."""
+    parts = urlsplit((url or "http://localhost:11434").strip())
+    path = parts.path.rstrip("/")
+    for suffix in ("/api/generate", "/api/chat", "/api"):
+        if path.endswith(suffix):
+            path = path[: -len(suffix)]
+            break
+    return f"{parts.scheme}://{parts.netloc}{path}"
+
+
+class Backend:
+    def __init__(self, url: str, models: set[str] | None = None):
+        self.url = base_url(url)
+        self.generate_url = self.url + "/api/generate"
+        self.chat_url = self.url + "/api/chat"
+        # Model dari konfigurasi tetap; None = ikuti /api/tags (belum diketahui = dianggap ada)
+        self.configured_models = models
+        self.models: set[str] | None = models
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._trial = False
+        self.failures = 0
+        self.last_error: str | None = None
+        self.checked_at: float | None = None
+        self.scheduler: LLMScheduler = get_scheduler(self.url)
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    connect=settings.OLLAMA_CONNECT_TIMEOUT,
+                    read=settings.OLLAMA_READ_TIMEOUT,
+                    write=settings.OLLAMA_CONNECT_TIMEOUT,
+                    pool=settings.OLLAMA_CONNECT_TIMEOUT,
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def has_model(self, model: str | None) -> bool:
+        return not model or self.models is None or _normalize_model(model) in self.models
+
+    def load(self) -> float:
+        return self.scheduler.load()
+
+    @property
+    def healthy(self) -> bool:
+        return self.state != OPEN
+
+    def retry_after(self) -> float:
+        """Sisa cooldown sebelum node open boleh dicoba lagi (detik)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + settings.OLLAMA_BREAKER_COOLDOWN - time.monotonic())
+
+    def half_open(self):
+        if self.state == OPEN:
+            self.state = HALF_OPEN
+            self._trial = False
+            logger.info("Ollama backend %s half-open, next request is a trial", self.url)
+
+    def available(self) -> bool:
+        """Boleh menerima request sekarang (open -> half_open setelah cooldown)."""
+        if self.state == OPEN and self.retry_after() <= 0:
+            self.half_open()
+        if self.state == HALF_OPEN:
+            return not self._trial
+        return self.state == CLOSED
+
+    def acquire(self) -> bool:
+        """Dipanggil saat node dipilih untuk request. True jika request ini percobaan half-open."""
+        if self.state == HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self, trial: bool):
+        """Request selesai (apa pun hasilnya); percobaan yang tidak menentukan dilepas."""
+        if trial:
+            self._trial = False
+
+    def mark_success(self):
+        if self.state != CLOSED:
+            logger.info("Ollama backend %s healthy again (circuit closed)", self.url)
+        self.state = CLOSED
+        self._trial = False
+        self.failures = 0
+        self.last_error = None
+
+    def mark_failure(self, error: str):
+        self.failures += 1
+        self.last_error = error
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED and self.failures >= settings.OLLAMA_EJECT_AFTER_FAILURES
+        ):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._trial = False
+            logger.warning("Ollama backend %s circuit open after %s failures: %s", self.url, self.failures, error)
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "state": self.state,
+            "retry_after": round(self.retry_after(), 1),
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "models": sorted(self.models) if self.models is not None else None,
+            "load": round(self.load(), 3),
+            "checked_at": self.checked_at,
+        }
+
+
+def _parse_backends(value: str | None) -> list[Backend]:
+    """
+    OLLAMA_BACKENDS: "url[=model|model],url,..." (model opsional). Kosong = satu backend
+    dari OLLAMA_URL.
+    """
+    backends = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, models = item.partition("=")
+        model_set = {_normalize_model(m) for m in models.split("|") if m.strip()} or None
+        backends.append(Backend(url, model_set))
+    if not backends:
+        backends.append(Backend(settings.OLLAMA_URL))
+    return backends
+
+
+_backends: list[Backend] | None = None
+_round_robin = itertools.count()
+_prober_task: asyncio.Task | None = None
+
+
+def backends() -> list[Backend]:
+    global _backends
+    if _backends is None:
+        _backends = _parse_backends(settings.OLLAMA_BACKENDS)
+    return _backends
+
+
+def pick_backend(model: str | None = None, prefer: str | None = None, exclude: str | None = None) -> Backend:
+    """
+    Backend yang tersedia (circuit tidak open) dengan model ini dan beban terkecil (seri:
+    round-robin). prefer = URL backend yang diutamakan (mis. node yang memegang KV-cache
+    sesi chat) selama bebannya tidak lebih dari satu slot di atas yang paling ringan.
+    exclude = URL backend yang dihindari selama ada kandidat lain (node yang baru gagal).
+    Raise LLMUnavailable jika tidak ada node yang tersedia.
+    """
+    pool = [b for b in backends() if b.has_model(model)] or backends()
+    candidates = [b for b in pool if b.available()]
+    if not candidates:
+        raise LLMUnavailable(max(1, math.ceil(min(b.retry_after() for b in pool))))
+    if exclude:
+        candidates = [b for b in candidates if b.url != exclude] or candidates
+    if len(candidates) == 1:
+        return candidates[0]
+    lightest = min(b.load() for b in candidates)
+    if prefer:
+        preferred = next((b for b in candidates if b.url == prefer), None)
+        if preferred is not None and preferred.load() <= lightest + 1:
+            return preferred
+    best = [b for b in candidates if b.load() == lightest]
+    return best[next(_round_robin) % len(best)]
+
+
+async def _probe(backend: Backend):
+    try:
+        response = await backend.client.get(backend.url + "/api/tags", timeout=settings.OLLAMA_HEALTH_TIMEOUT)
+        response.raise_for_status()
+        tags = response.json().get("models") or []
+    except (httpx.HTTPError, ValueError) as e:
+        backend.mark_failure(f"health check: {type(e).__name__}: {e}")
+    else:
+        if backend.configured_models is None:
+            names = (t.get("name") or t.get("model") for t in tags)
+            backend.models = {_normalize_model(n) for n in names if n}
+        if backend.state == OPEN:
+            # Node menjawab lagi: izinkan satu request percobaan tanpa menunggu cooldown.
+            # Node closed tidak di-reset: /api/tags bisa sukses walau generate terus gagal
+            # (OOM, model gagal load), jadi hitungan kegagalan hanya di-reset request sukses.
+            backend.half_open()
+    backend.checked_at = time.time()
+
+
+async def probe_all():
+    await asyncio.gather(*(_probe(b) for b in backends()))
+
+
+async def _prober_loop():
+    while True:
+        try:
+            await probe_all()
+        except Exception as e:
+            logger.warning("Ollama health check failed: %s", e)
+        await asyncio.sleep(settings.OLLAMA_HEALTH_INTERVAL)
+
+
+def start_health_prober():
+    """Jalankan health check backend di background (dipanggil saat startup)."""
+    global _prober_task
+    if settings.OLLAMA_HEALTH_INTERVAL > 0 and _prober_task is None:
+        _prober_task = asyncio.create_task(_prober_loop())
+
+
+async def stop_health_prober():
+    global _prober_task
+    task, _prober_task = _prober_task, None
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def close_backends():
+    """Tutup koneksi HTTP ke semua backend. Dipanggil saat shutdown aplikasi."""
+    await asyncio.gather(*(b.close() for b in backends()))
+
+
+def backend_stats() -> list[dict]:
+    return [b.stats() for b in backends()]
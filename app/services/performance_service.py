@@ -1,10 +1,20 @@
+import asyncio
+import hashlib
 import json
 import re
-from app.core.database import get_connection
-from app.services.ai_service import generate_ai_summary
-from app.utils.prompt_builder import build_prompt
+import uuid
+from psycopg.types.json import Jsonb
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.timing import detached_task, span
+from app.services.ai_service import generate_json
+from app.services.llm_scheduler import PRIORITY_SUMMARY
+from app.utils.prompt_builder import build_prompt, PROMPT_VERSION, SUMMARY_SCHEMA
 from datetime import datetime
 
+# Generation yang sedang berjalan di proses ini: (employee_id, period, fingerprint) -> Task
+_inflight: dict[tuple[int, str, str], asyncio.Task] = {}
+
 
 def _extract_json_from_text(text: str) -> str | None:
     """Extract JSON string from AI output (handles markdown blocks and surrounding text)."""
@@ -23,25 +33,51 @@ def _extract_json_from_text(text: str) -> str | None:
     return raw if raw.startswith("{") else None
 
 
-def _parse_ai_json(ai_output: str):
+def _load_ai_json(ai_output: str) -> dict | None:
     """
-    Parse AI output as JSON (summary, achieved_kpi, not_achieved_kpi, recommendations, motivation).
-    Returns (ai_recommendation, ai_motivation) or (None, None) if not valid JSON.
+    Parse AI output as a JSON object. Structured output (Ollama `format` schema) is valid
+    as-is; the repair heuristics (markdown block, trailing commas) only apply to legacy
+    output or models that ignore the schema. Returns None if not valid JSON.
     """
-    json_str = _extract_json_from_text(ai_output)
-    if not json_str:
-        return None, None
-    # Fix common issues: trailing commas before } or ]
-    json_str = re.sub(r",\s*}", "}", json_str)
-    json_str = re.sub(r",\s*]", "]", json_str)
     try:
-        data = json.loads(json_str)
-        rec_list = data.get("recommendations") or []
-        ai_recommendation = "\n".join(rec_list) if isinstance(rec_list, list) else str(rec_list) or None
-        ai_motivation = data.get("motivation") or None
-        return ai_recommendation, ai_motivation
+        data = json.loads(ai_output)
     except (json.JSONDecodeError, TypeError):
-        return None, None
+        json_str = _extract_json_from_text(ai_output)
+        if not json_str:
+            return None
+        # Fix common issues: trailing commas before } or ]
+        json_str = re.sub(r",\s*}", "}", json_str)
+        json_str = re.sub(r",\s*]", "]", json_str)
+        try:
+            data = json.loads(json_str)
+        except json.JSONDecodeError:
+            return None
+    return data if isinstance(data, dict) else None
+
+
+_RECOMMENDATION_KEYS = (
+    "kpi_improvement_suggestions",
+    "training_rekomendation",
+    "workload_adjustment_rekomendation",
+    "recommendations",
+)
+
+
+def _parse_ai_json(data: dict):
+    """
+    Derive (ai_recommendation, ai_motivation) from a parsed summary object.
+    ai_recommendation joins every recommendation list, one item per line.
+    """
+    recommendations = []
+    for key in _RECOMMENDATION_KEYS:
+        value = data.get(key)
+        if isinstance(value, list):
+            recommendations.extend(str(v) for v in value if v)
+        elif value:
+            recommendations.append(str(value))
+    ai_recommendation = "\n".join(recommendations) or None
+    ai_motivation = data.get("motivation") or None
+    return ai_recommendation, ai_motivation
 
 
 def _calculate_total_score(kpi_data: list) -> float:
@@ -84,97 +120,238 @@ def _parse_ai_sections(ai_output: str):
     return ai_recommendation, ai_motivation
 
 
-def _get_employee_id_by_code(cur, employee_code: str) -> int | None:
+async def _get_employee_id_by_code(cur, employee_code: str) -> int | None:
     """Resolve employee_code to employee id. Returns None if not found."""
-    cur.execute("SELECT id FROM employees WHERE employee_code = %s", (employee_code,))
-    row = cur.fetchone()
+    await cur.execute("SELECT id FROM employees WHERE employee_code = %s", (employee_code,))
+    row = await cur.fetchone()
     return row[0] if row else None
 
 
-def get_employee_code_by_id(employee_id: int) -> str | None:
+async def get_employee_code_by_id(employee_id: int) -> str | None:
     """Resolve employee_id to employee_code. Returns None if not found."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT employee_code FROM employees WHERE id = %s", (employee_id,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT employee_code FROM employees WHERE id = %s", (employee_id,))
+            row = await cur.fetchone()
     return row[0] if row else None
 
 
-def generate_performance(employee_code: str, period: str):
+# Kolom sesuai urutan yang dipakai build_prompt: row[0]=full_name, row[1..4]=KPI.
+_KPI_QUERY = """
+    SELECT e.full_name, k.kpi_name, a.target_value,
+           r.actual_value, r.achievement_percentage
+    FROM kpi_assignment a
+    JOIN employees e ON e.id = a.employee_id
+    JOIN kpi_master k ON k.id = a.kpi_id
+    JOIN kpi_realization r ON r.assignment_id = a.id
+    WHERE a.employee_id = %s AND a.period = %s
+    ORDER BY k.kpi_name, a.id
+"""
 
-    conn = get_connection()
-    cur = conn.cursor()
+_SAVE_QUERY = """
+    INSERT INTO performance_summary
+    (employee_id, period, ai_summary, total_score, performance_category,
+     ai_recommendation, ai_motivation, generated_at, input_fingerprint, ai_summary_json)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (employee_id, period)
+    DO UPDATE SET
+        ai_summary = EXCLUDED.ai_summary,
+        total_score = EXCLUDED.total_score,
+        performance_category = EXCLUDED.performance_category,
+        ai_recommendation = EXCLUDED.ai_recommendation,
+        ai_motivation = EXCLUDED.ai_motivation,
+        generated_at = EXCLUDED.generated_at,
+        input_fingerprint = EXCLUDED.input_fingerprint,
+        ai_summary_json = EXCLUDED.ai_summary_json,
+        updated_at = CURRENT_TIMESTAMP
+"""
 
-    employee_id = _get_employee_id_by_code(cur, employee_code)
-    if employee_id is None:
-        cur.close()
-        conn.close()
-        return None
 
-    query = """
-        SELECT e.full_name, k.kpi_name, a.target_value,
-               r.actual_value, r.achievement_percentage
-        FROM kpi_assignment a
-        JOIN employees e ON e.id = a.employee_id
-        JOIN kpi_master k ON k.id = a.kpi_id
-        JOIN kpi_realization r ON r.assignment_id = a.id
-        WHERE a.employee_id = %s AND a.period = %s
+def input_fingerprint(data: list) -> str:
     """
+    SHA-256 of everything that determines the LLM output: the KPI rows,
+    the model name and the prompt template version.
+    """
+    payload = {
+        "model": settings.MODEL_NAME,
+        "prompt_version": PROMPT_VERSION,
+        "rows": [[None if v is None else str(v) for v in row] for row in data],
+    }
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-    cur.execute(query, (employee_id, period))
-    data = cur.fetchall()
-
-    if not data:
-        cur.close()
-        conn.close()
-        return None
 
+async def summarize_kpi(employee_id: int, period: str, data: list, priority: int = PRIORITY_SUMMARY) -> tuple:
+    """
+    Build the prompt from KPI rows, call the LLM (JSON schema output) and derive
+    score/category/sections. Returns the parameter tuple for _SAVE_QUERY
+    (ai_output is at index 2, the parsed object at index 9).
+    """
+    fingerprint = input_fingerprint(data)
     employee_name = data[0][0]
-    prompt = build_prompt(employee_name, data, period)
+    with span("perf.prompt"):
+        prompt = build_prompt(employee_name, data, period)
 
-    ai_output = generate_ai_summary(prompt)
+    with span("perf.llm"):
+        ai_output = await generate_json(prompt, SUMMARY_SCHEMA, priority=priority)
 
     total_score = _calculate_total_score(data)
     performance_category = _get_performance_category(total_score)
 
-    ai_recommendation, ai_motivation = _parse_ai_json(ai_output)
-    if ai_recommendation is None and ai_motivation is None:
-        ai_recommendation, ai_motivation = _parse_ai_sections(ai_output)
-
-    save_query = """
-        INSERT INTO performance_summary
-        (employee_id, period, ai_summary, total_score, performance_category,
-         ai_recommendation, ai_motivation, generated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (employee_id, period)
-        DO UPDATE SET
-            ai_summary = EXCLUDED.ai_summary,
-            total_score = EXCLUDED.total_score,
-            performance_category = EXCLUDED.performance_category,
-            ai_recommendation = EXCLUDED.ai_recommendation,
-            ai_motivation = EXCLUDED.ai_motivation,
-            generated_at = EXCLUDED.generated_at,
-            updated_at = CURRENT_TIMESTAMP
-    """
+    with span("perf.parse"):
+        ai_json = _load_ai_json(ai_output)
+        if ai_json is not None:
+            ai_recommendation, ai_motivation = _parse_ai_json(ai_json)
+        else:
+            ai_recommendation, ai_motivation = _parse_ai_sections(ai_output)
 
-    cur.execute(
-        save_query,
-        (
-            employee_id,
-            period,
-            ai_output,
-            total_score,
-            performance_category,
-            ai_recommendation,
-            ai_motivation,
-            datetime.now(),
-        ),
+    return (
+        employee_id,
+        period,
+        ai_output,
+        total_score,
+        performance_category,
+        ai_recommendation,
+        ai_motivation,
+        datetime.now(),
+        fingerprint,
+        Jsonb(ai_json) if ai_json is not None else None,
     )
-    conn.commit()
 
-    cur.close()
-    conn.close()
 
-    return ai_output
+async def save_summaries(cur, rows: list[tuple]):
+    """Upsert one or more summary rows (output of summarize_kpi) on an open cursor."""
+    if rows:
+        await cur.executemany(_SAVE_QUERY, rows)
+
+
+def _summary_result(ai_summary: str, ai_summary_json: dict | None, cached: bool) -> dict:
+    return {"ai_summary": ai_summary, "ai_summary_json": ai_summary_json, "cached": cached}
+
+
+async def _find_summary(cur, employee_id: int, period: str, fingerprint: str, since: datetime | None = None) -> tuple | None:
+    """(ai_summary, ai_summary_json) tersimpan untuk fingerprint ini (opsional: yang digenerate sejak `since`)."""
+    await cur.execute(
+        """
+        SELECT ai_summary, ai_summary_json FROM performance_summary
+        WHERE employee_id = %s AND period = %s AND input_fingerprint = %s
+          AND (%s::timestamp IS NULL OR generated_at >= %s::timestamp)
+        """,
+        (employee_id, period, fingerprint, since, since),
+    )
+    return await cur.fetchone()
+
+
+async def _acquire_lease(employee_id: int, period: str, fingerprint: str) -> str | None:
+    """Ambil lease generate lintas worker. Return owner token, atau None jika dipegang worker lain."""
+    owner = uuid.uuid4().hex
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                INSERT INTO performance_generation_lease
+                (employee_id, period, input_fingerprint, owner, expires_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                ON CONFLICT (employee_id, period, input_fingerprint) DO UPDATE
+                SET owner = EXCLUDED.owner, expires_at = EXCLUDED.expires_at
+                WHERE performance_generation_lease.expires_at < CURRENT_TIMESTAMP
+                RETURNING owner
+                """,
+                (employee_id, period, fingerprint, owner, settings.GENERATION_LEASE_SECONDS),
+            )
+            row = await cur.fetchone()
+    return owner if row else None
+
+
+async def _release_lease(cur, employee_id: int, period: str, fingerprint: str, owner: str):
+    await cur.execute(
+        """
+        DELETE FROM performance_generation_lease
+        WHERE employee_id = %s AND period = %s AND input_fingerprint = %s AND owner = %s
+        """,
+        (employee_id, period, fingerprint, owner),
+    )
+
+
+async def _release_lease_now(employee_id: int, period: str, fingerprint: str, owner: str):
+    async with get_db() as conn:
+        async with conn.cursor() as cur:
+            await _release_lease(cur, employee_id, period, fingerprint, owner)
+
+
+async def _generate_single_flight(employee_id: int, period: str, data: list, fingerprint: str) -> dict:
+    """
+    Generate summary sekali untuk (employee_id, period, fingerprint) di semua worker.
+    Pemegang lease memanggil LLM; yang lain polling sampai summary dengan fingerprint
+    ini tersimpan (sejak mulai menunggu), atau mengambil alih lease jika pemiliknya
+    gagal / lease expired.
+    """
+    since = datetime.now()
+    while True:
+        owner = await _acquire_lease(employee_id, period, fingerprint)
+        async with get_db() as conn:
+            async with conn.cursor() as cur:
+                # Cek juga setelah dapat lease: worker lain bisa saja baru selesai
+                existing = await _find_summary(cur, employee_id, period, fingerprint, since)
+                if existing is not None:
+                    if owner:
+                        await _release_lease(cur, employee_id, period, fingerprint, owner)
+                    return _summary_result(*existing, cached=False)
+        if owner:
+            break
+        await asyncio.sleep(settings.GENERATION_POLL_INTERVAL)
+
+    saved = False
+    try:
+        # Connection tidak ditahan selama panggilan LLM.
+        row = await summarize_kpi(employee_id, period, data)
+        async with get_db() as conn:
+            async with conn.cursor() as cur:
+                # Upsert + lepas lease dalam satu transaksi: worker yang menunggu
+                # tidak pernah melihat lease hilang tanpa hasil tersimpan.
+                await save_summaries(cur, [row])
+                await _release_lease(cur, employee_id, period, fingerprint, owner)
+        saved = True
+        return _summary_result(row[2], row[9].obj if row[9] is not None else None, cached=False)
+    finally:
+        if not saved:
+            await asyncio.shield(_release_lease_now(employee_id, period, fingerprint, owner))
+
+
+async def generate_performance(employee_code: str, period: str, force: bool = False) -> dict | None:
+    """
+    Generate (atau ambil dari cache) summary performa satu karyawan untuk satu periode.
+    Jika fingerprint input KPI sama dengan summary tersimpan, LLM tidak dipanggil
+    kecuali force=True. Request duplikat yang bersamaan (double-click, beberapa tab,
+    worker lain) menunggu satu generation yang sedang berjalan dan memakai hasilnya.
+    Returns {"ai_summary", "ai_summary_json", "cached"} atau None jika data KPI tidak ada;
+    ai_summary_json = objek hasil parse (None untuk summary lama yang bukan JSON valid).
+    """
+    with span("perf.load"):
+        async with get_db() as conn:
+            async with conn.cursor() as cur:
+                employee_id = await _get_employee_id_by_code(cur, employee_code)
+                if employee_id is None:
+                    return None
+
+                await cur.execute(_KPI_QUERY, (employee_id, period))
+                data = await cur.fetchall()
+                if not data:
+                    return None
+
+                fingerprint = input_fingerprint(data)
+                if not force:
+                    cached = await _find_summary(cur, employee_id, period, fingerprint)
+                    if cached is not None:
+                        return _summary_result(*cached, cached=True)
+
+    # Single-flight di proses ini: satu task per key, request lain menunggu task yang sama.
+    # Task terpisah (di-shield) supaya request pertama yang batal tidak membatalkan yang lain.
+    key = (employee_id, period, fingerprint)
+    task = _inflight.get(key)
+    if task is None:
+        task = detached_task(_generate_single_flight(employee_id, period, data, fingerprint))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    with span("perf.generate"):
+        return await asyncio.shield(task)
@@ -1,3 +1,34 @@
+# Naikkan setiap kali isi/struktur prompt berubah: bagian dari fingerprint input
+# performance_summary, sehingga summary lama digenerate ulang dengan prompt baru.
+PROMPT_VERSION = "2"
+
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+# JSON schema output summary, dikirim sebagai option `format` Ollama sehingga output
+# dibatasi grammar dan selalu berupa objek JSON dengan field berikut.
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "achieved_kpi": _STRING_LIST,
+        "not_achieved_kpi": _STRING_LIST,
+        "kpi_improvement_suggestions": _STRING_LIST,
+        "training_rekomendation": _STRING_LIST,
+        "workload_adjustment_rekomendation": _STRING_LIST,
+        "motivation": {"type": "string"},
+    },
+    "required": [
+        "summary",
+        "achieved_kpi",
+        "not_achieved_kpi",
+        "kpi_improvement_suggestions",
+        "training_rekomendation",
+        "workload_adjustment_rekomendation",
+        "motivation",
+    ],
+}
+
+
 def build_prompt(employee_name, kpi_data, period):
     kpi_lines = ""
 
@@ -1,5 +1,11 @@
+import hashlib
+from decimal import Decimal
 from typing import Any, Optional
 
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
 
 def success_response(data: Any, message: str = "Success", code: int = 200) -> dict:
     """Standard success response format."""
@@ -21,3 +27,55 @@ def error_response(
         "code": code,
         "data": data,
     }
+
+
+def _json_default(obj: Any):
+    # Sama dengan jsonable_encoder FastAPI: Decimal bulat -> int, selain itu float
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    return str(obj)
+
+
+def dumps(data: Any) -> bytes:
+    """Encode JSON dengan orjson (datetime/date/UUID native, Decimal seperti FastAPI)."""
+    return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse yang di-render dengan orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format satu Server-Sent Event (data di-encode sebagai JSON)."""
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag dari penanda versi resource (generated_at, version, id terakhir, ...)."""
+    digest = hashlib.sha256(dumps(parts)).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """True jika If-None-Match request cocok dengan etag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def json_response(content: Any, etag: str | None = None) -> Response:
+    """
+    Response JSON langsung (tanpa jsonable_encoder). Dengan etag: header ETag +
+    Cache-Control private, no-cache supaya browser selalu revalidasi (304 jika sama).
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"} if etag else None
+    return FastJSONResponse(content=content, headers=headers)
+
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
@@ -0,0 +1,73 @@
+"""Benchmark prompt_eval_duration per turn chat: prompt penuh vs reuse context KV-cache Ollama.
+
+- full : tiap turn mengirim system prompt + seluruh percakapan (alur lama)
+- reuse: turn pertama prompt penuh, turn berikutnya hanya pesan baru + context turn sebelumnya
+
+Hanya butuh Ollama sesuai .env (tanpa database).
+
+Usage:
+    python benchmarks/chat_context_reuse.py [--turns 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Supaya bisa import app dari project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ai_service import _generate_raw, _messages_to_prompt, close_client
+from app.services.chat_service import CHAT_SYSTEM_PROMPT
+
+QUESTIONS = [
+    "Apa itu KPI dan bagaimana cara membaca pencapaian KPI saya?",
+    "Bagaimana cara meningkatkan achievement percentage yang masih di bawah target?",
+    "Pelatihan apa yang cocok untuk meningkatkan task completion?",
+    "Bagaimana mengatur workload supaya deadline tidak terlewat?",
+    "Apa arti kategori performa 'Good' pada ringkasan performa?",
+    "Bagaimana cara menyusun rencana perbaikan KPI untuk bulan depan?",
+    "Apa perbedaan target value dan actual value?",
+    "Tips menjaga motivasi kerja saat target tinggi?",
+]
+
+
+def _ms(ns) -> float:
+    return (ns or 0) / 1e6
+
+
+async def _run(turns: int, reuse: bool) -> list[tuple[int, float]]:
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    context = None
+    results = []
+    for i in range(turns):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        messages.append({"role": "user", "content": question})
+        if reuse and context:
+            data = await _generate_raw(_messages_to_prompt([messages[-1]]), num_predict=128, context=context)
+        else:
+            data = await _generate_raw(_messages_to_prompt(messages), num_predict=128)
+        context = data.get("context")
+        messages.append({"role": "assistant", "content": (data.get("response") or "").strip()})
+        results.append((data.get("prompt_eval_count") or 0, _ms(data.get("prompt_eval_duration"))))
+    return results
+
+
+async def main(args):
+    try:
+        full = await _run(args.turns, reuse=False)
+        reuse = await _run(args.turns, reuse=True)
+    finally:
+        await close_client()
+
+    print(f"{'turn':>4} | {'full tokens':>11} {'full ms':>9} | {'reuse tokens':>12} {'reuse ms':>9}")
+    for i, ((ft, fms), (rt, rms)) in enumerate(zip(full, reuse), start=1):
+        print(f"{i:>4} | {ft:>11} {fms:>9.1f} | {rt:>12} {rms:>9.1f}")
+    full_ms = sum(ms for _, ms in full)
+    reuse_ms = sum(ms for _, ms in reuse)
+    print(f"total prompt_eval: full {full_ms:.1f} ms, reuse {reuse_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""Fixture realistis untuk microbenchmark (benchmarks/microbench.py).
+
+Dibangun deterministik (random seed tetap) supaya hasil antar commit sebanding.
+Bentuk data mengikuti yang dipakai kode aplikasi:
+- KPI row = hasil _KPI_QUERY: (full_name, kpi_name, target_value, actual_value, achievement_percentage)
+- chat message = {"role", "content"} seperti _build_messages
+- output LLM = JSON valid, JSON rusak (markdown/trailing comma/terpotong), format lama bersection
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+_rng = random.Random(1234)
+
+_KPI_NAMES = [
+    "Attendance Rate", "Task Completion Rate", "Customer Satisfaction", "Project Delivery On Time",
+    "Code Review Turnaround", "Ticket Resolution Time", "Training Hours", "Sales Target",
+    "Bug Escape Rate", "Documentation Coverage",
+]
+
+_SENTENCES = [
+    "Bagaimana cara meningkatkan pencapaian KPI saya yang masih di bawah target bulan ini?",
+    "Kamu bisa mulai dengan memecah target bulanan menjadi target mingguan yang terukur.",
+    "Pantau realisasi setiap akhir minggu dan diskusikan hambatan dengan atasan langsung.",
+    "Apa pelatihan yang paling relevan untuk meningkatkan task completion rate?",
+    "Pelatihan manajemen waktu dan prioritisasi tugas biasanya memberikan dampak paling cepat.",
+    "Tetap konsisten; perbaikan kecil setiap minggu akan terlihat di akhir periode.",
+]
+
+
+def kpi_rows(count: int, name: str = "Budi Santoso") -> list[tuple]:
+    rows = []
+    for i in range(count):
+        target = Decimal(_rng.choice([80, 85, 90, 95, 100]))
+        actual = (target * Decimal(str(round(_rng.uniform(0.6, 1.15), 2)))).quantize(Decimal("0.01"))
+        achievement = (actual / target * 100).quantize(Decimal("0.01"))
+        kpi_name = _KPI_NAMES[i % len(_KPI_NAMES)] + ("" if i < len(_KPI_NAMES) else f" #{i}")
+        rows.append((name, kpi_name, target, actual, achievement))
+    return rows
+
+
+def chat_messages(count: int, words_per_message: int = 40) -> list[dict]:
+    messages = [{"role": "system", "content": "Anda adalah asisten HR yang membantu karyawan memahami KPI."}]
+    for i in range(count):
+        sentences = []
+        while sum(len(s.split()) for s in sentences) < words_per_message:
+            sentences.append(_rng.choice(_SENTENCES))
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(sentences)})
+    return messages
+
+
+SUMMARY_OBJECT = {
+    "summary": "Secara keseluruhan performa kamu pada periode ini baik. " * 6,
+    "achieved_kpi": [f"{n}: target=90.00%, actual=95.00%" for n in _KPI_NAMES[:5]],
+    "not_achieved_kpi": [f"{n}: target=95.00%, actual=80.00%" for n in _KPI_NAMES[5:]],
+    "kpi_improvement_suggestions": [
+        "Susun jadwal kerja mingguan dan pantau kehadiran setiap akhir pekan.",
+        "Diskusikan hambatan dengan atasan untuk mencari solusi bersama.",
+    ],
+    "training_rekomendation": ["Pelatihan manajemen waktu", "Pelatihan perencanaan kerja"],
+    "workload_adjustment_rekomendation": ["Distribusikan tugas rutin secara merata selama sebulan"],
+    "motivation": "Terus konsisten, setiap langkah kecil membawa hasil besar.",
+}
+
+# Output structured (format schema): JSON valid apa adanya
+LLM_JSON = json.dumps(SUMMARY_OBJECT, ensure_ascii=False, indent=2)
+# Model yang mengabaikan schema: markdown block + teks pembuka + trailing comma
+LLM_JSON_MARKDOWN = (
+    "Berikut analisis performa dalam format JSON:\n```json\n"
+    + LLM_JSON.replace('"\n}', '",\n}').replace("]\n", "],\n", 1)
+    + "\n```\nSemoga membantu."
+)
+# Terpotong di tengah (num_predict habis): tidak bisa di-repair
+LLM_JSON_TRUNCATED = LLM_JSON[: len(LLM_JSON) * 2 // 3]
+# Format lama (prompt versi 1) dengan section bold
+LLM_SECTIONS = (
+    "**Ringkasan**\n" + SUMMARY_OBJECT["summary"] + "\n\n"
+    "**Rekomendasi**\n" + "\n".join(f"- {s}" for s in SUMMARY_OBJECT["kpi_improvement_suggestions"] * 3) + "\n\n"
+    "**Motivasi**\n" + SUMMARY_OBJECT["motivation"] + "\n"
+)
+# Output panjang tanpa JSON sama sekali (kasus terburuk regex)
+LLM_GARBAGE = " ".join(_rng.choice(_SENTENCES) for _ in range(300))
+
+TOKEN_USER = {"id": 42, "username": "budi", "role_id": 2, "employee_id": 7, "employee_code": "E007"}
+
+
+def summary_response_data() -> dict:
+    return {
+        "employee_code": "E007",
+        "period": "2026-01",
+        "ai_summary": SUMMARY_OBJECT,
+        "generated_at": datetime(2026, 1, 31, 10, 30),
+    }
+
+
+def analytics_data(departments: int) -> dict:
+    """Bentuk hasil get_performance_analytics (json_agg dari DB sudah jadi list/dict)."""
+    performers = [
+        {
+            "employee_id": i,
+            "employee_code": f"E{i:04d}",
+            "full_name": f"Karyawan {i}",
+            "total_score": float(Decimal("80.25") + i),
+            "performance_category": "Good",
+        }
+        for i in range(5)
+    ]
+    return {
+        "period": "2026-01",
+        "version": 17,
+        "avg_score_per_department": [
+            {"department": f"Departemen {i}", "avg_score": 75.5 + i % 20, "employee_count": 10 + i}
+            for i in range(departments)
+        ],
+        "top_performers": performers,
+        "underperformers": performers[::-1],
+        "category_distribution": [
+            {"category": c, "count": n} for c, n in (("Excellent", 12), ("Good", 40), ("Average", 20))
+        ],
+    }
+
+
+def chat_history_data(count: int) -> list[dict]:
+    started = datetime(2026, 1, 1, 8, 0)
+    return [
+        {
+            "id": i,
+            "role": m["role"],
+            "content": m["content"],
+            "created_at": started + timedelta(minutes=i),
+        }
+        for i, m in enumerate(chat_messages(count)[1:])
+    ]
@@ -0,0 +1,105 @@
+"""Benchmark throughput login (logins/detik) sebelum vs sesudah optimasi bcrypt + last_login.
+
+- before    : bcrypt langsung di event loop + UPDATE last_login sinkron per login (alur awal:
+              verify_password dipanggil inline, setiap hash memblokir semua request lain)
+- threadpool: bcrypt di threadpool Starlette + UPDATE last_login sinkron (tahap antara)
+- after     : auth_service.login (executor bcrypt sesuai jumlah core + last_login write-behind)
+
+Selain logins/detik, dicatat lag event loop maksimum selama run (seberapa lama request
+lain tertahan). Dengan 1 core throughput ketiganya praktis sama (bcrypt CPU-bound);
+perbedaannya terlihat di lag loop, dan throughput naik sesuai jumlah core.
+
+Butuh database sesuai .env dan satu user aktif.
+
+Usage:
+    python benchmarks/login_throughput.py <username> <password> [--logins 200] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Supaya bisa import app dari project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.database import init_pool, close_pool
+from app.core.security import verify_password, shutdown_hash_executor
+from app.services import auth_service
+
+
+async def _login_before(username: str, password: str) -> bool:
+    user = await auth_service.get_user_by_username(username)
+    if not user or not verify_password(password, user["password_hash"]):
+        return False
+    await auth_service.update_last_login(user["id"])
+    return True
+
+
+async def _login_threadpool(username: str, password: str) -> bool:
+    user = await auth_service.get_user_by_username(username)
+    if not user or not await run_in_threadpool(verify_password, password, user["password_hash"]):
+        return False
+    await auth_service.update_last_login(user["id"])
+    return True
+
+
+async def _login_after(username: str, password: str) -> bool:
+    return await auth_service.login(username, password) is not None
+
+
+async def _loop_lag(interval: float, lags: list[float]):
+    """Ukur keterlambatan tick event loop (ms) selama benchmark berjalan."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def _run(fn, username: str, password: str, logins: int, concurrency: int) -> tuple[float, float]:
+    """Return (logins/detik, lag event loop maksimum dalam ms)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    lags: list[float] = []
+
+    async def one():
+        async with semaphore:
+            if not await fn(username, password):
+                raise RuntimeError("login failed; check username/password")
+
+    ticker = asyncio.create_task(_loop_lag(0.01, lags))
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(one() for _ in range(logins)))
+    finally:
+        ticker.cancel()
+    elapsed = time.perf_counter() - started
+    return logins / elapsed, max(lags, default=0.0)
+
+
+async def main(args):
+    await init_pool()
+    auth_service.start_last_login_writer()
+    try:
+        # Warm-up: buka koneksi pool dan executor
+        await _run(_login_after, args.username, args.password, 4, 4)
+        results = {}
+        for name, fn in (("before", _login_before), ("threadpool", _login_threadpool), ("after", _login_after)):
+            results[name], lag = await _run(fn, args.username, args.password, args.logins, args.concurrency)
+            print(f"{name:>10}: {results[name]:8.2f} logins/sec, max event loop lag {lag:8.1f} ms")
+        print(f"speedup: {results['after'] / results['before']:.2f}x "
+              f"({os.cpu_count()} cores, {args.logins} logins, concurrency {args.concurrency})")
+    finally:
+        await auth_service.stop_last_login_writer()
+        shutdown_hash_executor()
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("username")
+    parser.add_argument("password")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,175 @@
+"""Microbenchmark jalur CPU pure-Python yang dijalankan setiap request.
+
+- build_prompt (5 dan 200 KPI)
+- parsing output LLM: _load_ai_json / _extract_json_from_text / _parse_ai_json /
+  _parse_ai_sections / _parse_ai_summary_for_response (JSON valid, markdown, terpotong, sampah)
+- _json_object_end (deteksi akhir objek saat streaming JSON)
+- _messages_to_prompt (10 dan 200 pesan)
+- JWT encode/decode (core.security)
+- success_response + serialisasi response (dumps/orjson dan json stdlib untuk pembanding)
+
+Tanpa DB/Ollama. Hasil (median & min µs per panggilan) disimpan sebagai JSON per commit
+di benchmarks/results/<commit>.json; --compare membandingkan dengan hasil commit lain.
+
+Usage:
+    python benchmarks/microbench.py [--filter parse] [--repeat 7] [--out file.json]
+    python benchmarks/microbench.py --compare benchmarks/results/<commit lama>.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Supaya bisa import app dari project root
+sys.path.insert(0, ROOT)
+
+from benchmarks import fixtures
+from app.api.routes.performance import _parse_ai_summary_for_response
+from app.core.security import create_access_token, decode_access_token
+from app.services.ai_service import _json_object_end, _messages_to_prompt
+from app.services.performance_service import (
+    _extract_json_from_text,
+    _load_ai_json,
+    _parse_ai_json,
+    _parse_ai_sections,
+)
+from app.utils.prompt_builder import build_prompt
+from app.utils.response import dumps, success_response
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+# Selisih median (relatif) yang ditandai sebagai regresi/perbaikan saat --compare
+THRESHOLD = 0.10
+
+
+def _cases() -> list[tuple[str, Callable]]:
+    kpi_small = fixtures.kpi_rows(5)
+    kpi_large = fixtures.kpi_rows(200)
+    chat_short = fixtures.chat_messages(10)
+    chat_long = fixtures.chat_messages(200)
+    token = create_access_token(dict(fixtures.TOKEN_USER))
+    summary_body = success_response(fixtures.summary_response_data(), "Summary retrieved successfully")
+    analytics_small = success_response(fixtures.analytics_data(10), "Analytics retrieved successfully")
+    analytics_large = success_response(fixtures.analytics_data(500), "Analytics retrieved successfully")
+    history_body = success_response({"history": fixtures.chat_history_data(200)}, "Riwayat chat berhasil diambil")
+
+    def stream_scan(text: str, chunk: int = 8):
+        state = [0, False, False]
+        for i in range(0, len(text), chunk):
+            if _json_object_end(text[i : i + chunk], state) >= 0:
+                return
+
+    return [
+        ("build_prompt/5_kpi", lambda: build_prompt("Budi Santoso", kpi_small, "2026-01")),
+        ("build_prompt/200_kpi", lambda: build_prompt("Budi Santoso", kpi_large, "2026-01")),
+        ("load_ai_json/valid", lambda: _load_ai_json(fixtures.LLM_JSON)),
+        ("load_ai_json/markdown_trailing_comma", lambda: _load_ai_json(fixtures.LLM_JSON_MARKDOWN)),
+        ("load_ai_json/truncated", lambda: _load_ai_json(fixtures.LLM_JSON_TRUNCATED)),
+        ("load_ai_json/garbage", lambda: _load_ai_json(fixtures.LLM_GARBAGE)),
+        ("extract_json_from_text/markdown", lambda: _extract_json_from_text(fixtures.LLM_JSON_MARKDOWN)),
+        ("parse_ai_json", lambda: _parse_ai_json(fixtures.SUMMARY_OBJECT)),
+        ("parse_ai_sections/sections", lambda: _parse_ai_sections(fixtures.LLM_SECTIONS)),
+        ("parse_ai_sections/garbage", lambda: _parse_ai_sections(fixtures.LLM_GARBAGE)),
+        ("parse_ai_summary_for_response/valid", lambda: _parse_ai_summary_for_response(fixtures.LLM_JSON)),
+        ("parse_ai_summary_for_response/markdown",
+         lambda: _parse_ai_summary_for_response(fixtures.LLM_JSON_MARKDOWN)),
+        ("parse_ai_summary_for_response/truncated",
+         lambda: _parse_ai_summary_for_response(fixtures.LLM_JSON_TRUNCATED)),
+        ("json_object_end/stream_8_char_chunks", lambda: stream_scan(fixtures.LLM_JSON)),
+        ("messages_to_prompt/10", lambda: _messages_to_prompt(chat_short)),
+        ("messages_to_prompt/200", lambda: _messages_to_prompt(chat_long)),
+        ("jwt/encode", lambda: create_access_token(dict(fixtures.TOKEN_USER))),
+        ("jwt/decode", lambda: decode_access_token(token)),
+        ("success_response/build", lambda: success_response(fixtures.summary_response_data(), "OK")),
+        ("serialize/summary_orjson", lambda: dumps(summary_body)),
+        ("serialize/summary_stdlib_json", lambda: json.dumps(summary_body, default=str).encode()),
+        ("serialize/analytics_10_orjson", lambda: dumps(analytics_small)),
+        ("serialize/analytics_500_orjson", lambda: dumps(analytics_large)),
+        ("serialize/analytics_500_stdlib_json", lambda: json.dumps(analytics_large, default=str).encode()),
+        ("serialize/chat_history_200_orjson", lambda: dumps(history_body)),
+    ]
+
+
+def _measure(fn, repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()  # jumlah loop sampai >= 0.2 detik
+    samples = [t / loops * 1e6 for t in timer.repeat(repeat=repeat, number=loops)]
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def _commit() -> str:
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+        return f"{sha}-dirty" if dirty else sha
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\ncompare with {baseline.get('commit')} ({baseline_path}); ratio = baru / lama (median)")
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<45} {'(baru)':>12}")
+            continue
+        ratio = result["median_us"] / old["median_us"] if old["median_us"] else float("inf")
+        flag = "REGRESI" if ratio > 1 + THRESHOLD else ("lebih cepat" if ratio < 1 - THRESHOLD else "")
+        print(f"{name:<45} {old['median_us']:>10.2f} -> {result['median_us']:>10.2f} µs  {ratio:>5.2f}x {flag}")
+
+
+def main(args):
+    results = {}
+    print(f"{'benchmark':<45} {'median µs':>12} {'min µs':>12} {'loops':>8}")
+    for name, fn in _cases():
+        if args.filter and args.filter not in name:
+            continue
+        result = _measure(fn, args.repeat)
+        results[name] = result
+        print(f"{name:<45} {result['median_us']:>12.2f} {result['min_us']:>12.2f} {result['loops']:>8}")
+
+    commit = _commit()
+    out = args.out or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"results written to {out}")
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="hanya benchmark yang namanya mengandung teks ini")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--out", help="file hasil (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="file hasil commit lain sebagai pembanding")
+    main(parser.parse_args())
@@ -0,0 +1,174 @@
+"""Fake Ollama HTTP server untuk load test tanpa GPU/model.
+
+Endpoint (subset API Ollama yang dipakai app):
+- POST /api/generate : stream dan non-stream; `format` (JSON schema) atau prompt yang
+                       meminta JSON -> objek JSON sesuai SUMMARY_SCHEMA (build_prompt)
+- POST /api/chat     : stream dan non-stream
+- GET  /api/tags     : daftar model (--models)
+
+Latency dapat diatur: --load-ms (sebelum token pertama), --prompt-tps (evaluasi prompt),
+--tokens-per-sec (generation), --error-rate (fraksi request yang dijawab HTTP 500
+{"error": ...}). Field durasi/token di payload akhir (load_duration, prompt_eval_count,
+eval_duration, context, dst.) diisi seperti Ollama asli sehingga metrics app terisi.
+
+Usage:
+    python loadtest/fake_ollama.py [--port 11434] [--tokens-per-sec 30] [--load-ms 50] [--error-rate 0]
+    # .env app: OLLAMA_URL=http://127.0.0.1:11434/api/generate
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Supaya bisa import app dari project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.utils.prompt_builder import SUMMARY_SCHEMA
+
+CANNED_SUMMARY = {
+    "summary": "Secara keseluruhan performa kamu pada periode ini baik. Sebagian besar KPI "
+               "tercapai, namun masih ada KPI yang perlu ditingkatkan agar sesuai target.",
+    "achieved_kpi": ["Task Completion Rate: target=90.00%, actual=95.00%"],
+    "not_achieved_kpi": ["Attendance Rate: target=95.00%, actual=90.00%"],
+    "kpi_improvement_suggestions": [
+        "Susun jadwal kerja mingguan dan pantau kehadiran setiap akhir pekan.",
+        "Diskusikan hambatan kehadiran dengan atasan untuk mencari solusi bersama.",
+    ],
+    "training_rekomendation": ["Pelatihan manajemen waktu", "Pelatihan perencanaan kerja"],
+    "workload_adjustment_rekomendation": ["Distribusikan tugas rutin secara merata selama sebulan"],
+    "motivation": "Terus konsisten, setiap langkah kecil yang kamu ambil membawa hasil besar.",
+}
+# Pastikan canned JSON tetap sesuai schema jika schema berubah
+assert set(SUMMARY_SCHEMA["required"]) <= set(CANNED_SUMMARY)
+
+CANNED_REPLY = (
+    "Tentu, berikut beberapa langkah yang bisa kamu lakukan: tetapkan target harian yang "
+    "jelas, pantau pencapaian KPI setiap minggu, dan diskusikan kendala dengan atasan. "
+    "Dengan konsisten, pencapaian KPI kamu akan meningkat."
+)
+CANNED_MOTIVATION = "Kerja keras hari ini adalah fondasi keberhasilan esok hari."
+
+
+def _tokens(text: str) -> list[str]:
+    """Pecah teks jadi potongan mirip token (kata + spasi di depannya)."""
+    words = text.split(" ")
+    return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+
+def _count_prompt_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Fake Ollama")
+
+    def _answer(prompt: str, wants_json: bool) -> str:
+        if wants_json:
+            return json.dumps(CANNED_SUMMARY, ensure_ascii=False)
+        if "motivator" in prompt.lower():
+            return CANNED_MOTIVATION
+        return CANNED_REPLY
+
+    async def _respond(body: dict, prompt: str, chat: bool):
+        if args.error_rate > 0 and random.random() < args.error_rate:
+            await asyncio.sleep(args.load_ms / 1000)
+            return JSONResponse({"error": "fake ollama: injected error"}, status_code=500)
+
+        model = body.get("model") or args.models[0]
+        wants_json = bool(body.get("format")) or "format JSON" in prompt
+        tokens = _tokens(_answer(prompt, wants_json))
+        context = body.get("context") or []
+        # Dengan context (KV-cache turn sebelumnya) hanya prompt baru yang dievaluasi
+        prompt_tokens = _count_prompt_tokens(prompt)
+        load_s = args.load_ms / 1000
+        prompt_s = prompt_tokens / args.prompt_tps
+        token_s = 1 / args.tokens_per_sec
+
+        def final(eval_count: int, eval_s: float) -> dict:
+            data = {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((load_s + prompt_s + eval_s) * 1e9),
+                "load_duration": int(load_s * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_s * 1e9),
+                "eval_count": eval_count,
+                "eval_duration": int(eval_s * 1e9),
+            }
+            if not chat:
+                # Context palsu: bertambah sesuai token turn ini (cukup untuk budget di app)
+                data["context"] = list(context) + list(range(prompt_tokens + eval_count))
+            return data
+
+        def piece(text: str) -> dict:
+            if chat:
+                return {"model": model, "message": {"role": "assistant", "content": text}, "done": False}
+            return {"model": model, "response": text, "done": False}
+
+        if not body.get("stream", True):
+            await asyncio.sleep(load_s + prompt_s + token_s * len(tokens))
+            data = final(len(tokens), token_s * len(tokens))
+            text = "".join(tokens)
+            if chat:
+                data["message"] = {"role": "assistant", "content": text}
+            else:
+                data["response"] = text
+            return JSONResponse(data)
+
+        async def stream():
+            await asyncio.sleep(load_s + prompt_s)
+            started = time.perf_counter()
+            for token in tokens:
+                await asyncio.sleep(token_s)
+                yield json.dumps(piece(token), ensure_ascii=False) + "\n"
+            last = final(len(tokens), time.perf_counter() - started)
+            if chat:
+                last["message"] = {"role": "assistant", "content": ""}
+            else:
+                last["response"] = ""
+            yield json.dumps(last) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        return await _respond(body, body.get("prompt") or "", chat=False)
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        prompt = "\n".join((m.get("content") or "") for m in body.get("messages") or [])
+        return await _respond(body, prompt, chat=True)
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": m, "model": m} for m in args.models]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", nargs="+", default=["llama3:8b"], help="model yang dilaporkan /api/tags")
+    parser.add_argument("--load-ms", type=float, default=50, help="latency sebelum evaluasi prompt")
+    parser.add_argument("--prompt-tps", type=float, default=500, help="token/detik evaluasi prompt")
+    parser.add_argument("--tokens-per-sec", type=float, default=30, help="token/detik generation")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraksi request yang gagal (0-1)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,182 @@
+"""Load test end-to-end: banyak user sintetis terhadap API yang sedang berjalan.
+
+Skenario (per level concurrency, masing-masing --requests request):
+- login     : POST /api/auth/login/json
+- chat      : POST /api/chat
+- generate  : POST /api/performance/generate/{period} (--force-generate = selalu panggil LLM)
+- summary   : GET  /api/performance/summary/me/{period}
+- analytics : GET  /api/performance/analytics/{period}
+
+Request dibagi round-robin ke user loadtest_0001.. (lihat seed.py). Hasil: p50/p95/p99
+latency, throughput, dan jumlah error (HTTP != 200 atau "code" body != 200) per
+skenario dan concurrency; --json menyimpan hasil ke file.
+
+Setup (tanpa Ollama asli):
+    python loadtest/fake_ollama.py --tokens-per-sec 30 &
+    python loadtest/seed.py --users 200
+    uvicorn app.main:app --port 8000 &   # OLLAMA_URL=http://127.0.0.1:11434/api/generate
+
+Usage:
+    python loadtest/run.py [--base-url http://127.0.0.1:8000] [--users 50]
+        [--concurrency 1 8 32] [--requests 100] [--scenarios login chat summary] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+SCENARIOS = ("login", "chat", "generate", "summary", "analytics")
+CHAT_MESSAGES = [
+    "Bagaimana cara meningkatkan KPI saya bulan ini?",
+    "Apa arti achievement percentage?",
+    "Tips mengatur workload supaya deadline tercapai?",
+    "Pelatihan apa yang cocok untuk saya?",
+]
+
+
+def _percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class User:
+    def __init__(self, username: str, password: str):
+        self.username = username
+        self.password = password
+        self.token: str | None = None
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def _login(client: httpx.AsyncClient, user: User) -> httpx.Response:
+    response = await client.post(
+        "/api/auth/login/json",
+        json={"username": user.username, "password": user.password},
+    )
+    if response.status_code == 200 and response.json().get("code") == 200:
+        user.token = response.json()["data"]["access_token"]
+    return response
+
+
+def _request_fn(scenario: str, args):
+    """Fungsi (client, user, i) -> Response untuk satu request skenario."""
+    if scenario == "login":
+        return lambda client, user, i: _login(client, user)
+    if scenario == "chat":
+        return lambda client, user, i: client.post(
+            "/api/chat", json={"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]}, headers=user.headers
+        )
+    if scenario == "generate":
+        params = {"force": "true"} if args.force_generate else None
+        return lambda client, user, i: client.post(
+            f"/api/performance/generate/{args.period}", params=params, headers=user.headers
+        )
+    if scenario == "summary":
+        return lambda client, user, i: client.get(f"/api/performance/summary/me/{args.period}", headers=user.headers)
+    if scenario == "analytics":
+        return lambda client, user, i: client.get(f"/api/performance/analytics/{args.period}", headers=user.headers)
+    raise ValueError(scenario)
+
+
+def _is_error(response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return True
+    try:
+        return response.json().get("code", 200) != 200
+    except ValueError:
+        return True
+
+
+async def _run_level(client: httpx.AsyncClient, users: list[User], fn, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    statuses: dict[str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            user = users[i % len(users)]
+            started = time.perf_counter()
+            try:
+                response = await fn(client, user, i)
+                failed = _is_error(response)
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                failed, status = True, type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "statuses": statuses,
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+    }
+
+
+async def main(args):
+    users = [User(f"{args.user_prefix}{i:04d}", args.password) for i in range(1, args.users + 1)]
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        # Login awal semua user (token untuk skenario lain)
+        semaphore = asyncio.Semaphore(max(args.concurrency))
+
+        async def login_one(user: User):
+            async with semaphore:
+                await _login(client, user)
+
+        await asyncio.gather(*(login_one(u) for u in users))
+        users = [u for u in users if u.token]
+        if not users:
+            raise SystemExit("no user could log in; run loadtest/seed.py first")
+        print(f"{len(users)} users logged in")
+
+        results = []
+        print(f"{'scenario':<10} {'conc':>5} {'reqs':>6} {'err':>5} {'rps':>8} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for scenario in args.scenarios:
+            fn = _request_fn(scenario, args)
+            for concurrency in args.concurrency:
+                result = {"scenario": scenario, **await _run_level(client, users, fn, args.requests, concurrency)}
+                results.append(result)
+                print(f"{scenario:<10} {concurrency:>5} {result['requests']:>6} {result['errors']:>5} "
+                      f"{result['throughput_rps']:>8.2f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+                      f"{result['p99_ms']:>9.1f} {result['max_ms']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"base_url": args.base_url, "users": len(users), "results": results}, f, indent=2)
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=50, help="jumlah user sintetis yang dipakai")
+    parser.add_argument("--user-prefix", default="loadtest_")
+    parser.add_argument("--password", default="loadtest")
+    parser.add_argument("--period", default="2026-01")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="request per skenario per level concurrency")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--force-generate", action="store_true", help="generate selalu memanggil LLM")
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,164 @@
+"""Seed database lokal dengan user/karyawan sintetis untuk load test.
+
+Membuat departemen "Load Test", N karyawan (kode LT0001..) dengan user login
+loadtest_0001.. (password sama), dan KPI + realisasi acak (seed tetap) untuk satu
+periode. Idempotent: menjalankan ulang hanya menambah yang belum ada. --clean
+menghapus semua data loadtest (termasuk summary, chat, job).
+
+Butuh database sesuai .env dengan tabel aplikasi dan semua migrations.
+
+Usage:
+    python loadtest/seed.py [--users 200] [--period 2026-01] [--kpis 5] [--password loadtest]
+    python loadtest/seed.py --clean
+"""
+import argparse
+import os
+import random
+import sys
+
+# Supaya bisa import app dari project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import get_connection
+from app.core.security import get_password_hash
+
+DEPARTMENT = "Load Test"
+USER_PREFIX = "loadtest_"
+CODE_PREFIX = "LT"
+KPI_NAMES = [
+    "Attendance Rate",
+    "Task Completion Rate",
+    "Customer Satisfaction",
+    "Project Delivery On Time",
+    "Code Review Turnaround",
+    "Ticket Resolution Time",
+    "Training Hours",
+    "Sales Target",
+]
+
+
+def _department_id(cur) -> int:
+    cur.execute("SELECT id FROM departments WHERE name = %s", (DEPARTMENT,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    cur.execute("INSERT INTO departments (name) VALUES (%s) RETURNING id", (DEPARTMENT,))
+    return cur.fetchone()[0]
+
+
+def _kpi_ids(cur, count: int) -> list[int]:
+    ids = []
+    for name in KPI_NAMES[:count]:
+        cur.execute("SELECT id FROM kpi_master WHERE kpi_name = %s", (name,))
+        row = cur.fetchone()
+        if row is None:
+            cur.execute("INSERT INTO kpi_master (kpi_name) VALUES (%s) RETURNING id", (name,))
+            row = cur.fetchone()
+        ids.append(row[0])
+    return ids
+
+
+def _employee_id(cur, code: str, name: str, department_id: int) -> int:
+    cur.execute("SELECT id FROM employees WHERE employee_code = %s", (code,))
+    row = cur.fetchone()
+    if row:
+        return row[0]
+    cur.execute(
+        "INSERT INTO employees (employee_code, full_name, department_id) VALUES (%s, %s, %s) RETURNING id",
+        (code, name, department_id),
+    )
+    return cur.fetchone()[0]
+
+
+def _ensure_user(cur, username: str, password_hash: str, full_name: str, employee_id: int, role_id: int):
+    cur.execute("SELECT id FROM users WHERE username = %s", (username,))
+    if cur.fetchone():
+        return
+    cur.execute(
+        """
+        INSERT INTO users (username, password_hash, full_name, email, role_id, employee_id, is_active)
+        VALUES (%s, %s, %s, %s, %s, %s, TRUE)
+        """,
+        (username, password_hash, full_name, f"{username}@loadtest.local", role_id, employee_id),
+    )
+
+
+def _ensure_kpis(cur, rng: random.Random, employee_id: int, period: str, kpi_ids: list[int]):
+    cur.execute(
+        "SELECT 1 FROM kpi_assignment WHERE employee_id = %s AND period = %s LIMIT 1",
+        (employee_id, period),
+    )
+    if cur.fetchone():
+        return
+    for kpi_id in kpi_ids:
+        target = rng.choice([80, 85, 90, 95, 100])
+        actual = round(target * rng.uniform(0.6, 1.15), 2)
+        cur.execute(
+            """
+            INSERT INTO kpi_assignment (employee_id, kpi_id, period, target_value)
+            VALUES (%s, %s, %s, %s) RETURNING id
+            """,
+            (employee_id, kpi_id, period, target),
+        )
+        assignment_id = cur.fetchone()[0]
+        cur.execute(
+            """
+            INSERT INTO kpi_realization (assignment_id, actual_value, achievement_percentage)
+            VALUES (%s, %s, %s)
+            """,
+            (assignment_id, actual, round(actual / target * 100, 2)),
+        )
+
+
+def seed(args):
+    rng = random.Random(42)
+    password_hash = get_password_hash(args.password)
+    with get_connection() as conn, conn.cursor() as cur:
+        department_id = _department_id(cur)
+        kpi_ids = _kpi_ids(cur, args.kpis)
+        for i in range(1, args.users + 1):
+            name = f"Load Test {i:04d}"
+            employee_id = _employee_id(cur, f"{CODE_PREFIX}{i:04d}", name, department_id)
+            _ensure_user(cur, f"{USER_PREFIX}{i:04d}", password_hash, name, employee_id, args.role_id)
+            _ensure_kpis(cur, rng, employee_id, args.period, kpi_ids)
+    print(f"seeded {args.users} users ({USER_PREFIX}0001..) for period {args.period}, password '{args.password}'")
+
+
+def clean():
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM employees WHERE employee_code LIKE %s", (CODE_PREFIX + "%",))
+        employee_ids = [r[0] for r in cur.fetchall()]
+        cur.execute("SELECT id FROM users WHERE username LIKE %s", (USER_PREFIX + "%",))
+        user_ids = [r[0] for r in cur.fetchall()]
+        cur.execute("DELETE FROM chat_history WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM chat_summary WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM performance_job WHERE user_id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (user_ids,))
+        cur.execute("DELETE FROM performance_summary WHERE employee_id = ANY(%s)", (employee_ids,))
+        cur.execute("DELETE FROM performance_generation_lease WHERE employee_id = ANY(%s)", (employee_ids,))
+        cur.execute(
+            """
+            DELETE FROM kpi_realization WHERE assignment_id IN (
+                SELECT id FROM kpi_assignment WHERE employee_id = ANY(%s)
+            )
+            """,
+            (employee_ids,),
+        )
+        cur.execute("DELETE FROM kpi_assignment WHERE employee_id = ANY(%s)", (employee_ids,))
+        cur.execute("DELETE FROM employees WHERE id = ANY(%s)", (employee_ids,))
+    print(f"removed {len(user_ids)} users, {len(employee_ids)} employees")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--period", default="2026-01")
+    parser.add_argument("--kpis", type=int, default=5, choices=range(1, len(KPI_NAMES) + 1))
+    parser.add_argument("--password", default="loadtest")
+    parser.add_argument("--role-id", type=int, default=2, help="role_id user sintetis (bukan admin)")
+    parser.add_argument("--clean", action="store_true", help="hapus semua data loadtest")
+    args = parser.parse_args()
+    if args.clean:
+        clean()
+    else:
+        seed(args)
@@ -0,0 +1,25 @@
+-- Batch generate performance summary per periode (admin).
+-- Satu row per run; progress disimpan tiap flush upsert supaya run bisa di-resume.
+CREATE TABLE IF NOT EXISTS performance_batch_run (
+    id              SERIAL PRIMARY KEY,
+    period          VARCHAR(20) NOT NULL,
+    department_id   INTEGER,
+    concurrency     INTEGER NOT NULL,
+    status          VARCHAR(20) NOT NULL DEFAULT 'running',  -- running | completed | failed | interrupted
+    total           INTEGER NOT NULL DEFAULT 0,
+    succeeded       INTEGER NOT NULL DEFAULT 0,
+    failed          INTEGER NOT NULL DEFAULT 0,
+    error           TEXT,
+    created_by      INTEGER,
+    started_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at     TIMESTAMP
+);
+
+-- Resume: cari summary yang sudah digenerate sejak run dimulai
+CREATE INDEX IF NOT EXISTS idx_performance_summary_period_generated
+    ON performance_summary (period, generated_at);
+
+-- Satu query KPI untuk semua karyawan di periode
+CREATE INDEX IF NOT EXISTS idx_kpi_assignment_period_employee
+    ON kpi_assignment (period, employee_id);
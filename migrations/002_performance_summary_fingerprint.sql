@@ -0,0 +1,8 @@
+-- Fingerprint input summary (SHA-256 dari baris KPI + model + versi prompt).
+-- generate_performance melewati panggilan LLM jika fingerprint sama.
+ALTER TABLE performance_summary
+    ADD COLUMN IF NOT EXISTS input_fingerprint CHAR(64);
+
+ALTER TABLE performance_batch_run
+    ADD COLUMN IF NOT EXISTS force BOOLEAN NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS skipped INTEGER NOT NULL DEFAULT 0;
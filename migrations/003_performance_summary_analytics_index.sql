@@ -0,0 +1,5 @@
+-- Analytics per periode: satu index scan (index-only) untuk semua agregat
+-- di analytics_service._ANALYTICS_QUERY.
+CREATE INDEX IF NOT EXISTS idx_performance_summary_period_score
+    ON performance_summary (period, total_score)
+    INCLUDE (employee_id, performance_category);
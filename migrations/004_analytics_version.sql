@@ -0,0 +1,29 @@
+-- Versi data analytics per periode. Naik otomatis (trigger) setiap kali baris
+-- performance_summary periode itu di-insert/update/delete, di transaksi yang sama.
+-- Cache analytics di tiap worker membandingkan versi ini sebelum memakai hasil cache.
+CREATE TABLE IF NOT EXISTS analytics_version (
+    period      VARCHAR(20) PRIMARY KEY,
+    version     BIGINT NOT NULL DEFAULT 1,
+    updated_at  TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION bump_analytics_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO analytics_version (period) VALUES (OLD.period)
+        ON CONFLICT (period) DO UPDATE
+            SET version = analytics_version.version + 1, updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    IF TG_OP <> 'DELETE' AND (TG_OP = 'INSERT' OR NEW.period IS DISTINCT FROM OLD.period) THEN
+        INSERT INTO analytics_version (period) VALUES (NEW.period)
+        ON CONFLICT (period) DO UPDATE
+            SET version = analytics_version.version + 1, updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_performance_summary_analytics_version ON performance_summary;
+CREATE TRIGGER trg_performance_summary_analytics_version
+    AFTER INSERT OR UPDATE OR DELETE ON performance_summary
+    FOR EACH ROW EXECUTE FUNCTION bump_analytics_version();
@@ -0,0 +1,5 @@
+-- Index untuk history chat per user: "N pesan terbaru" dan keyset pagination
+-- (created_at, id) di kedua arah dibaca langsung dari index tanpa sort.
+-- CONCURRENTLY: tidak mengunci insert chat saat index dibuat (jangan jalankan di dalam BEGIN/COMMIT).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_history_user_created
+    ON chat_history (user_id, created_at, id);
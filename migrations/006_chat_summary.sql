@@ -0,0 +1,10 @@
+-- Ringkasan berjalan percakapan chatbot per user. Pesan sampai (last_created_at,
+-- last_message_id) sudah dilipat ke summary; hanya pesan setelahnya yang dikirim
+-- verbatim ke model. Di-refresh di background oleh chat_service.
+CREATE TABLE IF NOT EXISTS chat_summary (
+    user_id          INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    summary          TEXT NOT NULL,
+    last_created_at  TIMESTAMP NOT NULL,
+    last_message_id  INT NOT NULL,
+    updated_at       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,13 @@
+-- Lease single-flight generate summary lintas worker: satu baris per
+-- (employee_id, period, input_fingerprint) yang sedang digenerate. Pemilik lease
+-- menghapus barisnya di transaksi yang sama dengan upsert performance_summary;
+-- request duplikat di worker lain menunggu lalu membaca hasil itu. Lease yang
+-- expired (worker crash) boleh diambil alih.
+CREATE TABLE IF NOT EXISTS performance_generation_lease (
+    employee_id        INT NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    period             VARCHAR(20) NOT NULL,
+    input_fingerprint  CHAR(64) NOT NULL,
+    owner              VARCHAR(64) NOT NULL,
+    expires_at         TIMESTAMP NOT NULL,
+    PRIMARY KEY (employee_id, period, input_fingerprint)
+);
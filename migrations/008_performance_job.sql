@@ -0,0 +1,32 @@
+-- Job generate performance summary (mode async: POST -> 202 + job id).
+-- State disimpan di sini supaya job bertahan saat restart: job 'queued' diambil worker
+-- mana pun, job 'running' yang lease-nya (locked_until) habis karena worker mati
+-- diambil ulang.
+CREATE TABLE IF NOT EXISTS performance_job (
+    id              BIGSERIAL PRIMARY KEY,
+    user_id         INTEGER NOT NULL,
+    employee_id     INTEGER NOT NULL,
+    employee_code   TEXT NOT NULL,
+    period          VARCHAR(20) NOT NULL,
+    force           BOOLEAN NOT NULL DEFAULT FALSE,
+    status          VARCHAR(20) NOT NULL DEFAULT 'queued',  -- queued | running | succeeded | failed
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    ai_summary      TEXT,
+    cached          BOOLEAN,
+    error           TEXT,
+    locked_by       VARCHAR(64),
+    locked_until    TIMESTAMP,
+    run_after       TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at      TIMESTAMP,
+    updated_at      TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at     TIMESTAMP
+);
+
+-- Worker mengambil job aktif tertua yang sudah boleh dijalankan
+CREATE INDEX IF NOT EXISTS idx_performance_job_active
+    ON performance_job (run_after, id) WHERE status IN ('queued', 'running');
+
+-- Batas job aktif per user
+CREATE INDEX IF NOT EXISTS idx_performance_job_user_active
+    ON performance_job (user_id) WHERE status IN ('queued', 'running');
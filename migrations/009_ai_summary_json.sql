@@ -0,0 +1,5 @@
+-- Hasil summary AI yang sudah di-parse (output JSON schema), disimpan sekali saat
+-- generate dan dikembalikan GET summary apa adanya. Summary lama tetap NULL di sini
+-- dan diparse dari kolom ai_summary (teks) sampai digenerate ulang.
+ALTER TABLE performance_summary ADD COLUMN IF NOT EXISTS ai_summary_json JSONB;
+ALTER TABLE performance_job ADD COLUMN IF NOT EXISTS ai_summary_json JSONB;
@@ -0,0 +1,60 @@
+"""Batch generate performance summary untuk satu periode dari command line (tanpa HTTP).
+
+Usage:
+    python scripts/batch_generate.py <period> [--department ID] [--concurrency N] [--force]
+    python scripts/batch_generate.py --resume RUN_ID [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import os
+
+# Supaya bisa import app dari project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import init_pool, close_pool
+from app.services.ai_service import close_client
+from app.services import batch_service
+
+
+async def main(args) -> int:
+    await init_pool()
+    try:
+        if args.resume:
+            run = await batch_service.resume_batch(args.resume, concurrency=args.concurrency)
+            if not run:
+                print(f"Run {args.resume} not found or already completed")
+                return 1
+        else:
+            run = await batch_service.start_batch(
+                args.period,
+                department_id=args.department,
+                concurrency=args.concurrency,
+                force=args.force,
+            )
+        print(f"Run {run['id']} started (period={run['period']}, concurrency={run['concurrency']})")
+        await batch_service.wait_batch(run["id"])
+        run = await batch_service.get_batch_run(run["id"])
+        print(
+            f"Run {run['id']} {run['status']}: {run['succeeded']}/{run['total']} succeeded, "
+            f"{run['failed']} failed, {run['skipped']} unchanged"
+        )
+        return 0 if run["status"] == "completed" and not run["failed"] else 1
+    finally:
+        await close_client()
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("period", nargs="?")
+    parser.add_argument("--department", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="generate ulang walau data KPI tidak berubah")
+    parser.add_argument("--resume", type=int, default=None, metavar="RUN_ID")
+    args = parser.parse_args()
+    if not args.period and not args.resume:
+        parser.error("period atau --resume wajib diisi")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,106 @@
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.chat_service import (
+    InvalidCursor,
+    _history_page,
+    decode_cursor,
+    encode_cursor,
+    parse_history_cursor,
+)
+
+_START = datetime(2026, 1, 1, 8, 0, 0)
+# 7 pesan; pesan 3 dan 4 punya created_at sama (urutan ditentukan id)
+_ROWS = [
+    (i, "user" if i % 2 else "assistant", f"m{i}", _START + timedelta(seconds=i if i != 4 else 3))
+    for i in range(1, 8)
+]
+
+
+def _page(limit: int, before: str | None = None, after: str | None = None) -> dict:
+    """Jalankan _history_page atas _ROWS seperti query keyset di get_chat_history_page."""
+    cursor = parse_history_cursor(before, after)
+    rows = sorted(_ROWS, key=lambda r: (r[3], r[0]), reverse=not after)
+    if cursor is not None:
+        if after:
+            rows = [r for r in rows if (r[3], r[0]) > cursor]
+        else:
+            rows = [r for r in rows if (r[3], r[0]) < cursor]
+    return _history_page(rows[: limit + 1], limit, before, after)
+
+
+def _ids(page: dict) -> list[int]:
+    return [m["id"] for m in page["history"]]
+
+
+def test_cursor_round_trip():
+    message = {"id": 42, "created_at": datetime(2026, 1, 2, 3, 4, 5, 678901)}
+    cursor = encode_cursor(message)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (message["created_at"], 42)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "",
+        "not-base64!!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        base64.urlsafe_b64encode(b'{"a": 1}').decode(),
+        base64.urlsafe_b64encode(b'["2026-01-01T00:00:00"]').decode(),
+        base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+        base64.urlsafe_b64encode(b'["2026-01-01T00:00:00", "x"]').decode(),
+        base64.urlsafe_b64encode(b'["2026-01-01T00:00:00", null]').decode(),
+    ],
+)
+def test_malformed_cursor_raises(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_before_and_after_together_rejected():
+    cursor = encode_cursor({"id": 1, "created_at": _START})
+    with pytest.raises(InvalidCursor):
+        parse_history_cursor(cursor, cursor)
+    assert parse_history_cursor(None, None) is None
+
+
+def test_latest_page():
+    page = _page(3)
+    assert _ids(page) == [5, 6, 7]
+    assert page["prev"] is not None
+    assert page["next"] is None
+
+
+def test_latest_page_holds_everything():
+    page = _page(10)
+    assert _ids(page) == [1, 2, 3, 4, 5, 6, 7]
+    assert page["prev"] is None and page["next"] is None
+
+
+def test_walk_back_to_oldest_and_forward_again():
+    pages = [_page(3)]
+    while pages[-1]["prev"]:
+        pages.append(_page(3, before=pages[-1]["prev"]))
+    assert [_ids(p) for p in pages] == [[5, 6, 7], [2, 3, 4], [1]]
+    oldest = pages[-1]
+    assert oldest["prev"] is None
+    assert oldest["next"] is not None
+
+    forward = [oldest]
+    while forward[-1]["next"]:
+        forward.append(_page(3, after=forward[-1]["next"]))
+    assert [_ids(p) for p in forward] == [[1], [2, 3, 4], [5, 6, 7]]
+    newest = forward[-1]
+    assert newest["next"] is None
+    assert newest["prev"] is not None
+
+
+def test_empty_pages():
+    assert _history_page([], 3, None, None) == {"history": [], "prev": None, "next": None}
+    oldest = encode_cursor({"id": 1, "created_at": _ROWS[0][3]})
+    newest = encode_cursor({"id": 7, "created_at": _ROWS[-1][3]})
+    assert _page(3, before=oldest) == {"history": [], "prev": None, "next": None}
+    assert _page(3, after=newest) == {"history": [], "prev": None, "next": None}
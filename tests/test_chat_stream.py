@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from app.services import chat_service
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    """Ganti DB dan LLM chat_service dengan stub; return list pesan yang disimpan."""
+    rows = []
+
+    async def save_message(user_id, role, content):
+        await asyncio.sleep(0)
+        rows.append((role, content))
+        return len(rows)
+
+    async def prepare_turn(user_id, user_msg_id, user_message):
+        return [{"role": "user", "content": user_message}], None, False
+
+    async def stream_reply(user_id, messages, context, final):
+        for i in range(10):
+            await asyncio.sleep(0.01)
+            yield f"t{i} "
+        final["context"] = [1, 2, 3]
+
+    monkeypatch.setattr(chat_service, "_save_message", save_message)
+    monkeypatch.setattr(chat_service, "_prepare_turn", prepare_turn)
+    monkeypatch.setattr(chat_service, "_stream_reply", stream_reply)
+    monkeypatch.setattr(chat_service, "_remember_session", lambda *args: None)
+    return rows
+
+
+async def _connected():
+    return False
+
+
+def test_stream_saves_full_reply(saved):
+    async def scenario():
+        return [e async for e in chat_service.stream_message(1, "halo", _connected)]
+
+    events = asyncio.run(scenario())
+    assert events[0]["event"] == "start"
+    assert events[-1]["event"] == "done"
+    assert saved == [("user", "halo"), ("assistant", "".join(f"t{i} " for i in range(10)).strip())]
+
+
+def test_stream_closed_after_tokens_saves_partial_reply(saved):
+    async def scenario():
+        stream = chat_service.stream_message(1, "halo", _connected)
+        tokens = 0
+        async for event in stream:
+            if event["event"] == "token":
+                tokens += 1
+                if tokens == 3:
+                    break
+        await stream.aclose()
+
+    asyncio.run(scenario())
+    assert saved == [("user", "halo"), ("assistant", "t0 t1 t2")]
+
+
+def test_stream_cancelled_mid_generation_saves_partial_reply(saved):
+    async def scenario():
+        tokens = asyncio.Event()
+        seen = 0
+
+        async def consume():
+            nonlocal seen
+            async for event in chat_service.stream_message(1, "halo", _connected):
+                if event["event"] == "token":
+                    seen += 1
+                    if seen == 3:
+                        tokens.set()
+
+        task = asyncio.create_task(consume())
+        await tokens.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert saved == [("user", "halo"), ("assistant", "t0 t1 t2")]
@@ -0,0 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.services import auth_service
+
+
+class _Cursor:
+    def __init__(self, executed, delay):
+        self.executed = executed
+        self.delay = delay
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params):
+        await asyncio.sleep(self.delay)
+        self.executed.append(params)
+
+
+class _Conn:
+    def __init__(self, executed, delay):
+        self.executed = executed
+        self.delay = delay
+
+    def cursor(self):
+        return _Cursor(self.executed, self.delay)
+
+
+def _fake_db(monkeypatch, delay=0.0):
+    executed = []
+
+    @asynccontextmanager
+    async def get_db():
+        yield _Conn(executed, delay)
+
+    monkeypatch.setattr(auth_service, "get_db", get_db)
+    monkeypatch.setattr(auth_service, "_pending_last_login", {})
+    return executed
+
+
+def test_flush_writes_buffer_in_one_update(monkeypatch):
+    executed = _fake_db(monkeypatch)
+
+    async def scenario():
+        auth_service.record_last_login(1)
+        auth_service.record_last_login(2)
+        return await auth_service.flush_last_login()
+
+    assert asyncio.run(scenario()) == 2
+    assert len(executed) == 1 and executed[0][0] == [1, 2]
+    assert auth_service._pending_last_login == {}
+
+
+def test_flush_cancelled_mid_update_keeps_batch(monkeypatch):
+    executed = _fake_db(monkeypatch, delay=1.0)
+
+    async def scenario():
+        auth_service.record_last_login(1)
+        auth_service.record_last_login(2)
+        flush = asyncio.create_task(auth_service.flush_last_login())
+        await asyncio.sleep(0.01)
+        flush.cancel()
+        await asyncio.gather(flush, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert executed == []
+    assert sorted(auth_service._pending_last_login) == [1, 2]
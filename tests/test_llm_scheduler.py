@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_SUMMARY,
+    LLMOverloaded,
+    LLMScheduler,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_cancel_while_queued_after_release_popped_it():
+    async def scenario():
+        s = LLMScheduler("http://test", concurrency=1, max_queue=0)
+        await s._acquire(PRIORITY_INTERACTIVE)
+        waiter = asyncio.create_task(s._acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        # _release() membuang future yang sudah di-cancel sebelum waiter sempat jalan
+        s._release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert s.in_flight == 0
+        assert s._waiters == []
+
+    run(scenario())
+
+
+def test_cancel_while_queued_removes_waiter():
+    async def scenario():
+        s = LLMScheduler("http://test", concurrency=1, max_queue=0)
+        await s._acquire(PRIORITY_INTERACTIVE)
+        waiter = asyncio.create_task(s._acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert s._waiters == []
+        s._release()
+        assert s.in_flight == 0
+
+    run(scenario())
+
+
+def test_cancel_after_slot_granted_passes_slot_on():
+    async def scenario():
+        s = LLMScheduler("http://test", concurrency=1, max_queue=0)
+        await s._acquire(PRIORITY_INTERACTIVE)
+        first = asyncio.create_task(s._acquire(PRIORITY_INTERACTIVE))
+        second = asyncio.create_task(s._acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        s._release()  # slot diberikan ke first
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1)
+        assert s.in_flight == 1
+        s._release()
+        assert s.in_flight == 0
+
+    run(scenario())
+
+
+def test_priority_order_then_fifo():
+    async def scenario():
+        s = LLMScheduler("http://test", concurrency=1, max_queue=0)
+        await s._acquire(PRIORITY_INTERACTIVE)
+        order = []
+
+        async def waiter(name, priority):
+            await s._acquire(priority)
+            order.append(name)
+
+        tasks = []
+        for name, priority in [
+            ("bg", PRIORITY_BACKGROUND),
+            ("summary", PRIORITY_SUMMARY),
+            ("chat-1", PRIORITY_INTERACTIVE),
+            ("chat-2", PRIORITY_INTERACTIVE),
+        ]:
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await asyncio.sleep(0)
+        for _ in tasks:
+            s._release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["chat-1", "chat-2", "summary", "bg"]
+
+    run(scenario())
+
+
+def test_check_rejects_when_queue_full():
+    async def scenario():
+        s = LLMScheduler("http://test", concurrency=1, max_queue=1)
+        s.check(PRIORITY_INTERACTIVE)
+        await s._acquire(PRIORITY_INTERACTIVE)
+        s.check(PRIORITY_INTERACTIVE)  # antrean masih kosong
+        waiter = asyncio.create_task(s._acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded) as exc:
+            s.check(PRIORITY_SUMMARY)
+        assert exc.value.retry_after >= 1
+        with pytest.raises(LLMOverloaded):
+            await s._acquire(PRIORITY_INTERACTIVE)
+        # background tidak pernah ditolak
+        s.check(PRIORITY_BACKGROUND)
+        assert s.stats()["priorities"]["interactive"]["rejected"] == 1
+        assert s.stats()["priorities"]["summary"]["rejected"] == 1
+        s._release()
+        await waiter
+        s._release()
+        assert s.in_flight == 0
+
+    run(scenario())
@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from app.services import ollama_pool
+from app.services.ollama_pool import OPEN, Backend, LLMUnavailable, pick_backend
+
+
+@pytest.fixture
+def nodes(monkeypatch):
+    pool = [Backend("http://node-a:11434"), Backend("http://node-b:11434")]
+    monkeypatch.setattr(ollama_pool, "_backends", pool)
+    return pool
+
+
+def test_pick_backend_excludes_failed_node(nodes):
+    a, b = nodes
+    for _ in range(4):
+        assert pick_backend(exclude=a.url) is b
+        assert pick_backend(exclude=b.url) is a
+
+
+def test_pick_backend_exclude_overrides_prefer(nodes):
+    a, b = nodes
+    assert pick_backend(prefer=a.url) is a
+    assert pick_backend(prefer=a.url, exclude=a.url) is b
+
+
+def test_pick_backend_uses_excluded_node_when_it_is_the_only_one(nodes):
+    a, b = nodes
+    b.state = OPEN
+    b.opened_at = time.monotonic()
+    assert pick_backend(exclude=a.url) is a
+    a.state = OPEN
+    a.opened_at = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        pick_backend(exclude=a.url)
@@ -0,0 +1,32 @@
+import asyncio
+
+from app.core import timing
+
+
+async def _record(name: str):
+    timing.record_span(name, 0.01)
+    with timing.span(name + ".block"):
+        await asyncio.sleep(0)
+
+
+def test_detached_task_does_not_record_into_request():
+    async def scenario():
+        request = timing.RequestTiming()
+        token = timing._current.set(request)
+        try:
+            await asyncio.create_task(_record("child"))
+            await timing.detached_task(_record("detached"))
+        finally:
+            timing._current.reset(token)
+        return request
+
+    request = asyncio.run(scenario())
+    assert set(request.spans) == {"child", "child.block"}
+
+
+def test_record_span_outside_request_is_noop():
+    async def scenario():
+        await _record("outside")
+        return timing._current.get()
+
+    assert asyncio.run(scenario()) is None